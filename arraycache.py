@@ -0,0 +1,73 @@
+"""
+Cache of the column arrays loaded by vectorized execution (see vectorized.py).
+
+Arrays hold whole columns, so the cache holds up to a number of values across
+every array, evicting the least recently used arrays when full. Arrays of the
+files of a table that were deleted are dropped, as no query reads them again.
+
+The cache is shared by the threads of the server, so its methods hold a lock.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import threading
+from typing import Any, Optional, Tuple
+
+# Table file and column name
+ArrayKey = Tuple[Path, str]
+
+
+@dataclass
+class CachedArray:
+    # Column array, whose values are counted against the capacity
+    array: Any
+    # Version of the table file the array was read from
+    version: Any
+
+
+class ArrayCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: "OrderedDict[ArrayKey, CachedArray]" = OrderedDict()
+        self.values = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: ArrayKey, version: Any) -> Optional[Any]:
+        """
+        Returns the cached array if it was read from this version of the file
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+
+            self.entries.move_to_end(key)
+            return entry.array
+
+    def put(self, key: ArrayKey, version: Any, array: Any) -> None:
+        """
+        Caches an array. Arrays larger than the whole cache are not kept
+        """
+        with self.lock:
+            self.__remove(key)
+            if len(array.values) > self.capacity:
+                return
+
+            self.entries[key] = CachedArray(array, version)
+            self.values += len(array.values)
+
+            while self.values > self.capacity:
+                self.__remove(next(iter(self.entries)))
+
+    def invalidate(self, path: Path) -> None:
+        """
+        Drops the arrays of the file
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                self.__remove(key)
+
+    def __remove(self, key: ArrayKey) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.values -= len(entry.array.values)
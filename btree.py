@@ -0,0 +1,219 @@
+import bisect
+from pathlib import Path
+import pickle
+import struct
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+
+MAGIC = b"SDBBTREE"
+HEADER = struct.Struct("<8sQ")
+NODE_LENGTH = struct.Struct("<I")
+
+# Maximum number of keys held by a node before it is split
+ORDER = 128
+
+
+Node = Tuple[bool, List[Any], List[int]]
+
+
+class BPlusTree:
+    """
+    B+tree stored in a single file, mapping keys to row locators.
+
+    The file starts with a header holding the offset of the root node, followed
+    by the nodes. A node is a (is_leaf, keys, values) tuple: leaves keep the
+    locators of their keys, inner nodes keep the offsets of their children,
+    where keys[i] is the smallest key of children[i + 1]. Duplicate keys are
+    stored as separate entries.
+
+    Nodes are never overwritten: inserts append the nodes they change and then
+    point the header to the new root.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @staticmethod
+    def build(path: Path, entries: Iterable[Tuple[Any, int]]) -> "BPlusTree":
+        """
+        Bulk loads a new tree from (key, locator) pairs
+        """
+        entries = sorted(entries, key=lambda entry: entry[0])
+
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, 0))
+
+            # Each level is a list of (smallest key, node offset)
+            level = []
+            for i in range(0, len(entries), ORDER):
+                chunk = entries[i : i + ORDER]
+                keys = [key for key, _ in chunk]
+                locators = [locator for _, locator in chunk]
+                level.append((keys[0], write_node(f, (True, keys, locators))))
+
+            if not level:
+                level.append((None, write_node(f, (True, [], []))))
+
+            while len(level) > 1:
+                parents = []
+                for i in range(0, len(level), ORDER + 1):
+                    chunk = level[i : i + ORDER + 1]
+                    keys = [key for key, _ in chunk[1:]]
+                    children = [offset for _, offset in chunk]
+                    parents.append(
+                        (chunk[0][0], write_node(f, (False, keys, children)))
+                    )
+                level = parents
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, level[0][1]))
+
+        return BPlusTree(path)
+
+    def search(self, operator: str, value: Any) -> Iterator[int]:
+        """
+        Yields the locators of the keys that satisfy `key <operator> value`
+        """
+        if operator == "=":
+            return self.range(value, value)
+        elif operator == ">":
+            return self.range(low=value, low_inclusive=False)
+        elif operator == ">=":
+            return self.range(low=value)
+        elif operator == "<":
+            return self.range(high=value, high_inclusive=False)
+        elif operator == "<=":
+            return self.range(high=value)
+        else:
+            raise ValueError(f"Invalid operator: {operator} for index search")
+
+    def range(
+        self,
+        low: Any = None,
+        high: Any = None,
+        low_inclusive: bool = True,
+        high_inclusive: bool = True,
+    ) -> Iterator[int]:
+        """
+        Yields the locators of the keys between low and high, in key order.
+        A None bound is unbounded
+        """
+        with open(self.path, "rb") as f:
+            yield from self.__range(
+                f, read_root(f), low, high, low_inclusive, high_inclusive
+            )
+
+    def __range(
+        self,
+        f: BinaryIO,
+        offset: int,
+        low: Any,
+        high: Any,
+        low_inclusive: bool,
+        high_inclusive: bool,
+    ) -> Iterator[int]:
+        is_leaf, keys, values = read_node(f, offset)
+
+        if is_leaf:
+            start = 0 if low is None else bisect.bisect_left(keys, low)
+            for key, locator in zip(keys[start:], values[start:]):
+                if not low_inclusive and key == low:
+                    continue
+                if high is not None:
+                    if key > high or (not high_inclusive and key == high):
+                        return
+                yield locator
+            return
+
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        for i in range(start, len(values)):
+            if i > start and high is not None and keys[i - 1] > high:
+                return
+            yield from self.__range(
+                f, values[i], low, high, low_inclusive, high_inclusive
+            )
+
+    def insert(self, key: Any, locator: int) -> None:
+        with open(self.path, "r+b") as f:
+            path = []
+            offset = read_root(f)
+            node = read_node(f, offset)
+            while not node[0]:
+                i = bisect.bisect_right(node[1], key)
+                path.append((node, i))
+                node = read_node(f, node[2][i])
+
+            _, keys, locators = node
+            i = bisect.bisect_right(keys, key)
+            keys = keys[:i] + [key] + keys[i:]
+            locators = locators[:i] + [locator] + locators[i:]
+
+            f.seek(0, 2)
+            split = self.__write_split(f, (True, keys, locators))
+
+            # Copy the path back to the root, splitting nodes that overflow
+            for (_, keys, children), i in reversed(path):
+                children = list(children)
+                keys = list(keys)
+                if len(split) == 1:
+                    children[i] = split[0][1]
+                else:
+                    (_, left), (separator, right) = split
+                    children[i : i + 1] = [left, right]
+                    keys.insert(i, separator)
+                split = self.__write_split(f, (False, keys, children))
+
+            if len(split) == 1:
+                root = split[0][1]
+            else:
+                (_, left), (separator, right) = split
+                root = write_node(f, (False, [separator], [left, right]))
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, root))
+
+    def __write_split(self, f: BinaryIO, node: Node) -> List[Tuple[Optional[Any], int]]:
+        """
+        Writes the node, split in two halves if it overflows. Returns the
+        (separator, offset) of each written node
+        """
+        is_leaf, keys, values = node
+        if len(keys) <= ORDER:
+            return [(None, write_node(f, node))]
+
+        middle = len(keys) // 2
+        if is_leaf:
+            left = (True, keys[:middle], values[:middle])
+            right = (True, keys[middle:], values[middle:])
+            separator = keys[middle]
+        else:
+            left = (False, keys[:middle], values[: middle + 1])
+            right = (False, keys[middle + 1 :], values[middle + 1 :])
+            separator = keys[middle]
+
+        return [(None, write_node(f, left)), (separator, write_node(f, right))]
+
+
+def read_root(f: BinaryIO) -> int:
+    f.seek(0)
+    magic, root = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Invalid index file: {f.name}")
+    return root
+
+
+def read_node(f: BinaryIO, offset: int) -> Node:
+    f.seek(offset)
+    (length,) = NODE_LENGTH.unpack(f.read(NODE_LENGTH.size))
+    return pickle.loads(f.read(length))
+
+
+def write_node(f: BinaryIO, node: Node) -> int:
+    """
+    Appends the node at the current position of the file, returning its offset
+    """
+    offset = f.tell()
+    data = pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL)
+    f.write(NODE_LENGTH.pack(len(data)))
+    f.write(data)
+    return offset
@@ -0,0 +1,135 @@
+"""
+Buffer pool of parsed table pages.
+
+A page is a run of PAGE_ROWS consecutive rows of a table file, already parsed.
+The pool holds a fixed number of pages across every table, evicting the least
+recently used one when full, so memory is bounded by the pool size instead of
+by the size of the tables.
+
+The pool is shared by the threads of the server, so its methods hold a lock.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+PAGE_ROWS = 1024
+
+
+@dataclass
+class Page:
+    rows: List[Tuple[Any, ...]]
+    # Locator right after the last row: where the next page starts
+    end: int
+    # Columns that were parsed, None for all of them
+    columns: Optional[FrozenSet[str]]
+    # Whether the rows of the file ended with the page when it was read
+    last: bool = False
+
+    def has_columns(self, columns: Optional[FrozenSet[str]]) -> bool:
+        if self.columns is None:
+            return True
+        return columns is not None and columns <= self.columns
+
+    def ends_within(self, end: int) -> bool:
+        """
+        Tells if the page holds the same rows in a version of the file whose
+        rows end at `end`. The last page may have grown since it was read
+        """
+        return self.end == end or (self.end < end and not self.last)
+
+
+class BufferPool:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.pages: "OrderedDict[Tuple[Path, int], Page]" = OrderedDict()
+        # Version of each file when its pages were read
+        self.versions: Dict[Path, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        path: Path,
+        number: int,
+        columns: Optional[FrozenSet[str]],
+        end: Optional[int] = None,
+    ) -> Optional[Page]:
+        """
+        Returns the page if it is in the pool with at least the given columns
+        and, for a file whose rows end at `end`, the same rows
+        """
+        with self.lock:
+            page = self.pages.get((path, number))
+            if (
+                page is None
+                or not page.has_columns(columns)
+                or (end is not None and not page.ends_within(end))
+            ):
+                self.misses += 1
+                return None
+
+            self.pages.move_to_end((path, number))
+            self.hits += 1
+            return page
+
+    def put(self, path: Path, number: int, page: Page) -> None:
+        with self.lock:
+            self.__put(path, number, page)
+
+    def __put(self, path: Path, number: int, page: Page) -> None:
+        if len(self.pages) >= self.capacity and (path, number) not in self.pages:
+            # A scan of a file larger than the pool would evict its own first
+            # pages before reading them again. Keeping them instead, and not
+            # caching the rest, lets the next scan find at least those
+            if next(iter(self.pages))[0] == path:
+                return
+
+        self.pages[(path, number)] = page
+        self.pages.move_to_end((path, number))
+
+        while len(self.pages) > self.capacity:
+            self.pages.popitem(last=False)
+
+    def validate(self, path: Path, version: Any) -> None:
+        """
+        Drops the pages of the file if it changed since they were read
+        """
+        with self.lock:
+            if self.versions.get(path) != version:
+                self.__invalidate(path)
+                self.versions[path] = version
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        """
+        Drops the pages of the file, or of every file
+        """
+        with self.lock:
+            self.__invalidate(path)
+
+    def __invalidate(self, path: Optional[Path]) -> None:
+        if path is None:
+            self.pages.clear()
+            self.versions.clear()
+            return
+
+        for key in [key for key in self.pages if key[0] == path]:
+            del self.pages[key]
+        self.versions.pop(path, None)
+
+    def appended(self, path: Path, end: int, old_version: Any, version: Any) -> None:
+        """
+        Updates the pool after rows were appended to a file that ended at
+        `end`. Only the last page, which may now hold more rows, is dropped
+        """
+        with self.lock:
+            if self.versions.get(path) != old_version:
+                self.__invalidate(path)
+                return
+
+            for key, page in list(self.pages.items()):
+                if key[0] == path and page.end == end:
+                    del self.pages[key]
+            self.versions[path] = version
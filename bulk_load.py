@@ -0,0 +1,125 @@
+"""
+Bulk loading of rows into an existing table.
+
+Rows are converted to the column types in batches of BATCH_ROWS. Each batch
+gets a block of __ids and is written with a single append, instead of one
+INSERT statement per row.
+"""
+import csv
+from datetime import datetime
+import itertools
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Sequence
+
+from db import Column, ColumnType, Row, Table, parse_value
+
+BATCH_ROWS = 10_000
+
+
+def bulk_load(
+    table: Table,
+    fields: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    batch_rows: int = BATCH_ROWS,
+) -> int:
+    """
+    Appends the rows, which hold the values of `fields` in that order, as
+    Python values or as CSV cells. Returns the number of rows loaded.
+
+    A batch is written only if all of its rows are valid, but the batches
+    before an invalid row stay loaded
+    """
+    fields = [field.lower() for field in fields]
+    for field in fields:
+        if field == "__id":
+            raise ValueError("Cannot insert into __id column (autogenerated)")
+        if field not in table.headers:
+            raise ValueError(f"Invalid column: {field} in table {table.name}")
+    if len(set(fields)) != len(fields):
+        raise ValueError("Duplicate columns")
+
+    # Position of each column in the loaded rows, None for __id and defaults
+    positions = [
+        fields.index(header) if header in fields else None for header in table.headers
+    ]
+    converters = [converter(table, column) for column in table.columns]
+    defaults = [parse_value("", column) for column in table.columns]
+
+    def convert(number: int, values: Sequence[Any], id: int) -> Row:
+        if len(values) != len(fields):
+            raise ValueError(
+                f"Row {number} has {len(values)} values, expected {len(fields)}"
+            )
+
+        row: List[ColumnType] = []
+        for column, i, convert_value, default in zip(
+            table.columns, positions, converters, defaults
+        ):
+            if column.name == "__id":
+                row.append(id)
+            elif i is None:
+                row.append(default)
+            else:
+                try:
+                    row.append(convert_value(values[i]))
+                except (TypeError, ValueError):
+                    raise ValueError(
+                        f"Invalid {column.type} for column {column.name} "
+                        f"in row {number}: {values[i]!r}"
+                    )
+        return tuple(row)
+
+    loaded = 0
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(itertools.islice(numbered, batch_rows))
+        if not batch:
+            return loaded
+
+        # The ids are reserved once the whole batch is valid
+        ids = range(table.next_id, table.next_id + len(batch))
+        converted = [
+            convert(number, values, id) for id, (number, values) in zip(ids, batch)
+        ]
+        table.allocate_ids(len(converted))
+        table.append(converted)
+        loaded += len(converted)
+
+
+def load_csv(table: Table, path: Path, batch_rows: int = BATCH_ROWS) -> int:
+    """
+    Appends the rows of a CSV file whose header names the columns
+    """
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        fields = next(reader, None)
+        if fields is None:
+            return 0
+
+        return bulk_load(table, fields, reader, batch_rows)
+
+
+def converter(table: Table, column: Column) -> Callable[[Any], ColumnType]:
+    """
+    Returns a function that converts a value, or a CSV cell, to the column
+    type. Empty cells get the default value of the column
+    """
+    default = parse_value("", column)
+
+    if column.type == "int":
+        return lambda value: (
+            value if value.__class__ is int else int(value) if value != "" else default
+        )
+    elif column.type == "float":
+        return lambda value: float(value) if value != "" else default
+    elif column.type == "datetime":
+        return lambda value: (
+            value
+            if isinstance(value, datetime)
+            # Timestamps are mostly distinct, so they are not cached
+            else datetime.fromisoformat(value)
+            if value != ""
+            else default
+        )
+    # Strings are stored as they are read back, which indexes rely on
+    return table.stored_value(column)
@@ -0,0 +1,76 @@
+"""
+Small client for the server started with `simple_db.py --serve`. Only uses the
+standard library, so it starts quickly.
+"""
+import argparse
+import json
+import socket
+import sys
+from typing import Any, Iterable, Iterator, List, Tuple, Union
+
+from config import SERVER_HOST, SERVER_PORT
+
+
+Query = Union[str, Tuple[str, List[Any]]]
+
+
+def send_queries(
+    queries: Iterable[Query], host: str = SERVER_HOST, port: int = SERVER_PORT
+) -> Iterator[str]:
+    """
+    Sends the queries over a single connection, yielding the output of each.
+    A query can come with the values of its placeholders, as (query, params)
+    """
+    with socket.create_connection((host, port)) as sock:
+        with sock.makefile("rb") as responses:
+            for query in queries:
+                if isinstance(query, str):
+                    request = {"query": query}
+                else:
+                    request = {"query": query[0], "params": query[1]}
+
+                sock.sendall(json.dumps(request).encode() + b"\n")
+                line = responses.readline()
+                if not line:
+                    raise ConnectionError("Server closed the connection")
+                yield json.loads(line)["output"]
+
+
+def parse_param(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--execute",
+        type=str,
+        help="Execute query. Without it, queries are read from stdin, one per line",
+    )
+    parser.add_argument(
+        "--param",
+        type=str,
+        action="append",
+        default=[],
+        help="Value of the next placeholder (? or %%s) of --execute, as JSON "
+        'when it parses (42, 1.5, "text") or else as a string',
+    )
+    parser.add_argument("--host", type=str, help="Server host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, help="Server port", default=SERVER_PORT)
+    args = parser.parse_args()
+
+    if args.execute:
+        queries: Iterable[Query] = [(args.execute, list(map(parse_param, args.param)))]
+    else:
+        queries = (line.strip() for line in sys.stdin if line.strip())
+
+    for output in send_queries(queries, args.host, args.port):
+        if output:
+            print(output)
+
+
+if __name__ == "__main__":
+    main()
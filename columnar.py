@@ -0,0 +1,277 @@
+"""
+Binary columnar storage for tables.
+
+A columnar table is a directory with one file per column. int, float and
+datetime columns are fixed width arrays of 8 byte values (datetimes are
+microseconds since the epoch). str columns are stored as a blob with the UTF-8
+bytes of every value plus an array with the offset where each value ends.
+
+Column files are memory mapped and values are decoded only when accessed, so
+reading a column does no parsing and unreferenced columns are never touched.
+"""
+from array import array
+from datetime import datetime, timedelta
+import itertools
+import mmap
+import os
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from db import Column
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+TYPECODES = {"int": "q", "float": "d", "datetime": "q", "str": "q"}
+
+
+def column_file(path: Path, column: "Column") -> Path:
+    return path / f"{column.name}.bin"
+
+
+def blob_file(path: Path, column: "Column") -> Path:
+    return path / f"{column.name}.blob"
+
+
+def count_rows(path: Path, columns: List["Column"]) -> int:
+    return os.path.getsize(column_file(path, columns[0])) // 8
+
+
+def encode_datetime(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+
+def decode_datetime(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+class ColumnReader:
+    """
+    Memory mapped view over the files of a single column
+    """
+
+    def __init__(self, path: Path, column: "Column"):
+        self.column = column
+        self.__maps = []
+        self.__views = []
+
+        self.values = self.__map(column_file(path, column), TYPECODES[column.type])
+        if column.type == "str":
+            self.blob = self.__map(blob_file(path, column), "B")
+
+    def __map(self, file: Path, typecode: str) -> memoryview:
+        with open(file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"").cast(typecode)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(mapped).cast(typecode)
+        self.__maps.append(mapped)
+        self.__views.append(view)
+        return view
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> Any:
+        if self.column.type == "str":
+            start = self.values[i - 1] if i > 0 else 0
+            return bytes(self.blob[start : self.values[i]]).decode()
+        elif self.column.type == "datetime":
+            return decode_datetime(self.values[i])
+        else:
+            return self.values[i]
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.column.type == "str":
+            starts = itertools.chain([0], self.values)
+            return (
+                bytes(self.blob[start:end]).decode()
+                for start, end in zip(starts, self.values)
+            )
+        elif self.column.type == "datetime":
+            return map(decode_datetime, self.values)
+        else:
+            return iter(self.values)
+
+    def slice(self, start: int, stop: int) -> Iterator[Any]:
+        """
+        Yields the values from position start up to stop
+        """
+        values = self.values[start:stop]
+        if self.column.type == "str":
+            starts = itertools.chain(
+                [self.values[start - 1] if start > 0 else 0], values
+            )
+            return (
+                bytes(self.blob[begin:end]).decode()
+                for begin, end in zip(starts, values)
+            )
+        elif self.column.type == "datetime":
+            return map(decode_datetime, values.tolist())
+        else:
+            return iter(values.tolist())
+
+    def close(self) -> None:
+        for view in self.__views:
+            view.release()
+        for mapped in self.__maps:
+            mapped.close()
+
+
+def open_readers(
+    path: Path, columns: List["Column"], needed: Optional[Set[str]]
+) -> List[Optional[ColumnReader]]:
+    return [
+        ColumnReader(path, column) if needed is None or column.name in needed else None
+        for column in columns
+    ]
+
+
+def close_readers(readers: List[Optional[ColumnReader]]) -> None:
+    for reader in readers:
+        if reader:
+            reader.close()
+
+
+def scan(
+    path: Path, columns: List["Column"], needed: Optional[Set[str]] = None
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yields every row of the table. Columns not in `needed` are not read and
+    come back as None
+    """
+    rows = count_rows(path, columns)
+    readers = open_readers(path, columns, needed)
+    try:
+        yield from zip(
+            *[
+                iter(reader) if reader else itertools.repeat(None, rows)
+                for reader in readers
+            ]
+        )
+    finally:
+        close_readers(readers)
+
+
+def read_rows(
+    readers: List[Optional[ColumnReader]], start: int, stop: int
+) -> List[Tuple[Any, ...]]:
+    """
+    Returns the rows from position start up to stop. Columns without a reader
+    come back as None
+    """
+    return list(
+        zip(
+            *[
+                reader.slice(start, stop)
+                if reader
+                else itertools.repeat(None, stop - start)
+                for reader in readers
+            ]
+        )
+    )
+
+
+def version(path: Path, columns: List["Column"]) -> Tuple[int, int]:
+    """
+    Changes whenever the stored rows change
+    """
+    stat = os.stat(column_file(path, columns[0]))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def fetch(
+    path: Path,
+    columns: List["Column"],
+    positions: Iterable[int],
+    needed: Optional[Set[str]] = None,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yields the rows at the given positions
+    """
+    readers = open_readers(path, columns, needed)
+    try:
+        for i in positions:
+            yield tuple(reader[i] if reader else None for reader in readers)
+    finally:
+        close_readers(readers)
+
+
+def write(path: Path, columns: List["Column"], rows: Iterable[Tuple[Any, ...]]):
+    """
+    Replaces the stored rows
+    """
+    os.makedirs(path, exist_ok=True)
+    for column in columns:
+        open(column_file(path, column), "wb").close()
+        if column.type == "str":
+            open(blob_file(path, column), "wb").close()
+
+    append(path, columns, rows)
+
+
+def append(path: Path, columns: List["Column"], rows: Iterable[Tuple[Any, ...]]):
+    """
+    Writes the rows at the end of each column
+    """
+    rows = list(rows)
+
+    for i, column in enumerate(columns):
+        encode = encoder(column)
+        values = array(TYPECODES[column.type])
+
+        if column.type == "str":
+            blob = bytearray()
+            end = os.path.getsize(blob_file(path, column))
+            for row in rows:
+                data = encode(row[i])
+                blob += data
+                end += len(data)
+                values.append(end)
+
+            with open(blob_file(path, column), "ab") as f:
+                f.write(blob)
+        else:
+            values.extend(encode(row[i]) for row in rows)
+
+        with open(column_file(path, column), "ab") as f:
+            values.tofile(f)
+
+
+def encoder(column: "Column") -> Callable[[Any], Any]:
+    if column.type == "str":
+        return lambda value: ("" if value is None else str(value)).encode()
+    elif column.type == "datetime":
+        return lambda value: encode_datetime(value) if value else 0
+    elif column.type == "float":
+        return lambda value: float(value) if value else 0.0
+    else:
+        return lambda value: int(value) if value else 0
+
+
+def stored_value(column: "Column") -> Callable[[Any], Any]:
+    """
+    Returns a function that converts a value to the one read back after
+    storing it
+    """
+    if column.type == "str":
+        return lambda value: "" if value is None else str(value)
+    elif column.type == "datetime":
+        return lambda value: value if value else EPOCH
+    elif column.type == "float":
+        return lambda value: float(value) if value else 0.0
+    else:
+        return lambda value: int(value) if value else 0
@@ -4,3 +4,22 @@ from pathlib import Path
 
 DATA_DIR = Path(os.path.dirname(__file__)) / "db_data"
 META_FILE = DATA_DIR / "meta.json"
+
+# Address of the server started with --serve
+SERVER_HOST = "localhost"
+SERVER_PORT = 5440
+
+# Number of parsed table pages kept in memory, see bufferpool.py
+BUFFER_POOL_PAGES = 256
+
+# Number of rows of SELECT results kept in memory, see resultcache.py
+RESULT_CACHE_ROWS = 100_000
+
+# Number of column values of vectorized arrays kept in memory, see arraycache.py
+ARRAY_CACHE_VALUES = 10_000_000
+
+# Number of parsed and validated statements kept in memory, see plancache.py
+PLAN_CACHE_STATEMENTS = 1024
+
+# When writes are synced to disk: "always", "commit" or "off", see durability.py
+DURABILITY = "commit"
@@ -0,0 +1,42 @@
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from arraycache import ArrayCache
+from bufferpool import BufferPool
+from config import (
+    ARRAY_CACHE_VALUES,
+    BUFFER_POOL_PAGES,
+    PLAN_CACHE_STATEMENTS,
+    RESULT_CACHE_ROWS,
+)
+from plancache import PlanCache
+from resultcache import ResultCache
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch) -> Path:
+    """
+    Points the database to a temporary directory, with its own meta.json, and
+    resets the state the modules keep across queries: caches, the
+    transaction, snapshots and retired files
+    """
+    monkeypatch.setattr("db.DATA_DIR", tmp_path)
+    monkeypatch.setattr("db.META_FILE", tmp_path / "meta.json")
+    monkeypatch.setattr("server.META_FILE", tmp_path / "meta.json")
+
+    monkeypatch.setattr("db.buffer_pool", BufferPool(BUFFER_POOL_PAGES))
+    # vectorized.py imports the array cache from db
+    array_cache = ArrayCache(ARRAY_CACHE_VALUES)
+    monkeypatch.setattr("db.array_cache", array_cache)
+    monkeypatch.setattr("vectorized.array_cache", array_cache)
+    monkeypatch.setattr("executor.plan_cache", PlanCache(PLAN_CACHE_STATEMENTS))
+    monkeypatch.setattr("executor.result_cache", ResultCache(RESULT_CACHE_ROWS))
+
+    monkeypatch.setattr("db.transaction", None)
+    monkeypatch.setattr("db.table_writes", Counter())
+    monkeypatch.setattr("db.pins", Counter())
+    monkeypatch.setattr("db.retired", [])
+    monkeypatch.setattr("durability.pending", set())
+    return tmp_path
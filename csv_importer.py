@@ -104,5 +104,5 @@ def import_csv(csv_dir: Path):
                 )
             )
 
-        meta.database.tables.append(table)
+        meta.database.add_table(table)
         meta.save()
@@ -1,22 +1,61 @@
+import bisect
+from collections import Counter
+import contextlib
 import csv
 from dataclasses import dataclass
 import dataclasses
 from datetime import datetime
 import functools
+import heapq
+import io
+import itertools
 import json
 import os
 from pathlib import Path
-from typing import Any, List, Literal, Tuple, Union
+import shutil
+import threading
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+import weakref
+import zlib
 from tabulate import tabulate
-from config import DATA_DIR, META_FILE
+from arraycache import ArrayCache
+from btree import BPlusTree
+from bufferpool import PAGE_ROWS, BufferPool, Page
+from idmap import IdMap
+from transaction import Transaction
+import columnar
+import durability
+import wal
+from wal import Changes, WriteAheadLog
+from config import ARRAY_CACHE_VALUES, BUFFER_POOL_PAGES, DATA_DIR, META_FILE
 
-from query import Where, is_quoted_string, unquote_string
+from query import Where, is_placeholder, is_quoted_string, unquote_string
 
 
 ColumnTypeName = Literal["int", "float", "str", "datetime"]
+StorageFormat = Literal["csv", "columnar"]
+PartitionMethod = Literal["range", "hash"]
 ColumnType = Union[int, float, str, datetime]
 Direction = Literal["asc", "desc"]
 
+# Operators that can be answered by a range search on an index
+INDEX_OPERATORS = ("=", ">", "<", ">=", "<=")
+
 
 Row = Tuple[ColumnType]
 
@@ -41,19 +80,13 @@ class ResultSet:
         return [column.name.lower() for column in self.columns]
 
     def inner_join(self, other: "ResultSet", on: Where) -> "ResultSet":
-        new_rows = []
         joined_columns = tuple(self.columns + other.columns)
-        joined_column_names = tuple(column.name for column in joined_columns)
-        for row in self.rows:
-            for other_row in other.rows:
-                joined = tuple(row + other_row)
-                if self.__satisfies_condition(
-                    on,
-                    joined,
-                    joined_columns,
-                    joined_column_names,
-                ):
-                    new_rows.append(joined)
+
+        keys = self.__equi_join_keys(other, on)
+        if keys:
+            new_rows = self.__hash_join(other, *keys)
+        else:
+            new_rows = self.__nested_loop_join(other, on, joined_columns)
 
         return ResultSet(
             f"{self.table_name} INNER JOIN {other.table_name}",
@@ -61,83 +94,460 @@ class ResultSet:
             tuple(new_rows),
         )
 
-    def where(self, where: Where) -> "ResultSet":
+    def __equi_join_keys(
+        self, other: "ResultSet", on: Where
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (self, other) column indexes compared by an equality
+        join condition, or None if the condition can't be hash joined
+        """
+        if on.operator != "=" or on.and_where or on.or_where:
+            return None
+
+        column_names = tuple(column.name for column in self.columns)
+        other_column_names = tuple(column.name for column in other.columns)
+
+        if on.left_hand in column_names and on.right_hand in other_column_names:
+            return (
+                column_names.index(on.left_hand),
+                other_column_names.index(on.right_hand),
+            )
+        if on.right_hand in column_names and on.left_hand in other_column_names:
+            return (
+                column_names.index(on.right_hand),
+                other_column_names.index(on.left_hand),
+            )
+
+        return None
+
+    def __hash_join(self, other: "ResultSet", key: int, other_key: int) -> List[Row]:
         new_rows = []
-        columns = tuple(self.columns)
-        column_names = tuple(column.name for column in columns)
+
+        # Build the hash table on the smaller input and probe with the larger
+        if len(self.rows) <= len(other.rows):
+            buckets = {}
+            for row in self.rows:
+                buckets.setdefault(row[key], []).append(row)
+
+            for other_row in other.rows:
+                for row in buckets.get(other_row[other_key], ()):
+                    new_rows.append(row + other_row)
+        else:
+            buckets = {}
+            for other_row in other.rows:
+                buckets.setdefault(other_row[other_key], []).append(other_row)
+
+            for row in self.rows:
+                for other_row in buckets.get(row[key], ()):
+                    new_rows.append(row + other_row)
+
+        return new_rows
+
+    def __nested_loop_join(
+        self, other: "ResultSet", on: Where, joined_columns: Tuple[Column]
+    ) -> List[Row]:
+        new_rows = []
+        satisfies = compile_where(on, joined_columns)
         for row in self.rows:
-            if where.and_where:
-                if self.__satisfies_condition(
-                    where,
-                    row,
-                    columns,
-                    column_names,
-                ) and self.__satisfies_condition(
-                    where.and_where,
-                    row,
-                    columns,
-                    column_names,
-                ):
-                    new_rows.append(row)
-            elif where.or_where:
-                if self.__satisfies_condition(
-                    where,
-                    row,
-                    columns,
-                    column_names,
-                ) or self.__satisfies_condition(
-                    where.or_where,
-                    row,
-                    columns,
-                    column_names,
-                ):
-                    new_rows.append(row)
-            elif self.__satisfies_condition(
-                where,
-                row,
-                columns,
-                column_names,
-            ):
-                new_rows.append(row)
+            for other_row in other.rows:
+                joined = tuple(row + other_row)
+                if satisfies(joined):
+                    new_rows.append(joined)
+
+        return new_rows
+
+    def where(self, where: Where) -> "ResultSet":
+        new_rows = filter_rows(self.rows, self.columns, where)
 
         return ResultSet(self.table_name, self.columns, tuple(new_rows))
 
-    def __satisfies_condition(
-        self, where: Where, row: Row, columns: Tuple[Column], column_names: Tuple[str]
-    ) -> bool:
-        i = get_column_index(column_names, where.left_hand)
-        left_hand_val = row[i]
-        left_hand_col = columns[i]
 
-        try:
-            i = get_column_index(column_names, where.right_hand)
-            right_hand_val = row[i]
-        except ValueError:
-            # If the right hand is not a column, it must be a value
-            right_hand_val = where.right_hand
-            if left_hand_col.type == "str":
-                right_hand_val = unquote_string(right_hand_val)
-            elif left_hand_col.type == "int":
-                right_hand_val = int(right_hand_val)
-            elif left_hand_col.type == "float":
-                right_hand_val = float(right_hand_val)
-            elif left_hand_col.type == "datetime":
-                right_hand_val = to_datetime(unquote_string(right_hand_val))
+def filter_rows(
+    rows: Iterable[Row], columns: Tuple[Column], where: Where
+) -> Iterator[Row]:
+    """
+    Lazily yields the rows that satisfy the WHERE clause
+    """
+    return filter(compile_where(where, columns), rows)
+
+
+Predicate = Callable[[Row], bool]
+
+
+def compile_where(where: Where, columns: Tuple[Column]) -> Predicate:
+    """
+    Compiles the WHERE clause into a function that tests a row.
+
+    Column indexes are resolved and values are converted to the column type
+    once, so testing a row does no lookups or parsing
+    """
+    columns = tuple(columns)
+    column_names = tuple(column.name for column in columns)
+
+    predicate = compile_condition(where, columns, column_names)
+
+    # A condition with both is (condition OR or_where) AND and_where
+    if where.or_where:
+        predicate = either(predicate, compile_where(where.or_where, columns))
+
+    if where.and_where:
+        predicate = both(predicate, compile_where(where.and_where, columns))
+
+    return predicate
+
+
+def either(first: Predicate, second: Predicate) -> Predicate:
+    return lambda row: first(row) or second(row)
+
+
+def both(first: Predicate, second: Predicate) -> Predicate:
+    return lambda row: first(row) and second(row)
+
+
+def compile_condition(
+    where: Where, columns: Tuple[Column], column_names: Tuple[str]
+) -> Predicate:
+    i = get_column_index(column_names, where.left_hand)
+    left_hand_col = columns[i]
+
+    try:
+        j = get_column_index(column_names, where.right_hand)
+    except ValueError:
+        # If the right hand is not a column, it must be a value
+        value = parse_literal(where.right_hand, left_hand_col)
 
         if where.operator == "=":
-            return left_hand_val == right_hand_val
+            return lambda row: row[i] == value
         elif where.operator == ">":
-            return left_hand_val > right_hand_val
+            return lambda row: row[i] > value
         elif where.operator == "<":
-            return left_hand_val < right_hand_val
+            return lambda row: row[i] < value
         elif where.operator == ">=":
-            return left_hand_val >= right_hand_val
+            return lambda row: row[i] >= value
         elif where.operator == "<=":
-            return left_hand_val <= right_hand_val
+            return lambda row: row[i] <= value
         elif where.operator == "!=":
-            return left_hand_val != right_hand_val
+            return lambda row: row[i] != value
+    else:
+        if where.operator == "=":
+            return lambda row: row[i] == row[j]
+        elif where.operator == ">":
+            return lambda row: row[i] > row[j]
+        elif where.operator == "<":
+            return lambda row: row[i] < row[j]
+        elif where.operator == ">=":
+            return lambda row: row[i] >= row[j]
+        elif where.operator == "<=":
+            return lambda row: row[i] <= row[j]
+        elif where.operator == "!=":
+            return lambda row: row[i] != row[j]
+
+    raise ValueError(f"Invalid operator: {where.operator} for comparison")
+
+
+def parse_literal(value: str, column: Column) -> ColumnType:
+    """
+    Converts a value in a WHERE clause to the type of the column it is
+    compared with
+    """
+    if column.type == "str":
+        return unquote_string(value)
+    elif column.type == "int":
+        return int(value)
+    elif column.type == "float":
+        return float(value)
+    elif column.type == "datetime":
+        return to_datetime(unquote_string(value))
+    return value
+
+
+BlockFilter = Callable[["Block"], bool]
+
+
+def compile_zone_map(where: Where, columns: Tuple[Column]) -> BlockFilter:
+    """
+    Compiles the WHERE clause into a function that tells, from the min and max
+    of each column in a block, whether any row of the block may satisfy it
+    """
+    columns = tuple(columns)
+    column_names = tuple(column.name for column in columns)
+
+    may_match = compile_zone_condition(where, columns, column_names)
+
+    if where.or_where:
+        either_may_match = may_match
+        or_may_match = compile_zone_map(where.or_where, columns)
+        may_match = lambda block: either_may_match(block) or or_may_match(block)
+
+    if where.and_where:
+        both_may_match = may_match
+        and_may_match = compile_zone_map(where.and_where, columns)
+        may_match = lambda block: both_may_match(block) and and_may_match(block)
+
+    return may_match
+
+
+def compile_zone_condition(
+    where: Where, columns: Tuple[Column], column_names: Tuple[str]
+) -> BlockFilter:
+    i = get_column_index(column_names, where.left_hand)
+
+    if where.right_hand in column_names:
+        # Comparing two columns of the same row can't be ruled out by ranges
+        return lambda block: True
+
+    value = parse_literal(where.right_hand, columns[i])
+
+    if where.operator == "=":
+        return lambda block: block.min[i] <= value <= block.max[i]
+    elif where.operator == ">":
+        return lambda block: block.max[i] > value
+    elif where.operator == "<":
+        return lambda block: block.min[i] < value
+    elif where.operator == ">=":
+        return lambda block: block.max[i] >= value
+    elif where.operator == "<=":
+        return lambda block: block.min[i] <= value
+    elif where.operator == "!=":
+        return lambda block: not block.min[i] == value == block.max[i]
+
+    raise ValueError(f"Invalid operator: {where.operator} for comparison")
+
+
+PartitionFilter = Callable[[int], bool]
+
+
+def compile_partition_filter(
+    where: Where, columns: Tuple[Column], partitioning: "Partitioning"
+) -> PartitionFilter:
+    """
+    Compiles the WHERE clause into a function that tells, from the number of
+    a partition, whether any of its rows may satisfy it. Only conditions that
+    compare the partition column with a value rule out partitions
+    """
+    columns = tuple(columns)
+    column_names = tuple(column.name for column in columns)
+
+    may_match = compile_partition_condition(where, columns, column_names, partitioning)
+
+    if where.or_where:
+        either_may_match = may_match
+        or_may_match = compile_partition_filter(where.or_where, columns, partitioning)
+        may_match = lambda i: either_may_match(i) or or_may_match(i)
+
+    if where.and_where:
+        both_may_match = may_match
+        and_may_match = compile_partition_filter(where.and_where, columns, partitioning)
+        may_match = lambda i: both_may_match(i) and and_may_match(i)
+
+    return may_match
+
+
+def compile_partition_condition(
+    where: Where,
+    columns: Tuple[Column],
+    column_names: Tuple[str],
+    partitioning: "Partitioning",
+) -> PartitionFilter:
+    if where.left_hand != partitioning.column or where.right_hand in column_names:
+        return lambda i: True
+
+    value = parse_literal(where.right_hand, columns[column_names.index(where.left_hand)])
+
+    if partitioning.method == "hash":
+        if where.operator == "=":
+            bucket = partitioning.locate(value)
+            return lambda i: i == bucket
+        return lambda i: True
+
+    # Partition i holds the values from bounds[i - 1] up to bounds[i]
+    bounds = partitioning.bounds
+    low = lambda i: bounds[i - 1] if i > 0 else None
+    high = lambda i: bounds[i] if i < len(bounds) else None
+
+    if where.operator == "=":
+        partition = partitioning.locate(value)
+        return lambda i: i == partition
+    elif where.operator in (">", ">="):
+        return lambda i: high(i) is None or high(i) > value
+    elif where.operator == "<":
+        return lambda i: low(i) is None or low(i) < value
+    elif where.operator == "<=":
+        return lambda i: low(i) is None or low(i) <= value
+    elif where.operator == "!=":
+        return lambda i: True
+
+    raise ValueError(f"Invalid operator: {where.operator} for comparison")
+
+
+class IdSet:
+    """
+    Set of row ids stored as sorted runs of consecutive ids, so the ids
+    affected by a mass UPDATE or DELETE take memory proportional to the number
+    of gaps between them, not to the number of rows
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        # Each run is [start, stop), with a gap between consecutive runs
+        self.starts: List[int] = []
+        self.stops: List[int] = []
+        for id in ids:
+            self.add(id)
+
+    def add(self, id: int) -> None:
+        if self.stops and self.stops[-1] == id:
+            # Rows are scanned in id order, so this is the common case
+            self.stops[-1] += 1
+            return
+        if not self.stops or self.stops[-1] < id:
+            self.starts.append(id)
+            self.stops.append(id + 1)
+            return
+        if id in self:
+            return
+
+        i = bisect.bisect_left(self.starts, id)
+        if i > 0 and self.stops[i - 1] == id:
+            self.stops[i - 1] += 1
+            if i < len(self.starts) and self.starts[i] == id + 1:
+                self.stops[i - 1] = self.stops.pop(i)
+                self.starts.pop(i)
+        elif i < len(self.starts) and self.starts[i] == id + 1:
+            self.starts[i] = id
         else:
-            raise ValueError(f"Invalid operator: {where.operator} for comparison")
+            self.starts.insert(i, id)
+            self.stops.insert(i, id + 1)
+
+    def __contains__(self, id: object) -> bool:
+        if not isinstance(id, int):
+            return False
+        i = bisect.bisect_right(self.starts, id) - 1
+        return i >= 0 and id < self.stops[i]
+
+    def __len__(self) -> int:
+        return sum(stop - start for start, stop in zip(self.starts, self.stops))
+
+    def __iter__(self) -> Iterator[int]:
+        for start, stop in zip(self.starts, self.stops):
+            yield from range(start, stop)
+
+    def __getitem__(self, i: int) -> int:
+        for start, stop in zip(self.starts, self.stops):
+            if i < stop - start:
+                return start + i
+            i -= stop - start
+        raise IndexError("IdSet index out of range")
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, IdSet):
+            return self.starts == other.starts and self.stops == other.stops
+        return NotImplemented
+
+    def __str__(self) -> str:
+        runs = [
+            str(start) if stop == start + 1 else f"{start}..{stop - 1}"
+            for start, stop in zip(self.starts, self.stops)
+        ]
+        return f"[{', '.join(runs)}]"
+
+    def __repr__(self) -> str:
+        return f"IdSet({self})"
+
+
+@dataclass
+class Block:
+    """
+    Zone map of a block of up to PAGE_ROWS consecutive rows of a table file,
+    which is also a page of the buffer pool: the locators where it starts and
+    ends, and the min and max value of each column, as read back from the file
+    """
+
+    start: int
+    end: int
+    rows: int
+    min: List[ColumnType]
+    max: List[ColumnType]
+
+
+@dataclass
+class Index:
+    column: str
+    file: str
+
+
+@dataclass
+class Partitioning:
+    """
+    How the rows of a table are split into partitions by the value of a
+    column. By range, partition i holds the values from bounds[i - 1] up to
+    bounds[i] (excluded), the first and last partitions being unbounded. By
+    hash, partition i holds the values whose hash modulo `buckets` is i
+    """
+
+    column: str
+    method: PartitionMethod
+    bounds: List[ColumnType] = dataclasses.field(default_factory=list)
+    buckets: int = 0
+
+    def count(self) -> int:
+        if self.method == "range":
+            return len(self.bounds) + 1
+        return self.buckets
+
+    def locate(self, value: ColumnType) -> int:
+        """
+        Returns the number of the partition that holds the value
+        """
+        if self.method == "range":
+            return bisect.bisect_right(self.bounds, value)
+        return partition_hash(value) % self.buckets
+
+
+def partition_hash(value: ColumnType) -> int:
+    """
+    Hashes a value the same way in every process, unlike hash() of strings
+    """
+    if value.__class__ is int:
+        return value
+    return zlib.crc32(str(value).encode())
+
+
+def parse_partitioning(
+    table: "Table", column: str, method: str, argument: str
+) -> Partitioning:
+    """
+    Builds a partitioning of the table by a column:
+
+    - range 1000,2000: partitions split at comma-separated bounds
+    - range year: a partition per year of a datetime column
+    - hash 8: a number of partitions by hash
+    """
+    if column not in table.headers:
+        raise ValueError(f"Invalid column: {column} in table {table.name}")
+
+    if method == "hash":
+        try:
+            buckets = int(argument)
+        except ValueError:
+            raise ValueError(f"Invalid number of partitions: {argument}")
+        if buckets < 1:
+            raise ValueError(f"Invalid number of partitions: {argument}")
+        return Partitioning(column=column, method="hash", buckets=buckets)
+    elif method != "range":
+        raise ValueError(f"Invalid partitioning method: {method}")
+
+    col = table.get_column(column)
+    if argument == "year":
+        if col.type != "datetime":
+            raise ValueError(f"Column {column} is not a datetime")
+        i = table.headers.index(column)
+        years = sorted({row[i].year for row in table.scan(columns={column})})
+        # The first partition holds the first year and anything before it
+        bounds: List[ColumnType] = [datetime(year, 1, 1) for year in years[1:]]
+    else:
+        bounds = sorted({parse_value(bound.strip(), col) for bound in argument.split(",")})
+
+    return Partitioning(column=column, method="range", bounds=bounds)
 
 
 @dataclass
@@ -146,6 +556,18 @@ class Table:
     columns: List[Column]
     file: str
     next_id: int
+    indexes: List[Index] = dataclasses.field(default_factory=list)
+    format: StorageFormat = "csv"
+    blocks: List[Block] = dataclasses.field(default_factory=list)
+    # Rewrites store the table in new files, named after the generation, so
+    # snapshots of the previous one can still read the old files
+    generation: int = 0
+    # LSN of the last write-ahead log batch folded into the table file
+    lsn: int = 0
+    # Partitioned tables store their rows in the partitions, tables named
+    # table.p0, table.p1... with their own files, indexes and logged changes
+    partitioning: Optional[Partitioning] = None
+    partitions: List["Table"] = dataclasses.field(default_factory=list)
 
     @property
     def headers(self) -> List[str]:
@@ -155,32 +577,541 @@ class Table:
     def prefixed_headers(self) -> List[str]:
         return [f"{self.name}.{column.name.lower()}" for column in self.columns]
 
-    def read(self, prefixed=False) -> ResultSet:
-        with open(DATA_DIR / Path(self.file), "r") as f:
-            csv_reader = csv.reader(f)
-            next(csv_reader, None)  # skip the headers
-
-            rows = []
-            for row in csv_reader:
-                parsed = []
-                for i, col in enumerate(row):
-                    parsed.append(parse_value(col, self.columns[i]))
-                rows.append(tuple(parsed))
-
-            if prefixed:
-                columns = [
-                    Column(f"{self.name}.{column.name}", column.type)
-                    for column in self.columns
+    @property
+    def path(self) -> Path:
+        return DATA_DIR / Path(self.file)
+
+    @property
+    def wal(self) -> WriteAheadLog:
+        return WriteAheadLog(DATA_DIR / wal.FILE_NAME)
+
+    def file_name(self, extension: str, *qualifiers: str) -> str:
+        """
+        Returns the name of a file of the current generation of the table,
+        e.g. users.3.csv or users.age.3.idx. The first generation has none
+        """
+        parts = [self.name, *qualifiers]
+        if self.generation:
+            parts.append(str(self.generation))
+        return ".".join([*parts, extension])
+
+    def snapshot(self) -> "Snapshot":
+        """
+        Returns the table as it is now. Later writes are not seen by the
+        snapshot, and the files it reads are kept until it is dropped
+        """
+        fields = {
+            field.name: getattr(self, field.name) for field in dataclasses.fields(Table)
+        }
+        snapshot = Snapshot(
+            **{
+                **fields,
+                "columns": list(self.columns),
+                "indexes": list(self.indexes),
+                "blocks": list(self.blocks),
+                "partitions": [partition.snapshot() for partition in self.partitions],
+            },
+            end=self.stored_end(),
+            upto=self.last_lsn(),
+            writes=self.write_count(),
+        )
+        pin(snapshot)
+        return snapshot
+
+    def stored_end(self) -> int:
+        """
+        Returns the locator where the stored rows end
+        """
+        if self.partitioning is not None:
+            # The rows are stored in the partitions
+            return 0
+        if self.format == "columnar":
+            return columnar.count_rows(self.path, self.columns)
+        return os.path.getsize(self.path)
+
+    def last_lsn(self) -> int:
+        """
+        Returns the LSN of the last batch of changes logged for the table
+        """
+        return max(self.lsn, self.wal.last_lsn(self.name))
+
+    def write_count(self) -> int:
+        """
+        Returns the number of writes to the table by this process, which tags
+        cached query results
+        """
+        return table_writes[self.path]
+
+    def get_columns(self, prefixed=False) -> Tuple[Column]:
+        if prefixed:
+            return tuple(
+                Column(f"{self.name}.{column.name}", column.type)
+                for column in self.columns
+            )
+
+        return tuple(self.columns)
+
+    def scan(
+        self, where: Optional[Where] = None, columns: Optional[Set[str]] = None
+    ) -> Iterator[Row]:
+        """
+        Lazily yields the rows of the table that satisfy the WHERE clause,
+        reading only the rows returned by an index when one can be used.
+        Changes logged by UPDATE and DELETE are applied over the stored rows,
+        along with the writes of the current transaction. Rows appended and
+        changes logged while scanning are not seen.
+
+        `columns` lists the columns the caller needs (all by default). The
+        other columns are not parsed and come back as None
+        """
+        if self.partitioning is not None:
+            return itertools.chain.from_iterable(
+                partition.scan(where, columns) for partition in self.prune(where)
+            )
+
+        changes = self.changes()
+        if changes and columns is not None:
+            # Logged changes are matched by __id
+            columns = columns | {"__id"}
+
+        pending = self.pending_rows()
+        if pending:
+            # Rows inserted by the transaction are merged like changed rows
+            changes = {**{row[0]: row for row in pending}, **changes}
+
+        if where is None:
+            return merge_changes(self.__scan_file(columns), changes)
+
+        rows = self.__scan_id(where, columns)
+        if rows is None:
+            rows = self.__scan_index(where, columns)
+        if rows is None:
+            # Skipped blocks may hold rows whose new version satisfies the WHERE
+            rows = merge_changes(self.__scan_file(columns, where), changes)
+        else:
+            rows = merge_changes(rows, changes)
+
+        return filter_rows(rows, self.get_columns(), where)
+
+    def changes(self) -> Changes:
+        """
+        Returns the logged changes of the table, along with the changes of the
+        current transaction
+        """
+        changes = self.wal.changes(self.name, self.lsn, self.last_lsn())
+        current = current_transaction()
+        if current is not None and self.path in current.write_sets:
+            changes = {**changes, **current.write_sets[self.path].changes}
+        return changes
+
+    def pending_rows(self) -> List[Row]:
+        """
+        Returns the rows inserted by the current transaction
+        """
+        current = current_transaction()
+        if current is not None and self.path in current.write_sets:
+            return current.write_sets[self.path].rows
+        return []
+
+    def stored_tables(self) -> List["Table"]:
+        """
+        Returns the tables that store the rows: the partitions of a
+        partitioned table, or the table itself
+        """
+        if self.partitioning is not None:
+            return list(self.partitions)
+        return [self]
+
+    def prune(self, where: Optional[Where]) -> List["Table"]:
+        """
+        Returns the tables that store the rows that may satisfy the WHERE
+        clause: the partitions its conditions on the partition column don't
+        rule out, or the table itself
+        """
+        if self.partitioning is None or where is None:
+            return self.stored_tables()
+
+        may_match = compile_partition_filter(
+            where, self.get_columns(), self.partitioning
+        )
+        return [
+            partition for i, partition in enumerate(self.partitions) if may_match(i)
+        ]
+
+    def route(self, row: Row) -> "Table":
+        """
+        Returns the table that stores the row: its partition, or the table
+        itself
+        """
+        if self.partitioning is None:
+            return self
+
+        value = row[self.headers.index(self.partitioning.column)]
+        return self.partitions[self.partitioning.locate(value)]
+
+    def __route_rows(self, rows: Iterable[Row]) -> List[List[Row]]:
+        """
+        Splits the rows by partition, in the order of the partitions
+        """
+        assert self.partitioning is not None
+        i = self.headers.index(self.partitioning.column)
+        routed: List[List[Row]] = [[] for _ in self.partitions]
+        for row in rows:
+            routed[self.partitioning.locate(row[i])].append(row)
+        return routed
+
+    def partition(self, partitioning: Optional[Partitioning]) -> None:
+        """
+        Rewrites the rows of the table into a file per partition, or into a
+        single file without a partitioning. Partitions of the previous
+        partitioning are reused by name, and the files of the others are
+        deleted once the metadata is saved
+        """
+        if current_transaction() is not None:
+            raise ValueError(f"Cannot partition table {self.name} in a transaction")
+
+        if partitioning is not None:
+            if partitioning.column not in self.headers:
+                raise ValueError(
+                    f"Invalid column: {partitioning.column} in table {self.name}"
+                )
+            if partitioning.count() < 1:
+                raise ValueError("Tables must have at least one partition")
+
+        rows = tuple(self.scan())
+
+        previous = {partition.name: partition for partition in self.partitions}
+        if self.partitioning is None:
+            self.drop()
+
+        partitions = []
+        for i in range(partitioning.count() if partitioning else 0):
+            name = f"{self.name}.p{i}"
+            partition = previous.pop(name, None)
+            if partition is None:
+                partition = Table(
+                    name=name,
+                    columns=list(self.columns),
+                    file="",
+                    next_id=0,
+                    format=self.format,
+                    # Files of a dropped partition with the same name may
+                    # still be awaiting deletion
+                    generation=self.generation,
+                )
+                partition.file = partition.file_name(self.format)
+                partition.indexes = [
+                    Index(index.column, partition.file_name("idx", index.column))
+                    for index in self.indexes
                 ]
-            else:
-                columns = self.columns
+            partition.format = self.format
+            partitions.append(partition)
+
+        for partition in previous.values():
+            partition.drop()
+            self.generation = max(self.generation, partition.generation)
+
+        self.partitioning = partitioning
+        self.partitions = partitions
+        self.write(ResultSet(self.name, self.get_columns(), rows))
+
+    def drop(self) -> None:
+        """
+        Schedules the files of the table and its logged changes for deletion,
+        once the metadata is saved
+        """
+        files = self.generation_files()
+        self.lsn = self.last_lsn()
+        self.generation += 1
+        retire(self, files)
+
+    def stored_rows(self, columns: Optional[Set[str]] = None) -> Iterator[Row]:
+        """
+        Yields the rows of the table file, without the logged changes
+        """
+        return self.__scan_file(columns)
+
+    def __scan_file(
+        self, columns: Optional[Set[str]], where: Optional[Where] = None
+    ) -> Iterator[Row]:
+        """
+        Yields the stored rows page by page, reading only the pages that are
+        not in the buffer pool. Blocks whose zone map rules out the WHERE
+        clause are skipped without being read. Pages stop where the stored
+        rows ended when the scan started
+        """
+        needed = None if columns is None else frozenset(columns)
+        end = self.stored_end()
+        buffer_pool.validate(self.path, self.version())
+
+        may_match = None
+        if where is not None and self.blocks:
+            may_match = compile_zone_map(where, self.get_columns())
+
+        with contextlib.ExitStack() as stack:
+            read_page = None
+            number = 0
+            start = 0
+            while True:
+                if may_match and number < len(self.blocks):
+                    block = self.blocks[number]
+                    if not may_match(block):
+                        number += 1
+                        start = block.end
+                        continue
+
+                page = buffer_pool.get(self.path, number, needed, end)
+                if page is None:
+                    if read_page is None:
+                        read_page = self.__open_pages(stack, needed, end)
+                    page = read_page(start)
+                    if not page.rows:
+                        return
+                    buffer_pool.put(self.path, number, page)
 
-            return ResultSet(
-                table_name=self.name,
-                columns=tuple(columns),
-                rows=tuple(rows),
+                yield from page.rows
+
+                if len(page.rows) < PAGE_ROWS or page.end >= end:
+                    return
+                number += 1
+                start = page.end
+
+    def __open_pages(
+        self,
+        stack: contextlib.ExitStack,
+        columns: Optional[FrozenSet[str]],
+        end: int,
+    ) -> Callable[[int], Page]:
+        """
+        Opens the table file, returning a function that reads the page that
+        starts at a locator, up to the locator where the rows end
+        """
+        if self.format == "columnar":
+            readers = columnar.open_readers(self.path, self.columns, columns)
+            stack.callback(columnar.close_readers, readers)
+
+            def read_columnar_page(start: int) -> Page:
+                stop = min(start + PAGE_ROWS, end)
+                rows = columnar.read_rows(readers, start, stop)
+                return Page(rows=rows, end=stop, columns=columns, last=stop >= end)
+
+            return read_columnar_page
+
+        parse_row = self.row_parser(columns)
+        f = stack.enter_context(open(self.path, "rb"))
+
+        def lines() -> Iterator[str]:
+            while f.tell() < end:
+                yield f.readline().decode()
+
+        def read_csv_page(start: int) -> Page:
+            f.seek(start)
+            # The reader pulls only the lines of the records it returns, so the
+            # file position is where the next page starts
+            records = csv.reader(lines())
+            if start == 0:
+                next(records, None)  # skip the headers
+
+            rows = [parse_row(row) for row in itertools.islice(records, PAGE_ROWS)]
+            return Page(
+                rows=rows, end=f.tell(), columns=columns, last=f.tell() >= end
             )
 
+        return read_csv_page
+
+    def version(self) -> Any:
+        """
+        Changes whenever the stored rows change
+        """
+        if self.format == "columnar":
+            return columnar.version(self.path, self.columns)
+
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def __scan_id(
+        self, where: Where, columns: Optional[Set[str]]
+    ) -> Optional[Iterator[Row]]:
+        id = self.find_id(where)
+        if id is None:
+            return None
+
+        locator = self.id_map.get(id)
+        if locator is None or locator >= self.stored_end():
+            return self.fetch([], columns)
+        return self.fetch([locator], columns)
+
+    def find_id(self, where: Where) -> Optional[int]:
+        """
+        Returns the id of an AND-ed `__id = N` condition of the WHERE clause,
+        when the row can be found through the id map
+        """
+        if where.or_where or not self.id_map.exists():
+            return None
+
+        conditions = [where]
+        if where.and_where:
+            conditions.append(where.and_where)
+
+        for condition in conditions:
+            if condition.or_where:
+                continue
+            if condition.left_hand != "__id" or condition.operator != "=":
+                continue
+            if condition.right_hand in self.headers:
+                continue
+
+            try:
+                return int(condition.right_hand)
+            except ValueError:
+                return None
+
+        return None
+
+    def stored_ids(self, ids: Iterable[int]) -> Set[int]:
+        """
+        Returns which of the ids belong to rows stored in the table file.
+        Rows inserted by a transaction or moved from another partition are
+        only in the write-ahead log until the next checkpoint
+        """
+        id_map = self.id_map
+        if id_map.exists():
+            end = self.stored_end()
+            locators = ((id, id_map.get(id)) for id in ids)
+            return {
+                id for id, locator in locators if locator is not None and locator < end
+            }
+
+        wanted = set(ids)
+        i = self.headers.index("__id")
+        return {row[i] for row in self.__scan_file({"__id"}) if row[i] in wanted}
+
+    @property
+    def id_map(self) -> IdMap:
+        return IdMap(DATA_DIR / self.file_name("ids"))
+
+    def build_id_map(self, rows: Iterable[Tuple[int, Row]]) -> None:
+        """
+        Writes the id map from the (locator, row) pairs of the table file
+        """
+        if "__id" not in self.headers:
+            return
+
+        i = self.headers.index("__id")
+        IdMap.build(self.id_map.path, ((row[i], locator) for locator, row in rows))
+        durability.written(self.id_map.path)
+
+    def __scan_index(
+        self, where: Where, columns: Optional[Set[str]]
+    ) -> Optional[Iterator[Row]]:
+        found = self.find_index(where)
+        if found is None:
+            return None
+
+        index, condition = found
+        value = parse_value(condition.right_hand, self.get_column(condition.left_hand))
+        tree = BPlusTree(DATA_DIR / index.file)
+
+        # Fetching in file order keeps the reads sequential. Rows appended
+        # after the scan started are left out
+        end = self.stored_end()
+        locators = sorted(
+            locator
+            for locator in tree.search(condition.operator, value)
+            if locator < end
+        )
+        return self.fetch(locators, columns)
+
+    def find_index(self, where: Where) -> Optional[Tuple[Index, Where]]:
+        """
+        Returns an index that can answer one of the AND-ed conditions of the
+        WHERE clause, along with that condition
+        """
+        if where.or_where:
+            return None
+
+        conditions = [where]
+        if where.and_where:
+            conditions.append(where.and_where)
+
+        for condition in conditions:
+            if condition.or_where:
+                continue
+            index = self.get_index(condition.left_hand)
+            if index is None or condition.operator not in INDEX_OPERATORS:
+                continue
+            if condition.right_hand in self.headers:
+                continue
+
+            return index, condition
+
+        return None
+
+    def scan_locators(self) -> Iterator[Tuple[int, Row]]:
+        """
+        Yields every row of the table along with its locator: the byte offset
+        of the row in CSV files, or its position in columnar files
+        """
+        if self.format == "columnar":
+            yield from enumerate(columnar.scan(self.path, self.columns))
+            return
+
+        with open(self.path, "rb") as f:
+            records = read_csv_records(f)
+            next(records, None)  # skip the headers
+
+            for offset, row in records:
+                yield offset, self.parse_row(row)
+
+    def fetch(
+        self, locators: Iterable[int], columns: Optional[Set[str]] = None
+    ) -> Iterator[Row]:
+        """
+        Yields the rows stored at the given locators
+        """
+        if self.format == "columnar":
+            yield from columnar.fetch(self.path, self.columns, locators, columns)
+            return
+
+        parse_row = self.row_parser(columns)
+        with open(self.path, "rb") as f:
+            for offset in locators:
+                f.seek(offset)
+                _, row = next(read_csv_records(f))
+                yield parse_row(row)
+
+    def parse_row(self, row: List[str]) -> Row:
+        parsed = []
+        for i, col in enumerate(row):
+            parsed.append(parse_value(col, self.columns[i]))
+        return tuple(parsed)
+
+    def row_parser(self, columns: Optional[Set[str]]) -> Callable[[List[str]], Row]:
+        """
+        Returns a function that parses a CSV row, keeping only the given
+        columns. The other columns are not parsed and come back as None
+        """
+        if columns is None:
+            return self.parse_row
+
+        needed = [i for i, column in enumerate(self.columns) if column.name in columns]
+        width = len(self.columns)
+
+        def parse_row(row: List[str]) -> Row:
+            parsed: List[Optional[ColumnType]] = [None] * width
+            for i in needed:
+                parsed[i] = parse_value(row[i], self.columns[i])
+            return tuple(parsed)
+
+        return parse_row
+
+    def read(self, prefixed=False) -> ResultSet:
+        return ResultSet(
+            table_name=self.name,
+            columns=self.get_columns(prefixed),
+            rows=tuple(self.scan()),
+        )
+
     def write(self, rs: ResultSet) -> None:
         if rs.table_name != self.name:
             raise ValueError(f"Cannot save ResultSet from table {rs.table_name}")
@@ -188,27 +1119,346 @@ class Table:
         if rs.headers != self.headers:
             raise ValueError("Columns do not match")
 
-        with open(DATA_DIR / self.file, "w") as f:
-            csv_writer = csv.writer(
-                f,
-                quotechar='"',
-                quoting=csv.QUOTE_MINIMAL,
-                delimiter=",",
-                lineterminator="\n",
+        if current_transaction() is not None:
+            raise ValueError(f"Cannot rewrite table {self.name} in a transaction")
+
+        if self.partitioning is not None:
+            for partition, rows in zip(self.partitions, self.__route_rows(rs.rows)):
+                partition.write(ResultSet(partition.name, rs.columns, tuple(rows)))
+            table_writes[self.path] += 1
+            return
+
+        # The rows written already include the logged changes
+        lsn = self.last_lsn()
+
+        # Snapshots may still be reading the current files, so the rows are
+        # written to the files of a new generation
+        retired = self.generation_files()
+        self.__next_generation()
+        self.file = self.file_name(self.format)
+
+        if self.format == "columnar":
+            rows = list(rs.rows)
+            columnar.write(self.path, self.columns, rows)
+            written = list(enumerate(rows))
+            end = len(rows)
+        else:
+            with open(self.path, "w") as f:
+                csv_writer = create_csv_writer(f)
+                csv_writer.writerow(self.headers)
+            written = self.__append_csv(rs.rows)
+            end = os.path.getsize(self.path)
+
+        durability.written(self.path)
+        buffer_pool.invalidate(self.path)
+        table_writes[self.path] += 1
+
+        self.blocks = []
+        self.__add_blocks(written, end)
+
+        # Row locators changed, so the indexes must be rebuilt
+        self.build_id_map(written)
+        for index in self.indexes:
+            self.build_index(index)
+
+        self.lsn = lsn
+        retire(self, retired)
+
+    def rebuild_indexes(self) -> None:
+        """
+        Rebuilds the id map and the indexes from the table file, in the files
+        of a new generation
+        """
+        if self.partitioning is not None:
+            for partition in self.partitions:
+                partition.rebuild_indexes()
+            return
+
+        retired = [path for path in self.generation_files() if path != self.path]
+        self.__next_generation()
+
+        self.build_id_map(self.scan_locators())
+        for index in self.indexes:
+            self.build_index(index)
+
+        retire(self, retired)
+
+    def __next_generation(self) -> None:
+        self.generation += 1
+        self.indexes = [
+            Index(column=index.column, file=self.file_name("idx", index.column))
+            for index in self.indexes
+        ]
+
+    def generation_files(self) -> List[Path]:
+        """
+        Returns the table file, id map and index files of the current
+        generation
+        """
+        files = [self.path, self.id_map.path]
+        files += [DATA_DIR / index.file for index in self.indexes]
+        return [file for file in files if file.exists()]
+
+    def log_changes(self, changes: List[Tuple[int, Optional[Row]]]) -> None:
+        """
+        Records new versions of rows, or None for deleted rows, in the
+        write-ahead log instead of rewriting the table file. The table is
+        checkpointed once enough changes pile up in the log. In a transaction,
+        the changes are held until it commits
+        """
+        if self.partitioning is not None:
+            raise ValueError(
+                f"Changes to table {self.name} are logged by its partitions"
             )
-            csv_writer.writerow(self.headers)
-            for row in rs.rows:
-                str_row = [
-                    value.isoformat()
-                    if isinstance(value, datetime)
-                    else f"{value:.4f}"
-                    if isinstance(value, float)
-                    else str(value)
-                    if value is not None
-                    else ""
-                    for value in row
-                ]
-                csv_writer.writerow(str_row)
+
+        table_writes[self.path] += 1
+        current = current_transaction()
+        if current is not None:
+            current.write_set(self.path).changes.update(
+                (id, None if row is None else self.stored_rows([row])[0])
+                for id, row in changes
+            )
+            return
+
+        self.wal.append(self.name, changes, self.last_lsn() + 1)
+        self.checkpoint_if_full()
+
+    def checkpoint_if_full(self) -> None:
+        """
+        Checkpoints the table once enough changes pile up in the log
+        """
+        threshold = wal.CHECKPOINT_CHANGES
+        logged = self.wal.changes(self.name, self.lsn)
+        if threshold is not None and len(logged) >= threshold:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """
+        Writes the changes in the write-ahead log to the table file
+        """
+        if self.partitioning is not None:
+            for partition in self.partitions:
+                partition.checkpoint()
+        elif self.wal.changes(self.name, self.lsn):
+            self.write(ResultSet(self.name, self.get_columns(), tuple(self.scan())))
+
+    def size(self) -> int:
+        """
+        Returns the bytes used by the table file, its indexes and id map
+        """
+        if self.partitioning is not None:
+            return sum(partition.size() for partition in self.partitions)
+
+        if self.path.is_dir():
+            size = sum(file.stat().st_size for file in self.path.iterdir())
+        else:
+            size = self.path.stat().st_size
+
+        for index in self.indexes:
+            size += (DATA_DIR / index.file).stat().st_size
+
+        if self.id_map.exists():
+            size += self.id_map.path.stat().st_size
+
+        return size
+
+    def append(self, rows: Iterable[Row]) -> None:
+        """
+        Writes the rows at the end of the table file, without reading or
+        rewriting the rows already stored. In a transaction, the rows are held
+        until it commits
+        """
+        if self.partitioning is not None:
+            # Each partition gets its rows with a single append
+            for partition, routed in zip(self.partitions, self.__route_rows(rows)):
+                if routed:
+                    partition.append(routed)
+            return
+
+        current = current_transaction()
+        if current is not None:
+            # Held rows are read and logged as they would be read back
+            current.write_set(self.path).rows.extend(self.stored_rows(rows))
+            table_writes[self.path] += 1
+            return
+
+        version = self.version()
+        if self.format == "columnar":
+            rows = list(rows)
+            end = columnar.count_rows(self.path, self.columns)
+            columnar.append(self.path, self.columns, rows)
+            appended = list(enumerate(rows, start=end))
+            new_end = end + len(rows)
+        else:
+            end = os.path.getsize(self.path)
+            appended = self.__append_csv(rows)
+            new_end = os.path.getsize(self.path)
+
+        # Only the last page changed
+        buffer_pool.appended(self.path, end, version, self.version())
+        table_writes[self.path] += 1
+
+        # Zone maps must cover the table from its first row
+        if self.blocks and self.blocks[-1].end != end:
+            self.blocks = []
+        if self.blocks or end == self.__first_locator():
+            self.__add_blocks(appended, new_end)
+
+        id_map = self.id_map
+        if id_map.exists():
+            i = self.headers.index("__id")
+            id_map.insert((row[i], locator) for locator, row in appended)
+
+        for index in self.indexes:
+            col_index = self.headers.index(index.column)
+            # Keys are the values read back from the file, like zone maps
+            to_stored = self.stored_value(self.columns[col_index])
+            tree = BPlusTree(DATA_DIR / index.file)
+            for locator, row in appended:
+                tree.insert(to_stored(row[col_index]), locator)
+
+        for file in self.generation_files():
+            durability.written(file)
+
+    def __append_csv(self, rows: Iterable[Row]) -> List[Tuple[int, Row]]:
+        buffer = io.StringIO()
+        csv_writer = create_csv_writer(buffer)
+        data = bytearray()
+        appended = []
+
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for row in rows:
+                csv_writer.writerow(format_row(row))
+                line = buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+                appended.append((offset, row))
+                offset += len(line)
+                data += line
+
+                if len(appended) % PAGE_ROWS == 0:
+                    f.write(data)
+                    data.clear()
+
+            f.write(data)
+
+        return appended
+
+    def __first_locator(self) -> int:
+        """
+        Returns the locator of the first row, right after the CSV headers
+        """
+        if self.format == "columnar":
+            return 0
+
+        with open(self.path, "rb") as f:
+            next(read_csv_records(f), None)
+            return f.tell()
+
+    def __add_blocks(self, appended: List[Tuple[int, Row]], end: int) -> None:
+        """
+        Records the zone maps of rows appended to the table file, which now
+        ends at `end`. The last block is filled up to PAGE_ROWS rows first
+        """
+        stored = [self.stored_value(column) for column in self.columns]
+
+        i = 0
+        while i < len(appended):
+            if self.blocks and self.blocks[-1].rows < PAGE_ROWS:
+                # Snapshots share the blocks, so they are never changed
+                block = dataclasses.replace(self.blocks.pop())
+            else:
+                block = Block(start=appended[i][0], end=0, rows=0, min=[], max=[])
+
+            chunk = [row for _, row in appended[i : i + PAGE_ROWS - block.rows]]
+            i += len(chunk)
+
+            minimums = []
+            maximums = []
+            for j, to_stored in enumerate(stored):
+                values = list(map(to_stored, (row[j] for row in chunk)))
+                if block.rows:
+                    values += [block.min[j], block.max[j]]
+                minimums.append(min(values))
+                maximums.append(max(values))
+
+            block.min = minimums
+            block.max = maximums
+            block.rows += len(chunk)
+            block.end = appended[i][0] if i < len(appended) else end
+            self.blocks.append(block)
+
+    def stored_rows(self, rows: Iterable[Row]) -> List[Row]:
+        """
+        Returns the rows as they are read back after storing them in the
+        table file
+        """
+        stored = [self.stored_value(column) for column in self.columns]
+        return [
+            tuple(to_stored(value) for to_stored, value in zip(stored, row))
+            for row in rows
+        ]
+
+    def stored_value(self, column: Column) -> Callable[[Any], ColumnType]:
+        """
+        Returns a function that converts a value to the one read back after
+        storing it in the table file
+        """
+        if self.format == "columnar":
+            return columnar.stored_value(column)
+
+        def read_back(value: Any) -> ColumnType:
+            return parse_value(format_row((value,))[0], column)
+
+        # Values of the column type that are stored as they are
+        if column.type == "int":
+            return lambda value: value if value.__class__ is int else read_back(value)
+        elif column.type == "datetime":
+            return lambda value: (
+                value if value.__class__ is datetime else read_back(value)
+            )
+        elif column.type == "float":
+            return lambda value: (
+                float(f"{value:.4f}") if value.__class__ is float else read_back(value)
+            )
+        return read_back
+
+    def convert(self, format: StorageFormat) -> None:
+        """
+        Rewrites the table in another storage format
+        """
+        rows = tuple(self.scan())
+        self.format = format
+        for partition in self.partitions:
+            partition.format = format
+        self.write(ResultSet(self.name, self.get_columns(), rows))
+
+    def get_index(self, column: str) -> Optional[Index]:
+        for index in self.indexes:
+            if index.column == column:
+                return index
+
+        return None
+
+    def build_index(self, index: Index) -> None:
+        if self.partitioning is not None:
+            # Each partition indexes its own rows
+            for partition in self.partitions:
+                partition_index = Index(
+                    index.column, partition.file_name("idx", index.column)
+                )
+                partition.build_index(partition_index)
+                partition.indexes.append(partition_index)
+            return
+
+        col_index = self.headers.index(index.column)
+        BPlusTree.build(
+            DATA_DIR / index.file,
+            ((row[col_index], offset) for offset, row in self.scan_locators()),
+        )
+        durability.written(DATA_DIR / index.file)
 
     def get_column(self, name: str) -> Column:
         for column in self.columns:
@@ -217,27 +1467,251 @@ class Table:
 
         raise ValueError(f"Column {name} not found in table {self.name}")
 
-    def create_row(self, values: Tuple[str], fields: Tuple[str]) -> Row:
+    def allocate_ids(self, count: int) -> range:
+        """
+        Reserves a block of consecutive __ids for rows about to be appended
+        """
+        ids = range(self.next_id, self.next_id + count)
+        self.next_id += count
+        return ids
+
+    def create_row(
+        self, values: Tuple[str], fields: Tuple[str], id: Optional[int] = None
+    ) -> Row:
+        """
+        Builds a row from values written as in a query. Without an id, the
+        next one is taken from the table
+        """
+        if id is None:
+            id = self.allocate_ids(1)[0]
+
         row = []
         for col in self.columns:
             if col.name == "__id":
-                row.append(self.next_id)
+                row.append(id)
                 continue
 
             try:
                 values_index = get_column_index(fields, col.name)
             except ValueError:
-                # If the column is not in the fields, it must be a default value
-                row.append("")
+                # Columns not in the fields get the value of an empty cell
+                row.append(parse_value("", col))
                 continue
             parsed = parse_value(values[values_index], col)
             row.append(parsed)
 
-        self.next_id += 1
-
         return tuple(row)
 
 
+@dataclass
+class Snapshot(Table):
+    """
+    Version of a table that stays the same while the table is written: the
+    stored rows up to `end` and the logged changes up to `upto`. Rewrites of
+    the table go to the files of a new generation, and appends and logged
+    changes go past those bounds, so scans of the snapshot need no locks
+    """
+
+    end: int = 0
+    upto: int = 0
+    writes: int = 0
+
+    def snapshot(self) -> "Snapshot":
+        return self
+
+    def stored_end(self) -> int:
+        return self.end
+
+    def last_lsn(self) -> int:
+        return self.upto
+
+    def write_count(self) -> int:
+        return self.writes
+
+    def write(self, rs: ResultSet) -> None:
+        raise ValueError(f"Cannot write to a snapshot of table {self.name}")
+
+    def append(self, rows: Iterable[Row]) -> None:
+        raise ValueError(f"Cannot write to a snapshot of table {self.name}")
+
+    def log_changes(self, changes: List[Tuple[int, Optional[Row]]]) -> None:
+        raise ValueError(f"Cannot write to a snapshot of table {self.name}")
+
+
+@dataclass
+class Retired:
+    """
+    Files of a generation of a table that was replaced, along with the LSN of
+    the last change folded into the generation that replaced it
+    """
+
+    table: str
+    generation: int
+    files: List[Path]
+    log: WriteAheadLog
+    lsn: int
+    # Whether the metadata that points to the new generation was saved. Until
+    # then, a crash would leave the metadata pointing to these files
+    committed: bool = False
+
+
+# Pages of every table read by this process
+buffer_pool = BufferPool(BUFFER_POOL_PAGES)
+
+# Column arrays of every table loaded by vectorized execution
+array_cache = ArrayCache(ARRAY_CACHE_VALUES)
+
+# Writes to each table file by this process, which tag cached query results
+table_writes: Counter = Counter()
+
+# Transaction started with BEGIN, whose writes are held until COMMIT
+transaction: Optional[Transaction] = None
+
+# Live snapshots of each (table, generation), which keep its files
+pins: Counter = Counter()
+pins_lock = threading.Lock()
+
+# Generations replaced by a rewrite, deleted once no snapshot reads them
+retired: List[Retired] = []
+
+
+def current_transaction() -> Optional[Transaction]:
+    """
+    Returns the transaction of the calling thread: the writes of a
+    transaction are not seen by other threads until it commits
+    """
+    if transaction is not None and transaction.thread == threading.get_ident():
+        return transaction
+    return None
+
+
+def in_transaction() -> bool:
+    return current_transaction() is not None
+
+
+def pin(snapshot: Snapshot) -> None:
+    """
+    Keeps the files of the generation of the snapshot until it is dropped
+    """
+    key = (snapshot.name, snapshot.generation)
+    with pins_lock:
+        pins[key] += 1
+    weakref.finalize(snapshot, unpin, key)
+
+
+def unpin(key: Tuple[str, int]) -> None:
+    with pins_lock:
+        pins[key] -= 1
+        if not pins[key]:
+            del pins[key]
+
+
+def retire(table: Table, files: List[Path]) -> None:
+    """
+    Schedules the files of the generation before the current one of the
+    table for deletion, along with the changes folded into the current one,
+    once the metadata is saved
+    """
+    retired.append(
+        Retired(table.name, table.generation - 1, files, table.wal, table.lsn)
+    )
+
+
+def collect_garbage() -> None:
+    """
+    Deletes the files of the committed retired generations that no snapshot
+    reads, and drops the changes folded into newer generations from the
+    write-ahead log once no snapshot of an older one needs them
+    """
+    with pins_lock:
+        pinned = set(pins)
+
+    folded: Dict[str, Retired] = {}
+    blocked: Set[str] = set()
+    for entry in list(retired):
+        if not entry.committed or (entry.table, entry.generation) in pinned:
+            blocked.add(entry.table)
+            continue
+
+        for file in entry.files:
+            buffer_pool.invalidate(file)
+            array_cache.invalidate(file)
+            if file.is_dir():
+                shutil.rmtree(file)
+            elif file.exists():
+                os.remove(file)
+        retired.remove(entry)
+
+        if entry.table not in blocked:
+            folded[entry.table] = entry
+
+    for entry in folded.values():
+        entry.log.remove(entry.table, entry.lsn)
+
+
+def merge_changes(rows: Iterable[Row], changes: Changes) -> Iterator[Row]:
+    """
+    Replaces the rows that have a logged change with their new version,
+    leaving out deleted rows. The new version of every changed row is
+    included, even when `rows` doesn't hold the old one: `rows` may be a
+    subset of the table, whose old version didn't match, and rows inserted
+    by a transaction or moved from another partition are only in the log.
+    Both inputs are ordered by __id, and so is the output
+    """
+    if not changes:
+        return iter(rows)
+
+    kept = (row for row in rows if row[0] not in changes)
+    changed = sorted(
+        (row for row in changes.values() if row is not None), key=lambda row: row[0]
+    )
+    if not changed:
+        return kept
+    return heapq.merge(kept, changed, key=lambda row: row[0])
+
+
+def create_csv_writer(f: TextIO):
+    return csv.writer(
+        f,
+        quotechar='"',
+        quoting=csv.QUOTE_MINIMAL,
+        delimiter=",",
+        lineterminator="\n",
+    )
+
+
+def format_row(row: Row) -> List[str]:
+    return [
+        value.isoformat()
+        if isinstance(value, datetime)
+        else f"{value:.4f}"
+        if isinstance(value, float)
+        else str(value)
+        if value is not None
+        else ""
+        for value in row
+    ]
+
+
+def read_csv_records(f: BinaryIO) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yields (byte offset, cells) for each CSV record of a file opened in binary
+    mode, starting at the current position
+    """
+    offsets = []
+
+    def lines() -> Iterator[str]:
+        offset = f.tell()
+        for line in iter(f.readline, b""):
+            offsets.append(offset)
+            offset += len(line)
+            yield line.decode()
+
+    for record in csv.reader(lines()):
+        yield offsets[0], record
+        offsets.clear()
+
+
 def parse_value(value: str, column: Column) -> ColumnType:
     if value == "":
         if column.type == "datetime":
@@ -265,21 +1739,159 @@ class Database:
     name: str
     tables: List[Table]
 
+    def __post_init__(self):
+        # Tables by name, so lookups don't scan the list
+        self.by_name: Dict[str, Table] = {table.name: table for table in self.tables}
+
     def get_table(self, name: str) -> Table:
+        table = self.by_name.get(name)
+        if table is None:
+            raise ValueError(f"Table {name} not found")
+        return table
+
+    def has_table(self, name: str) -> bool:
+        return name in self.by_name
+
+    def add_table(self, table: Table) -> None:
+        self.tables.append(table)
+        self.by_name[table.name] = table
+
+    def snapshot(self) -> "Database":
+        """
+        Returns a snapshot of every table, which can be read while the
+        tables are written
+        """
+        return Database(self.name, [table.snapshot() for table in self.tables])
+
+    def begin(self) -> None:
+        """
+        Starts a transaction: until COMMIT, writes to the tables are held in
+        memory and seen only by the following statements
+        """
+        global transaction
+        if transaction is not None:
+            raise ValueError("A transaction is already in progress")
+
+        transaction = Transaction({table.name: table.next_id for table in self.tables})
+
+    def commit(self) -> List[Table]:
+        """
+        Logs the writes of the transaction, inserted rows included, as a
+        single record of the write-ahead log: a crash leaves all of them or
+        none. Returns the tables written
+        """
+        global transaction
+        current = current_transaction()
+        if current is None:
+            raise ValueError("No transaction in progress")
+
+        written = []
+        logged = []
+        for table in self.tables:
+            for stored in table.stored_tables():
+                write_set = current.write_sets.get(stored.path)
+                if write_set is None:
+                    continue
+
+                if not written or written[-1] is not table:
+                    written.append(table)
+
+                changes = write_set.folded()
+                if changes:
+                    logged.append((stored, changes))
+
+        if logged:
+            logged[0][0].wal.append_all(
+                [
+                    (stored.name, stored.last_lsn() + 1, list(changes.items()))
+                    for stored, changes in logged
+                ]
+            )
+
+        # The transaction ends once its writes are logged
+        transaction = None
+        for table in written:
+            for stored in table.stored_tables():
+                if stored.path in current.write_sets:
+                    table_writes[stored.path] += 1
+        for stored, _ in logged:
+            stored.checkpoint_if_full()
+
+        return written
+
+    def rollback(self) -> None:
+        """
+        Drops the changes of the transaction
+        """
+        global transaction
+        if current_transaction() is None:
+            raise ValueError("No transaction in progress")
+
+        rolled_back, transaction = transaction, None
         for table in self.tables:
-            if table.name == name:
-                return table
+            table.next_id = rolled_back.next_ids.get(table.name, table.next_id)
+            for stored in table.stored_tables():
+                if stored.path in rolled_back.write_sets:
+                    # Results cached during the transaction included its writes
+                    table_writes[stored.path] += 1
+
 
-        raise ValueError(f"Table {name} not found")
+def catalog_file(table: str) -> Path:
+    """
+    Returns the file with the metadata of a table, in the catalog directory
+    next to meta.json
+    """
+    return META_FILE.with_name("catalog") / f"{table}.json"
 
 
 @dataclass
 class Metadata:
+    """
+    meta.json lists the tables of the database, while the metadata of each
+    table is stored in its own file in the catalog directory, so a statement
+    saves only the tables it wrote, however many there are
+    """
+
     database: Database
 
     def save(self):
-        with open(META_FILE, "w") as f:
-            f.write(json.dumps(dataclasses.asdict(self), indent=2))
+        """
+        Saves the metadata of every table and the list of tables
+        """
+        self.save_tables(self.database.tables)
+
+        with durability.replace(META_FILE) as f:
+            manifest = {
+                "name": self.database.name,
+                "tables": [table.name for table in self.database.tables],
+            }
+            f.write(json.dumps({"database": manifest}, indent=2))
+
+    def save_tables(self, tables: Iterable[Table]) -> None:
+        """
+        Commits the writes made since the last save: the files they wrote are
+        synced before the metadata that points to them replaces the old one,
+        and only then are the files the old metadata pointed to deleted
+        """
+        durability.commit()
+
+        for table in tables:
+            path = catalog_file(table.name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Other processes read either the old or the new metadata, never a
+            # partially written one
+            with durability.replace(path) as f:
+                # Datetimes in zone maps are stored in ISO format
+                f.write(json.dumps(dataclasses.asdict(table), indent=2, default=str))
+
+            for entry in retired:
+                # Including the partitions of the table, dropped ones too
+                if entry.table == table.name or entry.table.startswith(
+                    f"{table.name}."
+                ):
+                    entry.committed = True
+
+        collect_garbage()
 
     @staticmethod
     def load() -> "Metadata":
@@ -289,23 +1901,95 @@ class Metadata:
         with open(META_FILE, "r") as f:
             meta = json.loads(f.read())
 
-        return Metadata(
-            database=Database(
-                name=meta["database"]["name"],
-                tables=[
-                    Table(
-                        name=table["name"],
-                        columns=[
-                            Column(name=column["name"], type=column["type"])
-                            for column in table["columns"]
-                        ],
-                        file=table["file"],
-                        next_id=table["next_id"],
-                    )
-                    for table in meta["database"]["tables"]
-                ],
-            ),
-        )
+        tables = []
+        legacy = False
+        for table in meta["database"]["tables"]:
+            # meta.json used to hold the metadata of every table. The catalog
+            # file is newer, if a migration was interrupted
+            if isinstance(table, dict):
+                legacy = True
+                if catalog_file(table["name"]).exists():
+                    table = table["name"]
+            if isinstance(table, str):
+                with open(catalog_file(table), "r") as f:
+                    table = json.loads(f.read())
+            tables.append(load_table(table))
+
+        loaded = Metadata(database=Database(name=meta["database"]["name"], tables=tables))
+        if legacy:
+            # Writes save only the catalog files, which would leave the
+            # metadata in meta.json pointing to stale files
+            loaded.save()
+        return loaded
+
+
+def load_table(table: Dict[str, Any]) -> Table:
+    loaded = Table(
+        name=table["name"],
+        columns=[
+            Column(name=column["name"], type=column["type"])
+            for column in table["columns"]
+        ],
+        file=table["file"],
+        next_id=table["next_id"],
+        format=table.get("format", "csv"),
+        generation=table.get("generation", 0),
+        lsn=table.get("lsn", 0),
+        indexes=[
+            Index(column=index["column"], file=index["file"])
+            for index in table.get("indexes", [])
+        ],
+        blocks=[
+            Block(
+                start=block["start"],
+                end=block["end"],
+                rows=block["rows"],
+                min=load_stats(block["min"], table["columns"]),
+                max=load_stats(block["max"], table["columns"]),
+            )
+            for block in table.get("blocks", [])
+        ],
+        partitioning=load_partitioning(table.get("partitioning"), table["columns"]),
+        partitions=[load_table(partition) for partition in table.get("partitions", [])],
+    )
+
+    # Rows appended by a statement whose metadata wasn't saved, because of a
+    # crash, are in the id map: their ids are not handed out again. The rows
+    # of partitioned tables are in the id maps of the partitions
+    id_map = loaded.id_map
+    if id_map.exists():
+        loaded.next_id = max(loaded.next_id, id_map.size())
+    # Rows inserted by a transaction are in the write-ahead log until the
+    # next checkpoint
+    loaded.next_id = max(loaded.next_id, max(loaded.changes(), default=-1) + 1)
+    for partition in loaded.partitions:
+        loaded.next_id = max(loaded.next_id, partition.next_id)
+    return loaded
+
+
+def load_partitioning(
+    partitioning: Optional[Dict[str, Any]], columns: List[Dict[str, str]]
+) -> Optional[Partitioning]:
+    if partitioning is None:
+        return None
+
+    column = next(
+        column for column in columns if column["name"] == partitioning["column"]
+    )
+    bounds = partitioning["bounds"]
+    return Partitioning(
+        column=partitioning["column"],
+        method=partitioning["method"],
+        bounds=load_stats(bounds, [column] * len(bounds)),
+        buckets=partitioning["buckets"],
+    )
+
+
+def load_stats(values: List[Any], columns: List[Dict[str, str]]) -> List[ColumnType]:
+    return [
+        to_datetime(value) if column["type"] == "datetime" else value
+        for value, column in zip(values, columns)
+    ]
 
 
 @functools.lru_cache(maxsize=None)
@@ -346,7 +2030,7 @@ def validate_where(
             right_table_name = left_table_name
             right_hand_col_name = right_hand
 
-        if right_table_name not in [table.name for table in db.tables]:
+        if not db.has_table(right_table_name):
             raise ValueError(f"Invalid table in where: {right_table_name}")
 
         right_table = db.get_table(right_table_name)
@@ -356,7 +2040,7 @@ def validate_where(
             raise ValueError(
                 f"Invalid type for where: {left_col.type} != {right_col.type}"
             )
-    else:
+    elif not is_placeholder(right_hand):
         if left_col.type == "str":
             if not is_quoted_string(right_hand):
                 raise ValueError(f"Invalid string for where: {right_hand}")
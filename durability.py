@@ -0,0 +1,118 @@
+"""
+Durability of the files written to the data directory.
+
+A write survives a crash of the machine only once the file is synced to disk
+with fsync, which is slow. When that happens depends on the durability mode,
+DURABILITY in config.py or --durability:
+
+- "always": every write is synced before it returns
+- "commit": files are synced together when the metadata is saved, at the end
+  of each statement, transaction or bulk load, so a file written many times is
+  synced once
+- "off": files are never synced. A crash of the process loses nothing, but a
+  crash of the machine may lose the last writes
+
+Files that are replaced as a whole, like meta.json and the write-ahead log,
+are written to a temporary file that is synced and renamed over the old one,
+so a crash leaves either the old or the new version, never a truncated one.
+"""
+import contextlib
+import os
+from pathlib import Path
+import threading
+from typing import IO, Iterator, Literal, Set
+
+from config import DURABILITY
+
+Durability = Literal["always", "commit", "off"]
+
+MODES = ("always", "commit", "off")
+
+mode: Durability = DURABILITY
+
+# Files written since the last commit, synced by it in "commit" mode
+pending: Set[Path] = set()
+pending_lock = threading.Lock()
+
+
+def written(path: Path) -> None:
+    """
+    Records a write to a file, or to the files of a directory
+    """
+    if mode == "always":
+        sync(path)
+    elif mode == "commit":
+        with pending_lock:
+            pending.add(path)
+
+
+def commit() -> None:
+    """
+    Syncs the files written since the last commit, along with the directories
+    that hold them
+    """
+    global pending
+    with pending_lock:
+        paths, pending = pending, set()
+
+    if mode == "off":
+        return
+
+    for path in paths:
+        if path.exists():
+            sync(path)
+    for directory in {path.parent for path in paths}:
+        sync_directory(directory)
+
+
+def sync(path: Path) -> None:
+    if path.is_dir():
+        for file in path.iterdir():
+            sync(file)
+        sync_directory(path)
+        return
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_directory(path: Path) -> None:
+    """
+    Syncs the entries of a directory, so files created or renamed in it
+    survive a crash
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Directories can't be opened on Windows, where renames are durable
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def replace(path: Path, binary: bool = False) -> Iterator[IO]:
+    """
+    Opens a temporary file that replaces the file at `path` once the block
+    exits without errors. Unless durability is off, the new file is synced
+    before the rename and the directory after it
+    """
+    temp = path.with_name(path.name + ".tmp")
+    try:
+        with open(temp, "wb" if binary else "w") as f:
+            yield f
+            f.flush()
+            if mode != "off":
+                os.fsync(f.fileno())
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+    os.replace(temp, path)
+    if mode != "off":
+        sync_directory(path.parent)
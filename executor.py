@@ -0,0 +1,133 @@
+import dataclasses
+import traceback
+from typing import Any, Sequence
+
+from config import PLAN_CACHE_STATEMENTS, RESULT_CACHE_ROWS
+from db import Database, Metadata, ResultSet, in_transaction
+from plancache import PlanCache
+from query import QueryType, determine_query_type
+from query_create_index import parse_create_index
+from query_delete import parse_delete
+from query_insert import parse_insert
+from query_select import Select, parse_select
+from query_update import parse_update
+from query_vacuum import parse_vacuum
+from resultcache import ResultCache
+
+# Statements and SELECT results of the queries run by this process
+plan_cache = PlanCache(PLAN_CACHE_STATEMENTS)
+result_cache = ResultCache(RESULT_CACHE_ROWS)
+
+
+def execute_query(
+    meta: Metadata,
+    query: str,
+    vectorized: bool = False,
+    params: Sequence[Any] = (),
+    transactions: bool = False,
+) -> str:
+    """
+    Runs the query against the database, saving the metadata after writes.
+    `params` are bound to the placeholders of the query, in order.
+    `transactions` allows BEGIN, COMMIT and ROLLBACK, whose transaction must
+    outlive the query, as in server mode. Returns the text to show to the user
+    """
+    db = meta.database
+
+    type = determine_query_type(query)
+
+    try:
+        if not transactions and type in (
+            QueryType.BEGIN,
+            QueryType.COMMIT,
+            QueryType.ROLLBACK,
+        ):
+            raise ValueError("Transactions are only supported in server mode")
+
+        if type == QueryType.SELECT:
+            select = plan_cache.prepare(db, query, parse_select, params)
+            select.set_default_limit(100)
+            select.vectorized = vectorized
+            rs = run_select(db, select)
+            return str(rs)
+        elif type == QueryType.INSERT:
+            insert = plan_cache.prepare(db, query, parse_insert, params)
+            insert.execute(db)
+            save(meta, insert.table)
+            if len(insert.rows) == 1:
+                return "Inserted row"
+            return f"Inserted {len(insert.rows)} rows"
+        elif type == QueryType.UPDATE:
+            update = plan_cache.prepare(db, query, parse_update, params)
+            affected = update.execute(db)
+            save(meta, update.table)
+            if len(affected) == 0:
+                return "No rows updated"
+            elif len(affected) == 1:
+                return f"Updated 1 row: __id={affected[0]}"
+            else:
+                return f"Updated {len(affected)} rows: __id={affected}"
+        elif type == QueryType.DELETE:
+            delete = plan_cache.prepare(db, query, parse_delete, params)
+            affected = delete.execute(db)
+            save(meta, delete.table)
+            if len(affected) == 0:
+                return "No rows deleted"
+            elif len(affected) == 1:
+                return f"Deleted 1 row: __id={affected[0]}"
+            else:
+                return f"Deleted {len(affected)} rows: __id={affected}"
+        elif type == QueryType.CREATE_INDEX:
+            create_index = parse_create_index(query)
+            create_index.validate(db)
+            create_index.execute(db)
+            save(meta, create_index.table)
+            return f"Created index on {create_index.table}({create_index.column})"
+        elif type == QueryType.VACUUM:
+            vacuum = parse_vacuum(query)
+            vacuum.validate(db)
+            reclaimed = vacuum.execute(db)
+            save(meta, vacuum.table)
+            return (
+                f"Vacuumed {vacuum.table}: reclaimed {reclaimed.rows} rows, "
+                f"{reclaimed.bytes} bytes"
+            )
+        elif type == QueryType.BEGIN:
+            db.begin()
+            return "Transaction started"
+        elif type == QueryType.COMMIT:
+            meta.save_tables(db.commit())
+            return "Transaction committed"
+        elif type == QueryType.ROLLBACK:
+            db.rollback()
+            return "Transaction rolled back"
+    except ValueError as e:
+        return f"[ERROR] {e} \n\n {traceback.format_exc()}"
+
+    return ""
+
+
+def run_select(db: Database, select: Select) -> ResultSet:
+    """
+    Returns the result of the SELECT from the result cache, unless a table it
+    reads was written since it was cached
+    """
+    key = select.cache_key()
+    versions = select.table_versions(db)
+
+    rs = result_cache.get(key, versions)
+    if rs is None:
+        rs = select.execute(db)
+        rs = dataclasses.replace(rs, rows=tuple(rs.rows))
+        result_cache.put(key, versions, rs)
+
+    return rs
+
+
+def save(meta: Metadata, table: str) -> None:
+    """
+    Saves the metadata of the table after a write, unless the write is part
+    of a transaction: then it is saved on COMMIT
+    """
+    if not in_transaction():
+        meta.save_tables([meta.database.get_table(table)])
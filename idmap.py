@@ -0,0 +1,89 @@
+from pathlib import Path
+import struct
+from typing import Any, Iterable, Optional, Tuple
+
+
+SLOT = struct.Struct("<q")
+
+
+class IdMap:
+    """
+    Direct-address map from __id to row locator, stored in a single file.
+
+    The file is an array of slots indexed by __id, each holding the locator of
+    the row plus one, so that 0 marks ids without a row. As ids are handed out
+    in sequence, the array is dense and a lookup is a single read at
+    id * SLOT.size.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @staticmethod
+    def build(path: Path, entries: Iterable[Tuple[Any, int]]) -> "IdMap":
+        """
+        Writes a new map from (id, locator) pairs
+        """
+        with open(path, "wb"):
+            pass
+
+        id_map = IdMap(path)
+        id_map.insert(entries)
+        return id_map
+
+    def insert(self, entries: Iterable[Tuple[Any, int]]) -> None:
+        """
+        Adds (id, locator) pairs. Rows with ids that can't address a slot make
+        the map unusable, so it is removed
+        """
+        slots = bytearray()
+        first = None
+        with open(self.path, "r+b") as f:
+            for id, locator in entries:
+                if id.__class__ is not int or id < 0:
+                    break
+
+                if first is not None and id == first + len(slots) // SLOT.size:
+                    slots += SLOT.pack(locator + 1)
+                    continue
+
+                # Consecutive ids are written together
+                self.__write(f, first, slots)
+                first = id
+                slots = bytearray(SLOT.pack(locator + 1))
+            else:
+                self.__write(f, first, slots)
+                return
+
+        self.path.unlink()
+
+    def __write(self, f: Any, first: Optional[int], slots: bytearray) -> None:
+        if first is not None:
+            f.seek(first * SLOT.size)
+            f.write(slots)
+
+    def get(self, id: int) -> Optional[int]:
+        """
+        Returns the locator of the row with the id, if there is one
+        """
+        if id < 0:
+            return None
+
+        with open(self.path, "rb") as f:
+            f.seek(id * SLOT.size)
+            slot = f.read(SLOT.size)
+
+        if len(slot) < SLOT.size:
+            return None
+
+        (locator,) = SLOT.unpack(slot)
+        return locator - 1 if locator else None
+
+    def size(self) -> int:
+        """
+        Returns the number of slots, one past the highest id in the map
+        """
+        return self.path.stat().st_size // SLOT.size
+
+    def exists(self) -> bool:
+        return self.path.exists()
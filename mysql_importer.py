@@ -134,5 +134,5 @@ def import_mysql(user: str, password: str, host: str, port: int, database: str):
                         rows=tuple(imported_rows),
                     )
                 )
-                meta.database.tables.append(table)
+                meta.database.add_table(table)
                 meta.save()
@@ -0,0 +1,153 @@
+"""
+Cache of parsed and validated statements, keyed by the query text.
+
+Values in WHERE conditions, UPDATE SET assignments and INSERT VALUES can be
+written as placeholders (`?` or `%s`) and passed as parameters, so a statement
+run many times with different values is parsed and validated once. Running it
+again only binds the parameters to a copy of the cached statement.
+
+Statements are validated against the columns of the tables they read or
+write, so a plan is reused as long as those don't change. The server reads a
+new snapshot of the database after every write, which keeps the same tables.
+"""
+from collections import OrderedDict
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from db import Column, Database
+from query import Where, is_placeholder
+
+Statement = TypeVar("Statement")
+
+
+@dataclass
+class Plan:
+    statement: Any
+    # Columns of the tables of the statement when it was validated
+    tables: Dict[str, List[Column]]
+
+    def is_valid(self, db: Database) -> bool:
+        return all(
+            db.has_table(name) and db.get_table(name).columns == columns
+            for name, columns in self.tables.items()
+        )
+
+
+class PlanCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.plans: "OrderedDict[str, Plan]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def prepare(
+        self,
+        db: Database,
+        query: str,
+        parse: Callable[[str], Statement],
+        params: Sequence[Any] = (),
+    ) -> Statement:
+        """
+        Returns the statement of the query with the parameters bound, parsing
+        and validating it only if it is not cached
+        """
+        with self.lock:
+            plan = self.plans.get(query)
+            if plan is None or not plan.is_valid(db):
+                self.misses += 1
+                statement = parse(query)
+                statement.validate(db)  # type: ignore
+
+                plan = Plan(statement, statement_tables(db, statement))
+                self.plans[query] = plan
+                while len(self.plans) > self.capacity:
+                    self.plans.popitem(last=False)
+            else:
+                self.hits += 1
+
+            self.plans.move_to_end(query)
+        return bind(plan.statement, params)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.plans.clear()
+
+
+def statement_tables(db: Database, statement: Any) -> Dict[str, List[Column]]:
+    """
+    Returns a copy of the columns of the tables the statement reads or writes
+    """
+    names = [statement.table]
+    if getattr(statement, "join_table", None):
+        names.append(statement.join_table)
+    return {name: list(db.get_table(name).columns) for name in names}
+
+
+def bind(statement: Statement, params: Sequence[Any]) -> Statement:
+    """
+    Returns a copy of the statement with its placeholders replaced by the
+    parameters, in the order they appear in the query
+    """
+    values = iter(params)
+    bound = 0
+
+    def bind_value(value: str) -> str:
+        nonlocal bound
+        if not is_placeholder(value):
+            return value
+
+        bound += 1
+        try:
+            return to_literal(next(values))
+        except StopIteration:
+            raise ValueError(f"Missing value for parameter {bound}")
+
+    def bind_where(where: Optional[Where]) -> Optional[Where]:
+        if where is None:
+            return None
+
+        return Where(
+            left_hand=where.left_hand,
+            right_hand=bind_value(where.right_hand),
+            operator=where.operator,
+            or_where=bind_where(where.or_where),
+            and_where=bind_where(where.and_where),
+        )
+
+    # Running a statement may change it, so it is always copied
+    changes = {}
+    # UPDATE SET and INSERT VALUES come before the WHERE clause
+    if hasattr(statement, "values"):
+        changes["values"] = [bind_value(value) for value in statement.values]
+    if hasattr(statement, "rows"):
+        changes["rows"] = [
+            [bind_value(value) for value in values] for values in statement.rows
+        ]
+    if hasattr(statement, "where"):
+        changes["where"] = bind_where(statement.where)
+    statement = dataclasses.replace(statement, **changes)  # type: ignore
+
+    if bound != len(params):
+        raise ValueError(f"Expected {bound} parameters, got {len(params)}")
+
+    return statement
+
+
+def to_literal(value: Any) -> str:
+    """
+    Writes a parameter as it would be written in the query
+    """
+    if isinstance(value, str):
+        return f"'{value}'"
+    elif isinstance(value, datetime):
+        return f"'{value.isoformat()}'"
+    elif isinstance(value, bool):
+        return str(int(value))
+    elif isinstance(value, (int, float)):
+        return str(value)
+
+    raise ValueError(f"Invalid parameter: {value!r}")
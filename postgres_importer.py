@@ -124,5 +124,5 @@ def import_postgres(connection_string: str):
                         rows=tuple(imported_rows),
                     )
                 )
-                meta.database.tables.append(table)
+                meta.database.add_table(table)
                 meta.save()
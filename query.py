@@ -1,11 +1,15 @@
+import dataclasses
 from dataclasses import dataclass
 from enum import Enum
 import re
-from typing import Literal, Optional
+from typing import List, Literal, Optional, Set
 
 
 Operator = Literal["=", ">", "<", ">=", "<=", "!="]
 
+# Stand for values bound when the query is run, see plancache.py
+PLACEHOLDERS = ("?", "%s")
+
 
 @dataclass
 class Where:
@@ -16,6 +20,44 @@ class Where:
     and_where: Optional["Where"]
 
 
+def where_columns(where: Where) -> Set[str]:
+    """
+    Returns the operands of every condition in the WHERE clause. Values are
+    included too, so the result must be matched against known column names
+    """
+    columns = {where.left_hand, where.right_hand}
+    if where.and_where:
+        columns |= where_columns(where.and_where)
+    if where.or_where:
+        columns |= where_columns(where.or_where)
+    return columns
+
+
+def split_conjuncts(where: Where) -> List[Where]:
+    """
+    Splits the WHERE clause into conditions that must all be true
+    """
+    if where.or_where:
+        return [where]
+
+    conjuncts = [dataclasses.replace(where, and_where=None)]
+    if where.and_where:
+        conjuncts += split_conjuncts(where.and_where)
+    return conjuncts
+
+
+def join_conjuncts(conjuncts: List[Where]) -> Optional[Where]:
+    """
+    Combines conditions that must all be true into a single WHERE clause
+    """
+    if not conjuncts:
+        return None
+
+    # Conditions with an OR go last, so the first ones stay usable by indexes
+    conjuncts = sorted(conjuncts, key=lambda conjunct: conjunct.or_where is not None)
+    return dataclasses.replace(conjuncts[0], and_where=join_conjuncts(conjuncts[1:]))
+
+
 def parse_where(query_part: str):
     """
     id = 1
@@ -110,6 +152,11 @@ class QueryType(Enum):
     INSERT = "insert"
     UPDATE = "update"
     DELETE = "delete"
+    CREATE_INDEX = "create index"
+    VACUUM = "vacuum"
+    BEGIN = "begin"
+    COMMIT = "commit"
+    ROLLBACK = "rollback"
 
 
 def determine_query_type(query: str):
@@ -123,6 +170,19 @@ def determine_query_type(query: str):
         return QueryType.UPDATE
     elif query.startswith("delete"):
         return QueryType.DELETE
+    elif query.startswith("create index"):
+        return QueryType.CREATE_INDEX
+    elif query.startswith("vacuum"):
+        return QueryType.VACUUM
+
+    # Transaction statements have no arguments
+    statement = " ".join(query.replace(";", "").split())
+    if statement in ("begin", "begin transaction", "start transaction"):
+        return QueryType.BEGIN
+    elif statement in ("commit", "commit transaction"):
+        return QueryType.COMMIT
+    elif statement in ("rollback", "rollback transaction"):
+        return QueryType.ROLLBACK
 
 
 def is_quoted_string(string: str) -> bool:
@@ -136,3 +196,7 @@ def unquote_string(string: str) -> str:
     if is_quoted_string(strip):
         return strip[1:-1]
     return strip
+
+
+def is_placeholder(string: str) -> bool:
+    return string in PLACEHOLDERS
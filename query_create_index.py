@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+import re
+
+from db import Database, Index
+
+
+@dataclass
+class CreateIndex:
+    table: str
+    column: str
+
+    def validate(self, db: Database) -> None:
+        if not db.has_table(self.table):
+            raise ValueError(f"Invalid table: {self.table}")
+
+        table = db.get_table(self.table)
+        if self.column not in table.headers:
+            raise ValueError(f"Invalid column: {self.column} in table {self.table}")
+
+        if table.get_index(self.column):
+            raise ValueError(f"Index on {self.table}({self.column}) already exists")
+
+    def execute(self, db: Database) -> Index:
+        table = db.get_table(self.table)
+
+        index = Index(column=self.column, file=table.file_name("idx", self.column))
+        table.build_index(index)
+        table.indexes.append(index)
+
+        return index
+
+
+def parse_create_index(query: str) -> CreateIndex:
+    """
+    CREATE INDEX ON users (id)
+    """
+    query = query.replace(";", "").replace("\n", " ").replace("\t", " ").strip()
+    lower = query.lower()
+
+    if not lower.startswith("create index"):
+        raise ValueError("Invalid query")
+
+    match = re.search(r"^create\s+index\s+on\s+(\w+)\s*\(\s*(\w+)\s*\)$", lower)
+    if match is None:
+        raise ValueError("Invalid CREATE INDEX, expected CREATE INDEX ON table(column)")
+
+    return CreateIndex(table=match.group(1), column=match.group(2))
@@ -1,9 +1,9 @@
 from dataclasses import dataclass
 import re
-from typing import List, Optional
-from db import Database
+from typing import Optional
+from db import Database, IdSet
 
-from query import Where, parse_where
+from query import Where, parse_where, where_columns
 
 
 @dataclass
@@ -12,7 +12,7 @@ class Delete:
     where: Optional[Where]
 
     def validate(self, db: Database) -> None:
-        if self.table not in [table.name for table in db.tables]:
+        if not db.has_table(self.table):
             raise ValueError(f"Invalid table: {self.table}")
 
         table = db.get_table(self.table)
@@ -23,27 +23,32 @@ class Delete:
                     f"Invalid column: {self.where.left_hand} in table {self.table}"
                 )
 
-    def execute(self, db: Database) -> List[int]:
+    def execute(self, db: Database) -> IdSet:
+        """
+        Logs a tombstone for the rows that satisfy the WHERE clause in the
+        write-ahead log. Returns the ids of the deleted rows
+        """
         table = db.get_table(self.table)
 
-        rs = table.read()
-
+        columns = {"__id"}
         if self.where:
-            filtered = rs.where(self.where)
-        else:
-            filtered = rs
-
-        affected_ids = [row[0] for row in filtered.rows]
-
-        for id in affected_ids:
-            if not isinstance(id, int):
-                raise ValueError(f"Invalid id {id} in table {self.table}")
-
-        rs.rows = tuple(row for row in rs.rows if row[0] not in affected_ids)
-
-        table.write(rs)
-
-        return affected_ids
+            columns |= where_columns(self.where)
+
+        affected = IdSet()
+        # Partitions that can't hold rows satisfying the WHERE are not read
+        for partition in table.prune(self.where):
+            deleted = []
+            for row in partition.scan(self.where, columns):
+                id = row[0]
+                if not isinstance(id, int):
+                    raise ValueError(f"Invalid id {id} in table {self.table}")
+                affected.add(id)
+                deleted.append(id)
+
+            if deleted:
+                partition.log_changes([(id, None) for id in deleted])
+
+        return affected
 
 
 def parse_delete(query: str) -> Delete:
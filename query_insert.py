@@ -4,21 +4,22 @@ from datetime import datetime
 import re
 from typing import Any, List
 
-from db import Database
-from query import is_quoted_string, unquote_string
+from db import Column, Database
+from query import is_placeholder, is_quoted_string, unquote_string
 
 
 @dataclass
 class Insert:
     table: str
     fields: List[str]
-    values: List[Any]
+    rows: List[List[Any]]
 
     def validate(self, db: Database) -> None:
-        if len(self.fields) != len(self.values):
-            raise ValueError("Number of fields and values must match")
+        for values in self.rows:
+            if len(self.fields) != len(values):
+                raise ValueError("Number of fields and values must match")
 
-        if self.table not in [table.name for table in db.tables]:
+        if not db.has_table(self.table):
             raise ValueError(f"Invalid table: {self.table}")
 
         if "__id" in self.fields:
@@ -29,55 +30,73 @@ class Insert:
             if field not in table.headers:
                 raise ValueError(f"Invalid column: {field} in table {self.table}")
 
-            value = self.values[index]
             col = table.get_column(field)
-            if col.type == "str":
-                if not is_quoted_string(value):
-                    raise ValueError(f"Invalid string for column {field}: {value}")
-            elif col.type == "int":
-                try:
-                    int(value)
-                except ValueError:
-                    raise ValueError(f"Invalid int for column {field}: {value}")
-            elif col.type == "float":
-                try:
-                    float(value)
-                except ValueError:
-                    raise ValueError(f"Invalid float for column {field}: {value}")
-            elif col.type == "datetime":
-                if not is_quoted_string(value):
-                    raise ValueError(f"Invalid string for column {field}: {value}")
-
-                try:
-                    datetime.fromisoformat(unquote_string(value))
-                except ValueError:
-                    raise ValueError(f"Invalid date for column {field}: {value}")
+            for values in self.rows:
+                validate_value(col, field, values[index])
 
     def execute(self, db: Database) -> None:
         table = db.get_table(self.table)
 
-        rs = table.read()
-
-        rs.rows = rs.rows + tuple(
-            [table.create_row(tuple(self.values), tuple(self.fields))]
+        # The __ids come from the table metadata, so the stored rows are
+        # never read. All rows are written with a single append
+        fields = tuple(self.fields)
+        ids = table.allocate_ids(len(self.rows))
+        table.append(
+            [
+                table.create_row(tuple(values), fields, id)
+                for id, values in zip(ids, self.rows)
+            ]
         )
 
-        table.write(rs)
+
+def validate_value(col: Column, field: str, value: Any) -> None:
+    if is_placeholder(value):
+        # Bound values are converted when the statement runs
+        return
+    elif col.type == "str":
+        if not is_quoted_string(value):
+            raise ValueError(f"Invalid string for column {field}: {value}")
+    elif col.type == "int":
+        try:
+            int(value)
+        except ValueError:
+            raise ValueError(f"Invalid int for column {field}: {value}")
+    elif col.type == "float":
+        try:
+            float(value)
+        except ValueError:
+            raise ValueError(f"Invalid float for column {field}: {value}")
+    elif col.type == "datetime":
+        if not is_quoted_string(value):
+            raise ValueError(f"Invalid string for column {field}: {value}")
+
+        try:
+            datetime.fromisoformat(unquote_string(value))
+        except ValueError:
+            raise ValueError(f"Invalid date for column {field}: {value}")
 
 
 def parse_insert(query: str) -> Insert:
     """
     INSERT INTO users (id, name) VALUES (1, "John")
+    INSERT INTO users (id, name) VALUES (1, "John"), (2, "Mary")
     """
-    lower = query.lower().replace(";", "").replace("\n", " ").replace("\t", " ").strip()
+    query = query.replace(";", "").replace("\n", " ").replace("\t", " ").strip()
+    lower = query.lower()
 
     if not lower.startswith("insert into"):
         raise ValueError("Invalid query")
 
-    between_parenthesis: List[str] = re.findall(r"\((.*?)\)", query)
+    values_keyword = re.search(r"\)\s*values\s*\(", lower)
+    if values_keyword is None:
+        raise ValueError("Missing VALUES keyword")
+
+    fields_part = query[: values_keyword.start() + 1]
+    values_part = query[values_keyword.end() - 1 :]
 
-    if len(between_parenthesis) != 2:
-        raise ValueError("Query must have exactly two sets of parentheses")
+    between_parenthesis: List[str] = re.findall(r"\((.*?)\)", fields_part)
+    if len(between_parenthesis) != 1:
+        raise ValueError("Query must have one set of parentheses before VALUES")
 
     table = re.search(r"into\s+(\w+)\s*\(", lower)
     if table is None:
@@ -85,24 +104,28 @@ def parse_insert(query: str) -> Insert:
     table = table.group(1)
 
     fields = []
-    for fields_part in between_parenthesis[0].split(","):
-        sanitized = fields_part.strip("(),").strip()
+    for field_part in between_parenthesis[0].split(","):
+        sanitized = field_part.strip("(),").strip()
 
         if sanitized:
             fields.append(sanitized.lower())
 
-    if re.search(r"\)\s+values\s*\(", lower) is None:
-        raise ValueError("Missing VALUES keyword")
+    row_pattern = r"\(([^)]*)\)"
+    if re.fullmatch(rf"{row_pattern}(\s*,\s*{row_pattern})*", values_part) is None:
+        raise ValueError("Invalid VALUES, expected (...), (...)")
 
-    values = []
-    for values_part in between_parenthesis[1].split(","):
-        sanitized = values_part.strip("(),").strip()
+    rows = []
+    for row_part in re.findall(row_pattern, values_part):
+        values = []
+        for value_part in row_part.split(","):
+            sanitized = value_part.strip("(),").strip()
 
-        if sanitized:
-            values.append(sanitized)
+            if sanitized:
+                values.append(sanitized)
+        rows.append(values)
 
     return Insert(
         table=table,
         fields=fields,
-        values=values,
+        rows=rows,
     )
@@ -1,9 +1,29 @@
+import dataclasses
 from dataclasses import dataclass
+import heapq
+import itertools
+import operator
+from pathlib import Path
 import re
-from typing import List, Optional, cast
-
-from db import Database, Direction, ResultSet, validate_where
-from query import Where, parse_where
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, cast
+
+from db import (
+    Database,
+    Direction,
+    ResultSet,
+    Row,
+    Table,
+    filter_rows,
+    validate_where,
+)
+import vectorized
+from query import (
+    Where,
+    join_conjuncts,
+    parse_where,
+    split_conjuncts,
+    where_columns,
+)
 
 
 @dataclass
@@ -21,20 +41,22 @@ class Select:
     where: Optional[Where]
     order_by: Optional[OrderBy]
     limit: Optional[int]
+    # Evaluate WHERE over NumPy column arrays instead of row by row
+    vectorized: bool = False
 
     @property
     def is_join(self) -> bool:
         return self.join_table is not None and self.join_on is not None
 
     def validate(self, db: Database) -> None:
-        if self.table not in [table.name for table in db.tables]:
+        if not db.has_table(self.table):
             raise ValueError(f"Invalid table: {self.table}")
 
         table = db.get_table(self.table)
         headers = table.headers
 
         if self.join_table:
-            if self.join_table not in [table.name for table in db.tables]:
+            if not db.has_table(self.join_table):
                 raise ValueError(f"Invalid table: {self.join_table}")
 
             join_table = db.get_table(self.join_table)
@@ -63,7 +85,7 @@ class Select:
             for field in self.fields:
                 if "." in field:
                     table_name = field.split(".")[0]
-                    if table_name not in [table.name for table in db.tables]:
+                    if not db.has_table(table_name):
                         raise ValueError(f"Invalid table in field: {table_name}")
                 if field not in headers:
                     raise ValueError(f"Invalid column: {field}")
@@ -71,46 +93,207 @@ class Select:
     def execute(self, db: Database) -> ResultSet:
         table = db.get_table(self.table)
 
-        rs = table.read(prefixed=self.is_join)
-
         if self.join_table and self.join_on:
             join_table = db.get_table(self.join_table)
-            join_rs = join_table.read(prefixed=True)
+            pushed, remaining = self.__push_down_where(table, join_table)
+
+            rs = self.__read_join_input(table, pushed.get(table.name))
+            join_rs = self.__read_join_input(join_table, pushed.get(join_table.name))
             rs = rs.inner_join(join_rs, self.join_on)
 
-        if self.where:
-            rs = rs.where(self.where)
+            table_name = rs.table_name
+            columns = rs.columns
+            rows: Iterable[Row] = rs.rows
+            if remaining:
+                rows = filter_rows(rows, columns, remaining)
+        else:
+            table_name = table.name
+            columns = table.get_columns()
+            rows = self.__scan(table, self.where, self.referenced_columns(table))
 
+        # Rows flow through WHERE, projection and LIMIT one at a time, so only
+        # ORDER BY needs to hold the whole result in memory
+        headers = [column.name.lower() for column in columns]
         if self.fields == ["*"]:
-            self.fields = rs.headers
+            self.fields = headers
         else:
-            col_indexes = [rs.headers.index(field) for field in self.fields]
-            rs.rows = tuple(tuple(row[i] for i in col_indexes) for row in rs.rows)
-            rs.columns = tuple(rs.columns[i] for i in col_indexes)
+            col_indexes = [headers.index(field) for field in self.fields]
+            rows = (tuple(row[i] for i in col_indexes) for row in rows)
+            columns = tuple(columns[i] for i in col_indexes)
+            headers = [headers[i] for i in col_indexes]
 
         if self.order_by:
-            if self.order_by.field not in rs.headers:
+            if self.order_by.field not in headers:
                 raise ValueError(
                     f"Invalid column: {self.order_by.field} in table {self.table}"
                 )
-            col_index = rs.headers.index(self.order_by.field)
-            rows = sorted(
-                rs.rows,
-                key=lambda row: row[col_index],
-                reverse=self.order_by.direction == "desc",
+            key = operator.itemgetter(headers.index(self.order_by.field))
+            descending = self.order_by.direction == "desc"
+
+            if self.limit:
+                # Keep only the top rows in a heap of LIMIT entries instead of
+                # sorting the whole result. Both are stable, like sorted()
+                if descending:
+                    rows = heapq.nlargest(self.limit, rows, key=key)
+                else:
+                    rows = heapq.nsmallest(self.limit, rows, key=key)
+            else:
+                rows = sorted(rows, key=key, reverse=descending)
+        elif self.limit:
+            rows = itertools.islice(rows, self.limit)
+
+        return ResultSet(table_name, columns, tuple(rows))
+
+    def __push_down_where(
+        self, table: Table, join_table: Table
+    ) -> Tuple[Dict[str, Where], Optional[Where]]:
+        """
+        Splits the WHERE conditions of a join into the ones that reference a
+        single table, which are applied to that table before joining, and the
+        ones that must be applied after the join
+        """
+        if not self.where:
+            return {}, None
+
+        # A self join can't tell which side a condition refers to
+        if table.name == join_table.name:
+            return {}, self.where
+
+        headers = set(table.prefixed_headers + join_table.prefixed_headers)
+        pushed: Dict[str, List[Where]] = {table.name: [], join_table.name: []}
+        remaining = []
+        for conjunct in split_conjuncts(self.where):
+            referenced = {
+                column.split(".")[0]
+                for column in where_columns(conjunct)
+                if column in headers
+            }
+            if len(referenced) == 1:
+                pushed[referenced.pop()].append(conjunct)
+            else:
+                remaining.append(conjunct)
+
+        pushed_where = {
+            name: join_conjuncts(conjuncts)
+            for name, conjuncts in pushed.items()
+            if conjuncts
+        }
+        return pushed_where, join_conjuncts(remaining)
+
+    def __read_join_input(self, table: Table, where: Optional[Where]) -> ResultSet:
+        if where:
+            # Conditions use prefixed column names, but the table scan doesn't
+            where = unprefix_where(where, table)
+
+        return ResultSet(
+            table_name=table.name,
+            columns=table.get_columns(prefixed=True),
+            rows=tuple(self.__scan(table, where, self.referenced_columns(table))),
+        )
+
+    def __scan(
+        self, table: Table, where: Optional[Where], columns: Optional[Set[str]]
+    ) -> Iterator[Row]:
+        # Partitions that can't hold rows satisfying the WHERE are not read
+        return itertools.chain.from_iterable(
+            self.__scan_stored(stored, where, columns) for stored in table.prune(where)
+        )
+
+    def __scan_stored(
+        self, table: Table, where: Optional[Where], columns: Optional[Set[str]]
+    ) -> Iterator[Row]:
+        # The id map or an index read less than any full scan, vectorized or not
+        if (
+            self.vectorized
+            and where
+            and table.find_id(where) is None
+            and not table.find_index(where)
+        ):
+            return vectorized.scan(table, where, columns)
+
+        return table.scan(where, columns)
+
+    def cache_key(self) -> str:
+        """
+        Identifies the result of the statement, whatever its formatting
+        """
+        return repr(
+            (
+                self.fields,
+                self.table,
+                self.join_table,
+                self.join_on,
+                self.where,
+                self.order_by,
+                self.limit,
             )
-            rs.rows = tuple(rows)
+        )
 
-        if self.limit:
-            rs.rows = rs.rows[: self.limit]
+    def table_versions(self, db: Database) -> Dict[Path, int]:
+        """
+        Returns the write counters of the tables read by the statement
+        """
+        tables = [db.get_table(self.table)]
+        if self.join_table:
+            tables.append(db.get_table(self.join_table))
+
+        # Partitions are written on their own
+        return {
+            stored.path: stored.write_count()
+            for table in tables
+            for stored in [table, *table.partitions]
+        }
+
+    def referenced_columns(self, table: Table) -> Optional[Set[str]]:
+        """
+        Returns the columns of the table used by the SELECT list, WHERE, JOIN
+        ON and ORDER BY, or None if all are. Joins reference table.column
+        """
+        if self.fields == ["*"]:
+            return None
+
+        referenced = set(self.fields)
+        if self.where:
+            referenced |= where_columns(self.where)
+        if self.join_on:
+            referenced |= where_columns(self.join_on)
+        if self.order_by:
+            referenced.add(self.order_by.field)
 
-        return rs
+        if self.is_join:
+            return {
+                column.name
+                for column in table.columns
+                if f"{table.name}.{column.name}" in referenced
+            }
+
+        return {column.name for column in table.columns if column.name in referenced}
 
     def set_default_limit(self, limit: int) -> None:
         if not self.limit:
             self.limit = limit
 
 
+def unprefix_where(where: Where, table: Table) -> Where:
+    """
+    Replaces table.column names in the WHERE clause with column
+    """
+    prefixed_headers = table.prefixed_headers
+
+    def unprefix(name: str) -> str:
+        if name in prefixed_headers:
+            return name[len(table.name) + 1 :]
+        return name
+
+    return dataclasses.replace(
+        where,
+        left_hand=unprefix(where.left_hand),
+        right_hand=unprefix(where.right_hand),
+        and_where=unprefix_where(where.and_where, table) if where.and_where else None,
+        or_where=unprefix_where(where.or_where, table) if where.or_where else None,
+    )
+
+
 def parse_select(query: str) -> Select:
     """
     SELECT * FROM users WHERE id = 1 AND age > 18 ORDER BY id DESC
@@ -1,10 +1,16 @@
 from dataclasses import dataclass
 from datetime import datetime
 import re
-from typing import Any, List, Optional
-from db import Database, parse_value, validate_where
+from typing import Any, Dict, List, Optional, Tuple
+from db import Database, IdSet, Row, parse_value, validate_where
 
-from query import Where, is_quoted_string, parse_where, unquote_string
+from query import (
+    Where,
+    is_placeholder,
+    is_quoted_string,
+    parse_where,
+    unquote_string,
+)
 
 
 @dataclass
@@ -15,7 +21,7 @@ class Update:
     where: Optional[Where]
 
     def validate(self, db: Database) -> None:
-        if self.table not in [table.name for table in db.tables]:
+        if not db.has_table(self.table):
             raise ValueError(f"Invalid table: {self.table}")
 
         if len(self.fields) != len(self.values):
@@ -30,7 +36,10 @@ class Update:
 
             value = self.values[index]
             col = table.get_column(field)
-            if col.type == "str":
+            if is_placeholder(value):
+                # Bound values are converted when the statement runs
+                continue
+            elif col.type == "str":
                 if not is_quoted_string(value):
                     raise ValueError(f"Invalid string for column {field}: {value}")
             elif col.type == "int":
@@ -55,39 +64,51 @@ class Update:
         if self.where:
             validate_where(self.where, db, table.headers, table.name)
 
-    def execute(self, db: Database) -> List[int]:
+    def execute(self, db: Database) -> IdSet:
+        """
+        Logs the new version of the rows that satisfy the WHERE clause in the
+        write-ahead log. Returns the ids of the updated rows
+        """
         table = db.get_table(self.table)
+        columns = table.get_columns()
+
+        # Column indexes and new values don't depend on the row
+        assignments = []
+        for field, value in zip(self.fields, self.values):
+            col_index = table.headers.index(field)
+            assignments.append((col_index, parse_value(value, columns[col_index])))
+
+        affected = IdSet()
+        # Changes of each partition, logged once every partition was read so
+        # rows moved to a partition are not updated again
+        changes: Dict[str, List[Tuple[int, Optional[Row]]]] = {}
+        # Partitions that can't hold rows satisfying the WHERE are not read
+        for partition in table.prune(self.where):
+            for row in partition.scan(self.where):
+                id = row[0]
+                if not isinstance(id, int):
+                    raise ValueError(f"Invalid id {id} in table {self.table}")
+                affected.add(id)
 
-        rs = table.read()
-
-        if self.where:
-            filtered = rs.where(self.where)
-        else:
-            filtered = rs
-
-        affected_ids = [row[0] for row in filtered.rows]
-
-        for id in affected_ids:
-            if not isinstance(id, int):
-                raise ValueError(f"Invalid id {id} in table {self.table}")
-
-        new_rows = []
-        for row in rs.rows:
-            if row[0] in affected_ids:
                 mutable_row = list(row)
-                for field_index, field in enumerate(self.fields):
-                    col_index = table.headers.index(field)
-                    mutable_row[col_index] = parse_value(
-                        self.values[field_index], table.columns[col_index]
-                    )
-                new_rows.append(mutable_row)
-            else:
-                new_rows.append(row)
-
-        rs.rows = tuple(new_rows)
-        table.write(rs)
-
-        return affected_ids
+                for col_index, value in assignments:
+                    mutable_row[col_index] = value
+                new_row = tuple(mutable_row)
+
+                target = table.route(new_row)
+                if target is not partition:
+                    # Rows whose partition column changed move to their new
+                    # partition, keeping their __id: they are logged there
+                    # like a change, which replaces a tombstone left by an
+                    # earlier move
+                    changes.setdefault(partition.name, []).append((id, None))
+                changes.setdefault(target.name, []).append((id, new_row))
+
+        for partition in table.stored_tables():
+            if partition.name in changes:
+                partition.log_changes(changes[partition.name])
+
+        return affected
 
 
 def parse_update(query: str) -> Update:
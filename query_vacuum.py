@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+import re
+
+from db import Database
+
+
+@dataclass
+class Reclaimed:
+    rows: int
+    bytes: int
+
+
+@dataclass
+class Vacuum:
+    table: str
+
+    def validate(self, db: Database) -> None:
+        if not db.has_table(self.table):
+            raise ValueError(f"Invalid table: {self.table}")
+
+    def execute(self, db: Database) -> Reclaimed:
+        """
+        Folds the changes logged for the table into its file, dropping dead
+        row versions from the table and the write-ahead log, and rebuilds its
+        indexes and id map. Tables without logged changes only get those
+        rebuilt.
+
+        The old files and logged changes are deleted once the metadata is
+        saved, and the bytes they used are counted as reclaimed
+        """
+        table = db.get_table(self.table)
+
+        reclaimed = Reclaimed(rows=0, bytes=0)
+        # Partitions are vacuumed one by one
+        for stored in table.stored_tables():
+            logged = stored.wal.count(stored.name, stored.lsn)
+            # Every logged change replaces a row version, except the first
+            # version of rows that are only in the log, like inserted rows
+            changed = stored.wal.changes(stored.name, stored.lsn)
+            unstored = len(changed) - len(stored.stored_ids(changed))
+            rows = logged - unstored
+            size = stored.size() + stored.wal.size(stored.name, stored.lsn)
+
+            if logged:
+                stored.checkpoint()
+            else:
+                # Indexes grow with every INSERT, as their nodes are never
+                # overwritten
+                stored.rebuild_indexes()
+
+            new_size = stored.size() + stored.wal.size(stored.name, stored.lsn)
+            reclaimed.rows += rows
+            # Rebuilt files can end up larger than the ones they replace
+            reclaimed.bytes += max(size - new_size, 0)
+
+        return reclaimed
+
+
+def parse_vacuum(query: str) -> Vacuum:
+    """
+    VACUUM users
+    """
+    query = query.replace(";", "").replace("\n", " ").replace("\t", " ").strip()
+    lower = query.lower()
+
+    if not lower.startswith("vacuum"):
+        raise ValueError("Invalid query")
+
+    match = re.search(r"^vacuum\s+(\w+)$", lower)
+    if match is None:
+        raise ValueError("Invalid VACUUM, expected VACUUM table")
+
+    return Vacuum(table=match.group(1))
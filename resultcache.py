@@ -0,0 +1,76 @@
+"""
+Cache of SELECT results.
+
+Entries are keyed by the parsed statement and tagged with the write counter of
+every table it read, at the time it was read. Writes to a table bump its
+counter, so a result is returned only while none of its tables changed. The
+cache holds a bounded number of rows, evicting the least recently used
+results when full. Its methods hold a lock, as the threads of the server share
+it.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import threading
+from typing import Dict, Optional
+
+from db import ResultSet
+
+Versions = Dict[Path, int]
+
+
+@dataclass
+class Entry:
+    rs: ResultSet
+    versions: Versions
+
+
+class ResultCache:
+    def __init__(self, capacity: int):
+        # Maximum number of rows across every cached result
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str, versions: Versions) -> Optional[ResultSet]:
+        """
+        Returns the cached result if its tables are still at these versions
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.versions != versions:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry.rs
+
+    def put(self, key: str, versions: Versions, rs: ResultSet) -> None:
+        """
+        Caches a result, whose rows must be a tuple. Results larger than the
+        whole cache are not kept
+        """
+        with self.lock:
+            self.__remove(key)
+            if len(rs.rows) > self.capacity:
+                return
+
+            self.entries[key] = Entry(rs, versions)
+            self.rows += len(rs.rows)
+
+            while self.rows > self.capacity:
+                self.__remove(next(iter(self.entries)))
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.rows = 0
+
+    def __remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.rows -= len(entry.rs.rows)
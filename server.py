@@ -0,0 +1,177 @@
+"""
+Long running server that keeps the metadata, the buffer pool of parsed table
+pages and the cache of query results in memory between queries.
+
+The protocol is line based JSON over TCP: the client sends {"query": "..."},
+with an optional "params" list of values for the placeholders of the query,
+and the server answers {"output": "..."} with the text that --execute would
+print. Many queries can be sent over the same connection.
+
+Each connection is handled by its own thread. Writes are run one at a time,
+and a connection that starts a transaction writes alone until it ends. After
+every write, a snapshot of the tables is published: SELECTs read the last one
+without waiting for the writer, and see every committed write before it and
+none after it.
+"""
+import json
+import os
+import socketserver
+import threading
+from typing import Any, Optional, Sequence, Tuple
+
+from config import META_FILE, SERVER_HOST, SERVER_PORT
+import db
+from db import Metadata, in_transaction
+import executor
+from executor import execute_query
+from query import QueryType, determine_query_type
+
+
+class QueryServer:
+    """
+    Runs queries against a database that stays loaded in memory
+    """
+
+    def __init__(self, vectorized: bool = False):
+        self.vectorized = vectorized
+        self.meta: Optional[Metadata] = None
+        self.meta_version: Optional[Tuple[int, ...]] = None
+        # Snapshot of the tables read by SELECTs, replaced after every write
+        self.snapshot: Optional[Metadata] = None
+        # Held while writing, and by a transaction from BEGIN until it ends
+        self.write_lock = threading.RLock()
+
+    def execute(self, query: str, params: Sequence[Any] = ()) -> str:
+        snapshot = self.snapshot
+        if (
+            snapshot is not None
+            and not in_transaction()
+            and determine_query_type(query) == QueryType.SELECT
+            and meta_version() == self.meta_version
+        ):
+            return execute_query(snapshot, query, self.vectorized, params)
+
+        with self.write_lock:
+            return self.write(query, params)
+
+    def write(self, query: str, params: Sequence[Any]) -> str:
+        try:
+            self.reload_if_changed()
+        except ValueError as e:
+            return f"[ERROR] {e}"
+
+        assert self.meta is not None
+        began = in_transaction()
+        output = execute_query(
+            self.meta, query, self.vectorized, params, transactions=True
+        )
+
+        # Writes of this server save meta.json too, which must not cause a reload
+        self.meta_version = meta_version()
+
+        if not began and in_transaction():
+            self.write_lock.acquire()
+        elif began and not in_transaction():
+            self.write_lock.release()
+
+        if not in_transaction():
+            self.publish()
+        return output
+
+    def publish(self) -> None:
+        """
+        Replaces the snapshot read by SELECTs, deleting the files of the
+        tables that were rewritten once no SELECT reads the old snapshot
+        """
+        assert self.meta is not None
+        self.snapshot = Metadata(self.meta.database.snapshot())
+        db.collect_garbage()
+
+    def reload_if_changed(self) -> None:
+        """
+        Loads meta.json again if another process (an import, or --execute)
+        changed it since it was last read, dropping every cached page, plan
+        and result
+        """
+        version = meta_version()
+        if self.meta is not None and version == self.meta_version:
+            return
+        if self.meta is not None and in_transaction():
+            # The transaction keeps the tables it started with
+            return
+
+        self.meta = Metadata.load()
+        self.meta_version = version
+        db.buffer_pool.invalidate()
+        executor.plan_cache.invalidate()
+        executor.result_cache.invalidate()
+
+    def close(self) -> None:
+        """
+        Rolls back the transaction left open by a client that disconnected
+        """
+        if self.meta is not None and in_transaction():
+            self.meta.database.rollback()
+            self.write_lock.release()
+
+
+def meta_version() -> Optional[Tuple[int, ...]]:
+    if not os.path.exists(META_FILE):
+        return None
+
+    stat = os.stat(META_FILE)
+    # Saving the metadata of a table replaces its file in the catalog
+    # directory, which changes the modification time of the directory
+    catalog = META_FILE.with_name("catalog")
+    catalog_time = os.stat(catalog).st_mtime_ns if catalog.exists() else 0
+    return stat.st_mtime_ns, stat.st_size, catalog_time
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    def handle(self) -> None:
+        try:
+            self.handle_queries()
+        finally:
+            self.server.query_server.close()
+
+    def handle_queries(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                query = request["query"]
+                params = request.get("params", [])
+            except (ValueError, KeyError, AttributeError):
+                response = {"output": "[ERROR] Invalid request"}
+            else:
+                output = self.server.query_server.execute(query, params)
+                response = {"output": output}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], vectorized: bool = False):
+        super().__init__(address, QueryHandler)
+        self.query_server = QueryServer(vectorized)
+
+
+def serve(
+    host: str = SERVER_HOST, port: int = SERVER_PORT, vectorized: bool = False
+) -> None:
+    """
+    Serves queries until interrupted. Connections are handled concurrently:
+    SELECTs read a snapshot while a single connection writes, and a
+    transaction started with BEGIN belongs to the connection that sent it
+    """
+    with Server((host, port), vectorized) as server:
+        print(f"Listening on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
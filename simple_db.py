@@ -2,17 +2,15 @@ import argparse
 import json
 import os
 from pathlib import Path
-import traceback
-from config import META_FILE
+from bulk_load import load_csv
+from config import META_FILE, SERVER_PORT
 from csv_importer import import_csv
-from db import Column, Database, Metadata, Table
+from db import Column, Database, Metadata, Table, parse_partitioning
+import durability
+from executor import execute_query
 from mysql_importer import import_mysql
 from postgres_importer import import_postgres
-from query import QueryType, determine_query_type
-from query_delete import parse_delete
-from query_insert import parse_insert
-from query_select import parse_select
-from query_update import parse_update
+from server import serve
 
 
 def main():
@@ -50,8 +48,56 @@ def main():
         type=str,
         help="Database name for MySQL database",
     )
+    parser.add_argument(
+        "--set-format",
+        type=str,
+        nargs=2,
+        metavar=("TABLE", "FORMAT"),
+        help="Convert the storage of a table to another format (csv, columnar)",
+    )
+    parser.add_argument(
+        "--partition",
+        type=str,
+        nargs=4,
+        metavar=("TABLE", "COLUMN", "METHOD", "ARG"),
+        help="Store a table in a file per partition, by range of a column (ARG: comma-separated bounds, or year for datetimes) or by hash (ARG: number of partitions)",
+    )
+    parser.add_argument(
+        "--unpartition",
+        type=str,
+        metavar="TABLE",
+        help="Store a partitioned table in a single file again",
+    )
+    parser.add_argument(
+        "--load",
+        type=str,
+        nargs=2,
+        metavar=("TABLE", "FILE"),
+        help="Append the rows of a CSV file, whose header names the columns, to a table",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        nargs="?",
+        const=SERVER_PORT,
+        metavar="PORT",
+        help=f"Serve queries to client.py, keeping tables in memory (port {SERVER_PORT} by default)",
+    )
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="Evaluate WHERE clauses over NumPy column arrays (requires numpy)",
+    )
+    parser.add_argument(
+        "--durability",
+        choices=durability.MODES,
+        help="When writes are synced to disk: after every write, once per statement or transaction (commit, the default), or never",
+    )
     args = parser.parse_args()
 
+    if args.durability:
+        durability.mode = args.durability
+
     if args.import_csv:
         csv_dir = Path(args.import_csv)
         import_csv(csv_dir)
@@ -65,50 +111,58 @@ def main():
         port = args.port
         database = args.database
         import_mysql(user, password, host, port, database)
-    elif args.execute:
-        query = args.execute
-        meta = Metadata.load()
-        db = meta.database
-
-        type = determine_query_type(query)
+    elif args.set_format:
+        table_name, format = args.set_format
+        if format not in ["csv", "columnar"]:
+            print(f"[ERROR] Invalid storage format: {format}")
+            return
 
+        meta = Metadata.load()
+        table = meta.database.get_table(table_name)
+        table.convert(format)
+        meta.save()
+        print(f"Table {table_name} stored as {format}")
+    elif args.partition:
+        table_name, column, method, argument = args.partition
+        meta = Metadata.load()
         try:
-            if type == QueryType.SELECT:
-                select = parse_select(query)
-                select.set_default_limit(100)
-                select.validate(db)
-                rs = select.execute(db)
-                print(rs)
-            elif type == QueryType.INSERT:
-                insert = parse_insert(query)
-                insert.validate(db)
-                insert.execute(db)
-                meta.save()
-                print("Inserted row")
-            elif type == QueryType.UPDATE:
-                update = parse_update(query)
-                update.validate(db)
-                affected = update.execute(db)
-                meta.save()
-                if len(affected) == 0:
-                    print("No rows updated")
-                elif len(affected) == 1:
-                    print(f"Updated 1 row: __id={affected[0]}")
-                else:
-                    print(f"Updated {len(affected)} rows: __id={affected}")
-            elif type == QueryType.DELETE:
-                delete = parse_delete(query)
-                delete.validate(db)
-                affected = delete.execute(db)
-                meta.save()
-                if len(affected) == 0:
-                    print("No rows deleted")
-                elif len(affected) == 1:
-                    print(f"Deleted 1 row: __id={affected[0]}")
-                else:
-                    print(f"Deleted {len(affected)} rows: __id={affected}")
+            table = meta.database.get_table(table_name)
+            table.partition(parse_partitioning(table, column, method, argument))
         except ValueError as e:
-            print(f"[ERROR] {e} \n\n {traceback.format_exc()}")
+            print(f"[ERROR] {e}")
+            return
+        meta.save_tables([table])
+        print(f"Table {table_name} stored in {len(table.partitions)} partitions")
+    elif args.unpartition:
+        meta = Metadata.load()
+        try:
+            table = meta.database.get_table(args.unpartition)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            return
+        table.partition(None)
+        meta.save_tables([table])
+        print(f"Table {args.unpartition} stored in a single file")
+    elif args.load:
+        table_name, file = args.load
+        meta = Metadata.load()
+        try:
+            table = meta.database.get_table(table_name)
+            loaded = load_csv(table, Path(file))
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            return
+        finally:
+            # Batches loaded before an error are kept, along with their __ids
+            meta.save()
+        print(f"Loaded {loaded} rows into {table_name}")
+    elif args.serve is not None:
+        serve(port=args.serve, vectorized=args.vectorized)
+    elif args.execute:
+        meta = Metadata.load()
+        output = execute_query(meta, args.execute, args.vectorized)
+        if output:
+            print(output)
     else:
         parser.print_help()
 
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from arraycache import ArrayCache
+from vectorized import ColumnArray
+
+
+def test_evicts_least_recently_used():
+    cache = ArrayCache(capacity=5)
+    first = ColumnArray([0, 1, 2])
+    second = ColumnArray([0, 1])
+    cache.put((Path("users.csv"), "a"), 1, first)
+    cache.put((Path("users.csv"), "b"), 1, second)
+    assert cache.get((Path("users.csv"), "a"), 1) is first
+    assert cache.get((Path("users.csv"), "a"), 2) is None
+
+    cache.put((Path("users.csv"), "c"), 1, ColumnArray([0, 1]))
+    assert cache.get((Path("users.csv"), "b"), 1) is None
+    assert cache.get((Path("users.csv"), "a"), 1) is first
+
+    cache.put((Path("users.csv"), "d"), 1, ColumnArray([0, 1, 2, 3, 4, 5]))
+    assert cache.get((Path("users.csv"), "d"), 1) is None
+    assert cache.values == 5
+
+
+def test_invalidate():
+    cache = ArrayCache(capacity=10)
+    cache.put((Path("users.csv"), "a"), 1, ColumnArray([0, 1]))
+    cache.put((Path("users.csv"), "b"), 1, ColumnArray([0, 1]))
+    cache.put((Path("users.1.csv"), "a"), 1, ColumnArray([0, 1]))
+
+    cache.invalidate(Path("users.csv"))
+
+    assert cache.get((Path("users.csv"), "a"), 1) is None
+    assert cache.get((Path("users.csv"), "b"), 1) is None
+    assert cache.get((Path("users.1.csv"), "a"), 1) is not None
+    assert cache.values == 2
@@ -0,0 +1,44 @@
+import btree
+from btree import BPlusTree
+
+
+def build(tmp_path, entries):
+    return BPlusTree.build(tmp_path / "test.idx", entries)
+
+
+def test_search(tmp_path):
+    tree = build(tmp_path, [(key % 50, key) for key in range(1000)])
+
+    assert sorted(tree.search("=", 7)) == list(range(7, 1000, 50))
+    assert sorted(tree.search("<", 2)) == sorted(
+        list(range(0, 1000, 50)) + list(range(1, 1000, 50))
+    )
+    assert len(list(tree.search(">=", 49))) == 20
+    assert len(list(tree.search(">", 49))) == 0
+    assert len(list(tree.search("<=", 49))) == 1000
+
+
+def test_range_is_sorted(tmp_path):
+    tree = build(tmp_path, [(key, key) for key in reversed(range(500))])
+
+    assert list(tree.range(low=100, high=120, high_inclusive=False)) == list(
+        range(100, 120)
+    )
+
+
+def test_empty(tmp_path):
+    tree = build(tmp_path, [])
+
+    assert list(tree.search("=", 1)) == []
+
+
+def test_insert(tmp_path, monkeypatch):
+    monkeypatch.setattr(btree, "ORDER", 4)
+    tree = build(tmp_path, [(key, key) for key in range(0, 100, 2)])
+
+    for key in range(1, 100, 2):
+        tree.insert(key, key)
+    tree.insert(10, 1000)
+
+    assert list(tree.range()) == list(range(11)) + [1000] + list(range(11, 100))
+    assert sorted(tree.search("=", 10)) == [10, 1000]
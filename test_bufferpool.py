@@ -0,0 +1,57 @@
+from pathlib import Path
+
+from bufferpool import BufferPool, Page
+
+
+def page(end, columns=None):
+    return Page(rows=[(end,)], end=end, columns=columns)
+
+
+def test_evicts_least_recently_used():
+    pool = BufferPool(capacity=2)
+    pool.put(Path("a.csv"), 0, page(10))
+    pool.put(Path("b.csv"), 0, page(10))
+    assert pool.get(Path("a.csv"), 0, None) is not None
+
+    pool.put(Path("c.csv"), 0, page(10))
+
+    assert pool.get(Path("b.csv"), 0, None) is None
+    assert pool.get(Path("a.csv"), 0, None) is not None
+    assert pool.get(Path("c.csv"), 0, None) is not None
+
+
+def test_scan_keeps_its_first_pages():
+    pool = BufferPool(capacity=2)
+    path = Path("users.csv")
+    for number in range(4):
+        pool.put(path, number, page(number))
+
+    assert pool.get(path, 0, None) is not None
+    assert pool.get(path, 1, None) is not None
+    assert pool.get(path, 3, None) is None
+
+
+def test_columns():
+    pool = BufferPool(capacity=2)
+    path = Path("users.csv")
+    pool.put(path, 0, page(10, frozenset({"id", "name"})))
+
+    assert pool.get(path, 0, frozenset({"id"})) is not None
+    assert pool.get(path, 0, frozenset({"id", "age"})) is None
+    assert pool.get(path, 0, None) is None
+
+
+def test_appended_drops_last_page():
+    pool = BufferPool(capacity=4)
+    path = Path("users.csv")
+    pool.validate(path, "v1")
+    pool.put(path, 0, page(10))
+    pool.put(path, 1, page(15))
+
+    pool.appended(path, 15, "v1", "v2")
+    assert pool.get(path, 0, None) is not None
+    assert pool.get(path, 1, None) is None
+
+    # The file changed before the append, so nothing can be trusted
+    pool.appended(path, 20, "v1", "v3")
+    assert pool.get(path, 0, None) is None
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from bulk_load import bulk_load, load_csv
+import db
+from db import Column, Index, ResultSet, Table
+from query import parse_where
+
+
+def create_table() -> Table:
+    table = Table(
+        name="users",
+        columns=[
+            Column("__id", "int"),
+            Column("name", "str"),
+            Column("age", "int"),
+            Column("created", "datetime"),
+        ],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ()))
+    return table
+
+
+def test_bulk_load(data_dir):
+    table = create_table()
+    rows = [(f"user {i}", i) for i in range(25)]
+
+    assert bulk_load(table, ["name", "age"], iter(rows), batch_rows=10) == 25
+
+    assert table.next_id == 25
+    assert list(table.scan())[:2] == [
+        (0, "user 0", 0, datetime(1970, 1, 1)),
+        (1, "user 1", 1, datetime(1970, 1, 1)),
+    ]
+    assert len(list(table.scan())) == 25
+
+
+def test_invalid_rows_are_not_loaded(data_dir):
+    table = create_table()
+    rows = [("John", 20), ("Mary", 30), ("Ann", "old")]
+
+    with pytest.raises(ValueError, match="row 3"):
+        bulk_load(table, ["name", "age"], rows, batch_rows=2)
+
+    # Only the first batch was written
+    assert list(table.scan(columns={"name"})) == [
+        (None, "John", None, None),
+        (None, "Mary", None, None),
+    ]
+    assert table.next_id == 2
+
+
+def test_load_csv(data_dir):
+    table = create_table()
+    path = data_dir / "new_users.csv"
+    path.write_text("Created,name\n2020-01-02,John\n,Mary\n")
+
+    assert load_csv(table, path) == 2
+
+    assert list(table.scan()) == [
+        (0, "John", 0, datetime(2020, 1, 2)),
+        (1, "Mary", 0, datetime(1970, 1, 1)),
+    ]
+
+
+def test_loaded_values_match_stored_ones(data_dir):
+    table = create_table()
+    index = Index(column="name", file="users.name.idx")
+    table.build_index(index)
+    table.indexes.append(index)
+    cached = db.to_datetime.cache_info().currsize
+
+    bulk_load(table, ["name", "created"], [("'Ann'", "2020-01-02T03:04:05")])
+
+    where = parse_where("name = 'Ann'")
+    assert list(table.scan(where)) == [(0, "Ann", 0, datetime(2020, 1, 2, 3, 4, 5))]
+    # Loaded timestamps don't fill the cache of parsed query values
+    assert db.to_datetime.cache_info().currsize == cached
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import columnar
+from db import Column
+
+
+COLUMNS = [
+    Column("__id", "int"),
+    Column("name", "str"),
+    Column("birth_date", "datetime"),
+    Column("salary", "float"),
+]
+
+
+def test_write_and_scan(tmp_path):
+    rows = [
+        (0, "Georgi", datetime(1953, 9, 2), 1000.5),
+        (1, "", datetime(1964, 6, 2, 10, 30), 0.0),
+    ]
+    columnar.write(tmp_path, COLUMNS, rows)
+
+    assert list(columnar.scan(tmp_path, COLUMNS)) == rows
+    assert columnar.count_rows(tmp_path, COLUMNS) == 2
+
+
+def test_scan_only_needed_columns(tmp_path):
+    columnar.write(tmp_path, COLUMNS, [(0, "Georgi", datetime(1953, 9, 2), 1.0)])
+
+    assert list(columnar.scan(tmp_path, COLUMNS, {"name"})) == [
+        (None, "Georgi", None, None)
+    ]
+
+
+def test_append_and_fetch(tmp_path):
+    columnar.write(tmp_path, COLUMNS, [])
+    columnar.append(tmp_path, COLUMNS, [(0, "Parto", datetime(1959, 12, 3), 2.5)])
+    columnar.append(tmp_path, COLUMNS, [(1, "Bezalel", datetime(1970, 1, 1), 3.0)])
+
+    assert list(columnar.fetch(tmp_path, COLUMNS, [1, 0])) == [
+        (1, "Bezalel", datetime(1970, 1, 1), 3.0),
+        (0, "Parto", datetime(1959, 12, 3), 2.5),
+    ]
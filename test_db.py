@@ -0,0 +1,620 @@
+import dataclasses
+from datetime import datetime
+import itertools
+import json
+
+import pytest
+
+from bufferpool import BufferPool
+import db
+from db import (
+    Column,
+    Database,
+    IdSet,
+    Index,
+    Metadata,
+    ResultSet,
+    Table,
+    compile_where,
+    filter_rows,
+)
+from executor import execute_query
+from query import Where
+
+
+def join_inputs():
+    users = ResultSet(
+        table_name="users",
+        columns=(Column("users.id", "int"), Column("users.name", "str")),
+        rows=((1, "John"), (2, "Mary"), (3, "Ann")),
+    )
+    addresses = ResultSet(
+        table_name="addresses",
+        columns=(Column("addresses.user_id", "int"), Column("addresses.city", "str")),
+        rows=((2, "Curitiba"), (1, "Londrina"), (2, "Maringa"), (4, "Toledo")),
+    )
+    return users, addresses
+
+
+def test_inner_join_equality():
+    users, addresses = join_inputs()
+    on = Where(
+        left_hand="users.id",
+        right_hand="addresses.user_id",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+
+    rs = users.inner_join(addresses, on)
+
+    assert rs.headers == [
+        "users.id",
+        "users.name",
+        "addresses.user_id",
+        "addresses.city",
+    ]
+    assert sorted(rs.rows) == [
+        (1, "John", 1, "Londrina"),
+        (2, "Mary", 2, "Curitiba"),
+        (2, "Mary", 2, "Maringa"),
+    ]
+
+
+def test_inner_join_equality_swapped_sides():
+    users, addresses = join_inputs()
+    on = Where(
+        left_hand="addresses.user_id",
+        right_hand="users.id",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+
+    rs = addresses.inner_join(users, on)
+
+    assert rs.headers == [
+        "addresses.user_id",
+        "addresses.city",
+        "users.id",
+        "users.name",
+    ]
+    assert sorted(rs.rows) == [
+        (1, "Londrina", 1, "John"),
+        (2, "Curitiba", 2, "Mary"),
+        (2, "Maringa", 2, "Mary"),
+    ]
+
+
+def test_inner_join_non_equality():
+    users, addresses = join_inputs()
+    on = Where(
+        left_hand="users.id",
+        right_hand="addresses.user_id",
+        operator=">",
+        or_where=None,
+        and_where=None,
+    )
+
+    rs = users.inner_join(addresses, on)
+
+    assert rs.rows == (
+        (2, "Mary", 1, "Londrina"),
+        (3, "Ann", 2, "Curitiba"),
+        (3, "Ann", 1, "Londrina"),
+        (3, "Ann", 2, "Maringa"),
+    )
+
+
+def test_filter_rows_is_lazy():
+    columns = (Column("id", "int"),)
+    where = Where(
+        left_hand="id",
+        right_hand="10",
+        operator=">",
+        or_where=None,
+        and_where=None,
+    )
+    rows = ((i,) for i in itertools.count())
+
+    assert list(itertools.islice(filter_rows(rows, columns, where), 3)) == [
+        (11,),
+        (12,),
+        (13,),
+    ]
+
+
+def create_table() -> Table:
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str")],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ()))
+    return table
+
+
+def test_append_with_index(data_dir):
+    table = create_table()
+    index = Index(column="name", file="users.name.idx")
+    table.build_index(index)
+    table.indexes.append(index)
+
+    table.append([table.create_row(("'John'",), ("name",))])
+    table.append(
+        [
+            table.create_row(("'Mary'",), ("name",)),
+            table.create_row(("'Ann, Jr.'",), ("name",)),
+        ]
+    )
+
+    assert list(table.scan()) == [(0, "John"), (1, "Mary"), (2, "Ann, Jr.")]
+    where = Where(
+        left_hand="name",
+        right_hand="'Mary'",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+    assert list(table.scan(where)) == [(1, "Mary")]
+    assert table.next_id == 3
+
+
+def test_append_indexes_stored_values(data_dir):
+    table = Table(
+        name="employees",
+        columns=[Column("__id", "int"), Column("age", "int"), Column("sal", "float")],
+        file="employees.csv",
+        next_id=1,
+    )
+    table.write(ResultSet("employees", tuple(table.columns), ((0, 30, 1.5),)))
+    for column in ("age", "sal"):
+        index = Index(column=column, file=f"employees.{column}.idx")
+        table.build_index(index)
+        table.indexes.append(index)
+
+    # An omitted int column gets the value of an empty cell, not ""
+    table.append([table.create_row(("1.23456",), ("sal",))])
+    # Floats are stored rounded
+    table.append([table.create_row(("40", "1.23456"), ("age", "sal"))])
+
+    def where(column: str, value: str) -> Where:
+        return Where(
+            left_hand=column,
+            right_hand=value,
+            operator="=",
+            or_where=None,
+            and_where=None,
+        )
+
+    assert list(table.scan(where("age", "0"))) == [(1, 0, 1.2346)]
+    assert list(table.scan(where("sal", "1.2346"))) == [(1, 0, 1.2346), (2, 40, 1.2346)]
+
+
+def test_scan_only_parses_needed_columns(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    rows = ((0, "John", 30), (1, "Mary", 25))
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    where = Where(
+        left_hand="age",
+        right_hand="25",
+        operator="<=",
+        or_where=None,
+        and_where=None,
+    )
+
+    assert list(table.scan(columns={"name"})) == [
+        (None, "John", None),
+        (None, "Mary", None),
+    ]
+    assert list(table.scan(where, {"name", "age"})) == [(None, "Mary", 25)]
+
+
+def test_compile_where():
+    columns = (Column("id", "int"), Column("name", "str"), Column("age", "int"))
+    where = Where(
+        left_hand="name",
+        right_hand="'John'",
+        operator="=",
+        or_where=Where(
+            left_hand="id",
+            right_hand="age",
+            operator=">",
+            or_where=None,
+            and_where=None,
+        ),
+        and_where=None,
+    )
+
+    satisfies = compile_where(where, columns)
+
+    assert satisfies((1, "John", 30))
+    assert satisfies((40, "Mary", 30))
+    assert not satisfies((1, "Mary", 30))
+
+
+def test_compile_where_invalid_column():
+    where = Where(
+        left_hand="missing",
+        right_hand="1",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+
+    with pytest.raises(ValueError):
+        compile_where(where, (Column("id", "int"),))
+
+
+def test_id_set():
+    ids = IdSet(range(10, 20))
+    for id in [5, 21, 20, 3, 4, 9, 40]:
+        ids.add(id)
+
+    assert (ids.starts, ids.stops) == ([3, 9, 40], [6, 22, 41])
+    assert list(ids) == [3, 4, 5] + list(range(9, 22)) + [40]
+    assert len(ids) == 17
+    assert 15 in ids and 8 not in ids
+    assert ids[3] == 9
+    assert str(ids) == "[3..5, 9..21, 40]"
+
+
+def test_scan_applies_logged_changes(data_dir, monkeypatch):
+    monkeypatch.setattr("wal.CHECKPOINT_CHANGES", 4)
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(
+        ResultSet("users", tuple(table.columns), tuple((i, 20) for i in range(5)))
+    )
+    index = Index(column="age", file="users.age.idx")
+    table.build_index(index)
+    table.indexes.append(index)
+    where = Where(
+        left_hand="age",
+        right_hand="30",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+
+    table.log_changes([(1, None), (3, (3, 30)), (0, (0, 30))])
+
+    assert list(table.scan()) == [(0, 30), (2, 20), (3, 30), (4, 20)]
+    # Logged rows are not in the index, but must be found through it
+    assert list(table.scan(where)) == [(0, 30), (3, 30)]
+
+    table.log_changes([(4, (4, 30))])
+
+    # The table was checkpointed, so the changes are in the table file
+    assert table.changes() == {}
+    assert list(table.scan(where)) == [(0, 30), (3, 30), (4, 30)]
+
+
+@pytest.mark.parametrize("format", ["csv", "columnar"])
+def test_scan_pages(data_dir, monkeypatch, format):
+    monkeypatch.setattr("db.PAGE_ROWS", 4)
+    monkeypatch.setattr("db.buffer_pool", BufferPool(capacity=2))
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str")],
+        file=f"users.{format}",
+        next_id=0,
+        format=format,
+    )
+    rows = [(i, f"user {i}") for i in range(10)]
+    table.write(ResultSet("users", tuple(table.columns), tuple(rows)))
+
+    assert list(table.scan()) == rows
+    table.append([(10, "user 10"), (11, "user 11")])
+    rows += [(10, "user 10"), (11, "user 11")]
+
+    assert list(table.scan()) == rows
+    assert [row[1] for row in table.scan(columns={"name"})] == [row[1] for row in rows]
+    assert list(table.scan()) == rows
+
+
+@pytest.mark.parametrize("format", ["csv", "columnar"])
+def test_scan_skips_blocks_with_zone_maps(data_dir, monkeypatch, format):
+    monkeypatch.setattr("db.PAGE_ROWS", 4)
+    monkeypatch.setattr("db.buffer_pool", BufferPool(capacity=8))
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file=f"users.{format}",
+        next_id=0,
+        format=format,
+    )
+    table.write(
+        ResultSet("users", tuple(table.columns), tuple((i, i) for i in range(10)))
+    )
+    table.append([(10, 10), (11, 11), (12, 12)])
+
+    assert [(block.rows, block.min, block.max) for block in table.blocks] == [
+        (4, [0, 0], [3, 3]),
+        (4, [4, 4], [7, 7]),
+        (4, [8, 8], [11, 11]),
+        (1, [12, 12], [12, 12]),
+    ]
+
+    where = Where(
+        left_hand="age",
+        right_hand="11",
+        operator=">=",
+        or_where=None,
+        and_where=None,
+    )
+    assert list(table.scan(where)) == [(11, 11), (12, 12)]
+    # Only the last two blocks were read
+    assert db.buffer_pool.misses == 2
+
+    # The new version of a row in a skipped block may match
+    table.log_changes([(1, (1, 30)), (11, (11, 3))])
+    assert list(table.scan(where)) == [(1, 30), (12, 12)]
+
+
+@pytest.mark.parametrize("format", ["csv", "columnar"])
+def test_scan_by_id(data_dir, format):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str")],
+        file=f"users.{format}",
+        next_id=0,
+        format=format,
+    )
+    rows = [(i, f"user {i}") for i in range(10)]
+    table.write(ResultSet("users", tuple(table.columns), tuple(rows)))
+    table.append([(10, "user 10")])
+
+    def where(id):
+        return Where(
+            left_hand="__id",
+            right_hand=str(id),
+            operator="=",
+            or_where=None,
+            and_where=None,
+        )
+
+    assert table.find_id(where(3)) == 3
+    assert list(table.scan(where(3))) == [(3, "user 3")]
+    assert list(table.scan(where(10))) == [(10, "user 10")]
+    assert list(table.scan(where(11))) == []
+
+    table.log_changes([(3, None), (4, (4, "changed"))])
+    assert list(table.scan(where(3))) == []
+    assert list(table.scan(where(4))) == [(4, "changed")]
+
+    # Rewriting the table moves the rows, and the map along with them
+    table.checkpoint()
+    assert list(table.scan(where(4))) == [(4, "changed")]
+    assert list(table.scan(where(5))) == [(5, "user 5")]
+
+
+@pytest.mark.parametrize("format", ["csv", "columnar"])
+def test_snapshot_is_not_changed_by_writes(data_dir, monkeypatch, format):
+    monkeypatch.setattr("db.PAGE_ROWS", 4)
+    monkeypatch.setattr("db.buffer_pool", BufferPool(capacity=8))
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file=f"users.{format}",
+        next_id=0,
+        format=format,
+    )
+    rows = [(i, 20) for i in range(6)]
+    table.write(ResultSet("users", tuple(table.columns), tuple(rows)))
+    index = Index(column="age", file=table.file_name("idx", "age"))
+    table.build_index(index)
+    table.indexes.append(index)
+    where = Where(
+        left_hand="age",
+        right_hand="20",
+        operator="=",
+        or_where=None,
+        and_where=None,
+    )
+
+    snapshot = table.snapshot()
+    assert list(snapshot.scan()) == rows
+
+    table.append([(6, 20), (7, 20)])
+    table.log_changes([(0, None), (1, (1, 30))])
+    assert list(snapshot.scan()) == rows
+    assert list(snapshot.scan(where)) == rows
+
+    old_files = table.generation_files()
+    table.checkpoint()
+    Metadata(Database(name="test", tables=[table])).save()
+    assert list(table.scan()) == [(1, 30)] + [(i, 20) for i in range(2, 8)]
+    assert list(snapshot.scan()) == rows
+    assert list(snapshot.scan(where)) == rows
+    # The snapshot still reads the files of the old generation
+    assert all(file.exists() for file in old_files)
+
+    del snapshot
+    db.collect_garbage()
+    assert not any(file.exists() for file in old_files)
+    assert table.wal.changes("users") == {}
+    with pytest.raises(ValueError):
+        table.snapshot().append([(8, 20)])
+
+
+def test_metadata_is_saved_per_table(data_dir):
+    tables = [
+        Table(
+            name=name,
+            columns=[Column("__id", "int"), Column("name", "str")],
+            file=f"{name}.csv",
+            next_id=0,
+        )
+        for name in ("users", "orders")
+    ]
+    for table in tables:
+        table.write(ResultSet(table.name, tuple(table.columns), ((0, "a"),)))
+        table.next_id = 1
+    meta = Metadata(Database(name="test", tables=tables))
+    meta.save()
+
+    users, orders = tables
+    users.append([(1, "b")])
+    users.next_id = 2
+    orders_file = data_dir / "catalog" / "orders.json"
+    before = orders_file.stat().st_mtime_ns
+    meta.save_tables([users])
+    assert orders_file.stat().st_mtime_ns == before
+
+    loaded = Metadata.load().database
+    assert [table.name for table in loaded.tables] == ["users", "orders"]
+    assert loaded.get_table("users").next_id == 2
+    assert list(loaded.get_table("users").scan()) == [(0, "a"), (1, "b")]
+    assert loaded.has_table("orders")
+    assert not loaded.has_table("missing")
+
+
+def test_loads_metadata_of_every_table_from_meta_json(data_dir):
+    table = {
+        "name": "users",
+        "columns": [{"name": "__id", "type": "int"}],
+        "file": "users.csv",
+        "next_id": 3,
+    }
+    (data_dir / "meta.json").write_text(
+        json.dumps({"database": {"name": "test", "tables": [table]}})
+    )
+
+    users = Metadata.load().database.get_table("users")
+    assert users.file == "users.csv"
+    assert users.next_id == 3
+
+
+def test_legacy_meta_json_is_migrated(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=1,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ((0, 20),)))
+    (data_dir / "meta.json").write_text(
+        json.dumps(
+            {"database": {"name": "test", "tables": [dataclasses.asdict(table)]}},
+            default=str,
+        )
+    )
+
+    meta = Metadata.load()
+    execute_query(meta, "INSERT INTO users (age) VALUES (30)")
+    execute_query(meta, "UPDATE users SET age = 40 WHERE __id = 0")
+    execute_query(meta, "VACUUM users")
+    assert not (data_dir / "users.csv").exists()
+
+    users = Metadata.load().database.get_table("users")
+    assert list(users.scan()) == [(0, 40), (1, 30)]
+    manifest = json.loads((data_dir / "meta.json").read_text())
+    assert manifest["database"]["tables"] == ["users"]
+
+
+def test_ids_of_rows_appended_without_saving_are_not_reused(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str")],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ((0, "a"),)))
+    table.next_id = 1
+    Metadata(Database(name="test", tables=[table])).save()
+
+    # A crash before the metadata is saved loses next_id
+    table.append([table.create_row(("b",), ("name",))])
+
+    assert Metadata.load().database.get_table("users").next_id == 2
+
+
+def test_partitioned_table(data_dir):
+    table = Table(
+        name="salaries",
+        columns=[Column("__id", "int"), Column("from_date", "datetime")],
+        file="salaries.csv",
+        next_id=6,
+    )
+    rows = [(i, datetime(2000 + i % 3, 6, 1)) for i in range(6)]
+    table.write(ResultSet("salaries", tuple(table.columns), tuple(rows)))
+    meta = Metadata(Database(name="test", tables=[table]))
+    meta.save()
+
+    table.partition(db.parse_partitioning(table, "from_date", "range", "year"))
+    meta.save_tables([table])
+    assert [partition.name for partition in table.partitions] == [
+        "salaries.p0",
+        "salaries.p1",
+        "salaries.p2",
+    ]
+    assert all(partition.path.exists() for partition in table.partitions)
+    assert not (data_dir / "salaries.1.csv").exists()
+
+    # Rows are appended to the partition of their year
+    table.append([(6, datetime(2001, 1, 1)), (7, datetime(1999, 1, 1))])
+    assert list(table.partitions[0].scan()) == [
+        (0, datetime(2000, 6, 1)),
+        (3, datetime(2000, 6, 1)),
+        (7, datetime(1999, 1, 1)),
+    ]
+
+    where = Where(
+        left_hand="from_date",
+        right_hand="'2001-01-01'",
+        operator=">=",
+        or_where=None,
+        and_where=None,
+    )
+    assert table.prune(where) == table.partitions[1:]
+    assert sorted(table.scan(where)) == [
+        (1, datetime(2001, 6, 1)),
+        (2, datetime(2002, 6, 1)),
+        (4, datetime(2001, 6, 1)),
+        (5, datetime(2002, 6, 1)),
+        (6, datetime(2001, 1, 1)),
+    ]
+
+    meta.save_tables([table])
+    loaded = Metadata.load().database.get_table("salaries")
+    assert loaded.partitioning == table.partitioning
+    assert sorted(loaded.scan()) == sorted(table.scan())
+
+    table.partition(None)
+    meta.save_tables([table])
+    assert table.partitions == []
+    assert len(list(table.scan())) == 8
+    assert not any(path.name.startswith("salaries.p") for path in data_dir.iterdir())
+
+
+def test_hash_partitions_are_pruned_by_equality():
+    partitioning = db.Partitioning(column="name", method="hash", buckets=4)
+    columns = (Column("__id", "int"), Column("name", "str"))
+
+    def partitions(where: Where):
+        may_match = db.compile_partition_filter(where, columns, partitioning)
+        return [i for i in range(4) if may_match(i)]
+
+    equal = Where(
+        left_hand="name", right_hand="'Ann'", operator="=", or_where=None, and_where=None
+    )
+    assert partitions(equal) == [partitioning.locate("Ann")]
+    assert partitions(dataclasses.replace(equal, operator=">")) == [0, 1, 2, 3]
+    other = Where(
+        left_hand="name", right_hand="'Bob'", operator="=", or_where=None, and_where=None
+    )
+    either = dataclasses.replace(equal, or_where=other)
+    assert partitions(either) == sorted(
+        {partitioning.locate("Ann"), partitioning.locate("Bob")}
+    )
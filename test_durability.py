@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import durability
+
+
+def count_syncs(monkeypatch):
+    synced = []
+    monkeypatch.setattr(durability, "sync", synced.append)
+    monkeypatch.setattr(durability, "sync_directory", lambda path: None)
+    monkeypatch.setattr(durability, "pending", set())
+    return synced
+
+
+def test_commit_syncs_each_file_once(tmp_path, monkeypatch):
+    synced = count_syncs(monkeypatch)
+    monkeypatch.setattr(durability, "mode", "commit")
+
+    for _ in range(3):
+        durability.written(tmp_path / "users.csv")
+    durability.written(tmp_path / "users.ids")
+    assert synced == []
+
+    (tmp_path / "users.csv").touch()
+    (tmp_path / "users.ids").touch()
+    durability.commit()
+    assert sorted(synced) == [tmp_path / "users.csv", tmp_path / "users.ids"]
+
+
+def test_modes(tmp_path, monkeypatch):
+    synced = count_syncs(monkeypatch)
+
+    monkeypatch.setattr(durability, "mode", "always")
+    durability.written(tmp_path / "users.csv")
+    assert synced == [tmp_path / "users.csv"]
+
+    monkeypatch.setattr(durability, "mode", "off")
+    durability.written(tmp_path / "users.csv")
+    durability.commit()
+    assert synced == [tmp_path / "users.csv"]
+
+
+def test_replace(tmp_path, monkeypatch):
+    fsyncs = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+    monkeypatch.setattr(durability, "mode", "commit")
+    path = tmp_path / "meta.json"
+    path.write_text("old")
+
+    with pytest.raises(ValueError):
+        with durability.replace(path) as f:
+            f.write("new")
+            raise ValueError("Disk full")
+    assert path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [path]
+
+    with durability.replace(path) as f:
+        f.write("new")
+    assert path.read_text() == "new"
+    # The file and then its directory
+    assert len(fsyncs) == 2
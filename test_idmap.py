@@ -0,0 +1,31 @@
+from idmap import IdMap
+
+
+def test_get(tmp_path):
+    id_map = IdMap.build(tmp_path / "test.ids", [(0, 0), (1, 17), (2, 40), (5, 90)])
+
+    assert id_map.get(0) == 0
+    assert id_map.get(2) == 40
+    assert id_map.get(3) is None
+    assert id_map.get(5) == 90
+    assert id_map.get(6) is None
+    assert id_map.get(-1) is None
+
+
+def test_insert(tmp_path):
+    id_map = IdMap.build(tmp_path / "test.ids", [(i, i * 10) for i in range(100)])
+
+    id_map.insert([(100, 2000), (200, 3000)])
+
+    assert id_map.get(99) == 990
+    assert id_map.get(100) == 2000
+    assert id_map.get(150) is None
+    assert id_map.get(200) == 3000
+
+
+def test_invalid_id_removes_map(tmp_path):
+    id_map = IdMap.build(tmp_path / "test.ids", [(0, 0)])
+
+    id_map.insert([(1, 10), ("", 20)])
+
+    assert not id_map.exists()
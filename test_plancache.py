@@ -0,0 +1,64 @@
+import pytest
+
+from db import Column, Database, Table
+from plancache import PlanCache, bind
+from query_insert import parse_insert
+from query_select import parse_select
+from query_update import parse_update
+
+
+def database(columns=("name", "age")):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int")]
+        + [Column(name, "str" if name == "name" else "int") for name in columns],
+        file="users.csv",
+        next_id=0,
+    )
+    return Database(name="test", tables=[table])
+
+
+def test_bind_in_query_order():
+    update = parse_update("UPDATE users SET name = ?, age = 30 WHERE age > %s")
+
+    bound = bind(update, ["O'Brien", 18])
+
+    assert bound.values == ["'O'Brien'", "30"]
+    assert bound.where.right_hand == "18"
+    # The statement itself keeps its placeholders
+    assert update.values == ["?", "30"]
+
+
+def test_bind_checks_number_of_params():
+    select = parse_select("SELECT * FROM users WHERE age > ? AND name = ?")
+
+    with pytest.raises(ValueError):
+        bind(select, [18])
+    with pytest.raises(ValueError):
+        bind(select, [18, "Ann", 3])
+    with pytest.raises(ValueError):
+        bind(select, [18, None])
+
+
+def test_prepare_caches_validated_statements():
+    db = database()
+    cache = PlanCache(capacity=2)
+    query = "INSERT INTO users (name, age) VALUES (?, ?)"
+
+    assert cache.prepare(db, query, parse_insert, ["Ann", 20]).rows == [["'Ann'", "20"]]
+    assert cache.prepare(db, query, parse_insert, ["Bob", 30]).rows == [["'Bob'", "30"]]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Plans are reused for other databases where the table has the same
+    # columns, whatever the other tables are
+    other = database()
+    other.add_table(Table(name="orders", columns=[], file="orders.csv", next_id=0))
+    cache.prepare(other, query, parse_insert, ["Ann", 20])
+    assert cache.misses == 1
+    # and validated again when they change
+    with pytest.raises(ValueError):
+        cache.prepare(database(columns=("name",)), query, parse_insert, ["Ann", 20])
+    assert cache.misses == 2
+
+    with pytest.raises(ValueError):
+        cache.prepare(db, "INSERT INTO users (email) VALUES (?)", parse_insert, ["a"])
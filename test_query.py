@@ -1,5 +1,5 @@
 import pytest
-from query import Where, parse_where
+from query import Where, join_conjuncts, parse_where, split_conjuncts
 
 
 def test_parse_where():
@@ -73,3 +73,31 @@ def test_parse_wrong_quotes():
     with pytest.raises(ValueError):
         a = parse_where("name = 'Fuchs")
         print(a)
+
+
+def test_split_conjuncts():
+    where = parse_where("id = 1 AND name = 'Fuchs'")
+
+    assert split_conjuncts(where) == [
+        Where(
+            left_hand="id",
+            right_hand="1",
+            operator="=",
+            or_where=None,
+            and_where=None,
+        ),
+        Where(
+            left_hand="name",
+            right_hand="'Fuchs'",
+            operator="=",
+            or_where=None,
+            and_where=None,
+        ),
+    ]
+    assert join_conjuncts(split_conjuncts(where)) == where
+
+
+def test_split_conjuncts_or():
+    where = parse_where("id = 1 OR name = 'Fuchs'")
+
+    assert split_conjuncts(where) == [where]
@@ -0,0 +1,28 @@
+import pytest
+from query_create_index import CreateIndex, parse_create_index
+
+
+def test_create_index():
+    assert parse_create_index("CREATE INDEX ON users (id)") == CreateIndex(
+        table="users",
+        column="id",
+    )
+
+
+def test_lowercase():
+    assert parse_create_index("create index on users (id)") == CreateIndex(
+        table="users",
+        column="id",
+    )
+
+
+def test_no_whitespace():
+    assert parse_create_index("CREATE INDEX ON users(id);") == CreateIndex(
+        table="users",
+        column="id",
+    )
+
+
+def test_missing_column():
+    with pytest.raises(ValueError):
+        parse_create_index("CREATE INDEX ON users")
@@ -1,3 +1,4 @@
+from db import Column, Database, IdSet, ResultSet, Table
 from query import Where
 from query_delete import Delete, parse_delete
 
@@ -40,3 +41,21 @@ def test_where_str():
             and_where=None,
         ),
     )
+
+
+def test_execute(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(
+        ResultSet("users", tuple(table.columns), tuple((i, i % 10) for i in range(100)))
+    )
+    db = Database(name="test", tables=[table])
+
+    affected = parse_delete("DELETE FROM users WHERE age >= 5").execute(db)
+
+    assert affected == IdSet(id for id in range(100) if id % 10 >= 5)
+    assert list(table.scan()) == [(i, i % 10) for i in range(100) if i % 10 < 5]
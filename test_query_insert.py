@@ -1,3 +1,5 @@
+import pytest
+
 from query_insert import Insert, parse_insert
 
 
@@ -5,7 +7,7 @@ def test_insert():
     assert parse_insert("INSERT INTO users (id, name) VALUES (1, 'John')") == Insert(
         table="users",
         fields=["id", "name"],
-        values=["1", "'John'"],
+        rows=[["1", "'John'"]],
     )
 
 
@@ -13,7 +15,7 @@ def test_lowercase():
     assert parse_insert("insert into users (id, name) values (1, 'John')") == Insert(
         table="users",
         fields=["id", "name"],
-        values=["1", "'John'"],
+        rows=[["1", "'John'"]],
     )
 
 
@@ -21,7 +23,7 @@ def test_anycase():
     assert parse_insert("Insert intO users (id, name) values (1, 'John')") == Insert(
         table="users",
         fields=["id", "name"],
-        values=["1", "'John'"],
+        rows=[["1", "'John'"]],
     )
 
 
@@ -29,5 +31,20 @@ def test_no_whitespace():
     assert parse_insert("INSERT INTO users(id,name) VALUES(1,'John')") == Insert(
         table="users",
         fields=["id", "name"],
-        values=["1", "'John'"],
+        rows=[["1", "'John'"]],
+    )
+
+
+def test_multiple_rows():
+    assert parse_insert(
+        "INSERT INTO users (id, name) VALUES (1, 'John'), (2, 'Mary'),(3,'Ann')"
+    ) == Insert(
+        table="users",
+        fields=["id", "name"],
+        rows=[["1", "'John'"], ["2", "'Mary'"], ["3", "'Ann'"]],
     )
+
+
+def test_invalid_rows():
+    with pytest.raises(ValueError):
+        parse_insert("INSERT INTO users (id, name) VALUES (1, 'John') (2, 'Mary')")
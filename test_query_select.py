@@ -1,3 +1,4 @@
+from db import Column, Database, ResultSet, Table
 from query import Where
 from query_select import OrderBy, Select, parse_select
 
@@ -274,3 +275,60 @@ def test_complex_select():
             limit=10,
         )
     )
+
+
+def test_execute_order_by_limit(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    rows = tuple((i, (i * 7) % 10) for i in range(50))
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    db = Database(name="test", tables=[table])
+
+    for direction in ["asc", "desc"]:
+        select = parse_select(f"SELECT * FROM users ORDER BY age {direction} LIMIT 8")
+        expected = sorted(rows, key=lambda row: row[1], reverse=direction == "desc")
+
+        assert select.execute(db).rows == tuple(expected[:8])
+
+
+def test_execute_join_where(data_dir):
+    users = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("id", "int"), Column("name", "str")],
+        file="users.csv",
+        next_id=0,
+    )
+    users.write(
+        ResultSet("users", tuple(users.columns), ((0, 1, "John"), (1, 2, "Mary")))
+    )
+    addresses = Table(
+        name="addresses",
+        columns=[
+            Column("__id", "int"),
+            Column("user_id", "int"),
+            Column("city", "str"),
+        ],
+        file="addresses.csv",
+        next_id=0,
+    )
+    addresses.write(
+        ResultSet(
+            "addresses",
+            tuple(addresses.columns),
+            ((0, 1, "Curitiba"), (1, 2, "Londrina"), (2, 2, "Maringa")),
+        )
+    )
+    db = Database(name="test", tables=[users, addresses])
+
+    select = parse_select(
+        "SELECT users.name, addresses.city FROM users "
+        "JOIN addresses ON users.id = addresses.user_id "
+        "WHERE users.name = 'Mary' AND addresses.__id >= users.__id"
+    )
+    select.validate(db)
+
+    assert select.execute(db).rows == (("Mary", "Londrina"), ("Mary", "Maringa"))
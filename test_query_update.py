@@ -1,3 +1,4 @@
+from db import Column, Database, IdSet, Partitioning, ResultSet, Table
 from query import Where
 from query_update import Update, parse_update
 
@@ -76,3 +77,73 @@ def test_two_fields():
             and_where=None,
         ),
     )
+
+
+def test_execute(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    rows = tuple((i, f"user {i}", i % 10) for i in range(100))
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    db = Database(name="test", tables=[table])
+
+    update = parse_update("UPDATE users SET name = 'Young', age = 0 WHERE age < 3")
+    affected = update.execute(db)
+
+    assert affected == IdSet(id for id in range(100) if id % 10 < 3)
+    assert list(table.scan()) == [
+        (i, "Young", 0) if i % 10 < 3 else (i, f"user {i}", i % 10) for i in range(100)
+    ]
+
+
+def test_execute_moves_rows_between_partitions(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    rows = tuple((i, f"user {i}", i * 10) for i in range(6))
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    table.partition(Partitioning(column="age", method="range", bounds=[30]))
+    db = Database(name="test", tables=[table])
+
+    update = parse_update("UPDATE users SET age = 35 WHERE age = 10")
+    assert update.execute(db) == IdSet([1])
+
+    young, old = table.partitions
+    assert list(young.scan()) == [(0, "user 0", 0), (2, "user 2", 20)]
+    # The moved row is logged in its new partition, in __id order
+    assert list(old.scan()) == [
+        (1, "user 1", 35),
+        (3, "user 3", 30),
+        (4, "user 4", 40),
+        (5, "user 5", 50),
+    ]
+
+
+def test_execute_moves_rows_back_to_their_partition(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    rows = tuple((i, 20 + i) for i in range(3))
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    table.partition(Partitioning(column="age", method="range", bounds=[35]))
+    db = Database(name="test", tables=[table])
+
+    parse_update("UPDATE users SET age = 50 WHERE __id = 0").execute(db)
+    parse_update("UPDATE users SET age = 21 WHERE __id = 0").execute(db)
+
+    young, old = table.partitions
+    assert list(young.scan()) == [(0, 21), (1, 21), (2, 22)]
+    assert list(old.scan()) == []
+
+    table.checkpoint()
+    assert list(young.read().rows) == [(0, 21), (1, 21), (2, 22)]
+    assert list(table.scan()) == [(0, 21), (1, 21), (2, 22)]
@@ -0,0 +1,63 @@
+import pytest
+from db import Column, Database, ResultSet, Table
+from query_update import parse_update
+from query_vacuum import Reclaimed, Vacuum, parse_vacuum
+
+
+def test_vacuum():
+    assert parse_vacuum("VACUUM users") == Vacuum(table="users")
+
+
+def test_lowercase():
+    assert parse_vacuum("vacuum users;") == Vacuum(table="users")
+
+
+def test_missing_table():
+    with pytest.raises(ValueError):
+        parse_vacuum("VACUUM")
+
+
+def test_execute(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=0,
+    )
+    table.write(
+        ResultSet("users", tuple(table.columns), tuple((i, i) for i in range(10)))
+    )
+    db = Database(name="test", tables=[table])
+    parse_update("UPDATE users SET age = 0 WHERE age < 5").execute(db)
+    parse_update("UPDATE users SET age = 1 WHERE age = 0").execute(db)
+
+    reclaimed = Vacuum(table="users").execute(db)
+
+    assert reclaimed.rows == 10
+    assert reclaimed.bytes > 0
+    assert table.changes() == {}
+    assert list(table.scan()) == [(i, 1 if i < 5 else i) for i in range(10)]
+    assert Vacuum(table="users").execute(db) == Reclaimed(rows=0, bytes=0)
+
+
+def test_execute_does_not_count_inserted_rows(data_dir):
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=2,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ((0, 20), (1, 30))))
+    db = Database(name="test", tables=[table])
+
+    db.begin()
+    table.append([(2, 40), (3, 50)])
+    db.commit()
+    parse_update("UPDATE users SET age = 0 WHERE __id = 0").execute(db)
+    parse_update("UPDATE users SET age = 1 WHERE __id = 3").execute(db)
+
+    # The old versions of rows 0 and 3 are dead, the inserted rows aren't
+    reclaimed = Vacuum(table="users").execute(db)
+
+    assert reclaimed.rows == 2
+    assert list(table.scan()) == [(0, 0), (1, 30), (2, 40), (3, 1)]
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from db import Column, ResultSet
+from resultcache import ResultCache
+
+
+def result(rows):
+    return ResultSet("users", (Column("__id", "int"),), tuple((i,) for i in rows))
+
+
+def test_versions():
+    cache = ResultCache(capacity=10)
+    cache.put("a", {Path("users.csv"): 1}, result(range(3)))
+
+    assert cache.get("a", {Path("users.csv"): 1}) == result(range(3))
+    assert cache.get("a", {Path("users.csv"): 2}) is None
+    assert cache.get("b", {Path("users.csv"): 1}) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(capacity=10)
+    versions = {Path("users.csv"): 0}
+    cache.put("a", versions, result(range(4)))
+    cache.put("b", versions, result(range(4)))
+    cache.get("a", versions)
+
+    cache.put("c", versions, result(range(4)))
+
+    assert cache.get("b", versions) is None
+    assert cache.get("a", versions) is not None
+    assert cache.rows == 8
+
+    # Too large to be cached
+    cache.put("d", versions, result(range(11)))
+    assert cache.get("d", versions) is None
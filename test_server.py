@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from db import Column, Database, Metadata, ResultSet, Table
+import executor
+from server import QueryServer
+
+
+def create_database():
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("name", "str")],
+        file="users.csv",
+        next_id=2,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ((0, "John"), (1, "Mary"))))
+    Metadata(Database(name="test", tables=[table])).save()
+
+
+def test_reads_tables_once(data_dir):
+    create_database()
+    server = QueryServer()
+
+    assert "Mary" in server.execute("SELECT name FROM users")
+    assert db.buffer_pool.misses == 1
+
+    # The rows come from memory, not from the file
+    assert "Mary" in server.execute("SELECT name FROM users WHERE name = 'Mary'")
+    assert db.buffer_pool.misses == 1
+    assert db.buffer_pool.hits == 1
+
+
+def test_caches_results(data_dir):
+    create_database()
+    server = QueryServer()
+
+    first = server.execute("SELECT name FROM users WHERE name = 'Mary'")
+    assert server.execute("select name from users where name='Mary';") == first
+    assert executor.result_cache.hits == 1
+    assert db.buffer_pool.misses == 1
+
+    server.execute("UPDATE users SET name = 'Ann' WHERE name = 'Mary'")
+    assert "Mary" not in server.execute("SELECT name FROM users WHERE name = 'Mary'")
+    assert executor.result_cache.hits == 1
+
+
+def test_binds_params(data_dir):
+    create_database()
+    server = QueryServer()
+
+    server.execute("INSERT INTO users (name) VALUES (?)", ["Ann"])
+    server.execute("INSERT INTO users (name) VALUES (?)", ["Bob"])
+    assert "3  Bob" in server.execute("SELECT * FROM users WHERE name = ?", ["Bob"])
+    assert "Ann" not in server.execute("SELECT * FROM users WHERE name = ?", ["Bob"])
+    assert executor.plan_cache.hits == 2
+
+
+def test_transactions(data_dir):
+    create_database()
+    server = QueryServer()
+
+    assert server.execute("BEGIN") == "Transaction started"
+    server.execute("INSERT INTO users (name) VALUES ('Ann')")
+    server.execute("UPDATE users SET name = 'Bob' WHERE name = 'Ann'")
+    assert "Bob" in server.execute("SELECT name FROM users")
+    assert server.execute("COMMIT") == "Transaction committed"
+    assert "2  Bob" in server.execute("SELECT * FROM users")
+
+    server.execute("BEGIN")
+    server.execute("DELETE FROM users WHERE name = 'Bob'")
+    assert "Bob" not in server.execute("SELECT name FROM users")
+    # A client disconnecting leaves its transaction uncommitted
+    server.close()
+    assert "Bob" in server.execute("SELECT name FROM users")
+    assert "Bob" in QueryServer().execute("SELECT name FROM users")
+
+
+def test_plans_are_reused_after_writes(data_dir):
+    create_database()
+    server = QueryServer()
+
+    for i in range(3):
+        server.execute("SELECT * FROM users WHERE name = ?", [f"user {i}"])
+        server.execute("INSERT INTO users (name) VALUES (?)", [f"user {i}"])
+
+    # Each statement was validated once
+    assert executor.plan_cache.misses == 2
+    assert executor.plan_cache.hits == 4
+
+
+def test_transactions_outside_server_mode(data_dir):
+    create_database()
+    meta = Metadata.load()
+
+    # The transaction would end with the query
+    assert executor.execute_query(meta, "BEGIN").startswith("[ERROR]")
+    assert db.transaction is None
+
+
+def test_writes_invalidate_cache(data_dir):
+    create_database()
+    server = QueryServer()
+
+    assert "Ann" not in server.execute("SELECT name FROM users")
+    assert server.execute("INSERT INTO users (name) VALUES ('Ann')") == "Inserted row"
+    assert "Ann" in server.execute("SELECT name FROM users")
+
+    server.execute("DELETE FROM users WHERE name = 'Ann'")
+    assert "Ann" not in server.execute("SELECT name FROM users")
+
+
+def test_reloads_metadata_changed_by_another_process(data_dir):
+    create_database()
+    server = QueryServer()
+    assert "Ann" not in server.execute("SELECT name FROM users")
+
+    meta = Metadata.load()
+    table = meta.database.get_table("users")
+    table.append([table.create_row(("'Ann'",), ("name",))])
+    meta.save()
+
+    assert "Ann" in server.execute("SELECT name FROM users")
+    server.execute("INSERT INTO users (name) VALUES ('Bob')")
+    assert "3  Bob" in server.execute("SELECT * FROM users")
+
+
+def test_reads_snapshot_while_another_connection_writes(data_dir):
+    create_database()
+    server = QueryServer()
+    assert "Mary" in server.execute("SELECT name FROM users")
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writer.submit(server.execute, "BEGIN").result()
+        writer.submit(server.execute, "INSERT INTO users (name) VALUES ('Ann')").result()
+
+        # The writer holds the write lock, but readers don't wait for it
+        assert "Ann" not in server.execute("SELECT name FROM users")
+
+        committed = writer.submit(server.execute, "COMMIT").result()
+        assert committed == "Transaction committed"
+
+    assert "Ann" in server.execute("SELECT name FROM users")
@@ -0,0 +1,133 @@
+import pytest
+
+import db
+from db import Column, Database, ResultSet, Table
+from query import Where
+
+
+def create_database() -> Database:
+    table = Table(
+        name="users",
+        columns=[Column("__id", "int"), Column("age", "int")],
+        file="users.csv",
+        next_id=3,
+    )
+    table.write(ResultSet("users", tuple(table.columns), ((0, 20), (1, 30), (2, 40))))
+    return Database(name="test", tables=[table])
+
+
+def older_than(age: int) -> Where:
+    return Where(
+        left_hand="age",
+        right_hand=str(age),
+        operator=">",
+        or_where=None,
+        and_where=None,
+    )
+
+
+def test_reads_see_writes_of_transaction(data_dir):
+    database = create_database()
+    table = database.get_table("users")
+    size = table.path.stat().st_size
+
+    database.begin()
+    table.append([(3, 50), (4, 60)])
+    table.log_changes([(0, (0, 70)), (1, None), (4, (4, 10))])
+
+    assert list(table.scan()) == [(0, 70), (2, 40), (3, 50), (4, 10)]
+    assert list(table.scan(older_than(45))) == [(0, 70), (3, 50)]
+    # Nothing was written yet
+    assert table.path.stat().st_size == size
+    assert table.wal.changes("users") == {}
+
+    database.commit()
+
+    assert list(table.scan()) == [(0, 70), (2, 40), (3, 50), (4, 10)]
+    # Inserted rows were logged in their last version, along with the changes
+    assert table.path.stat().st_size == size
+    assert table.wal.changes("users") == {0: (0, 70), 1: None, 3: (3, 50), 4: (4, 10)}
+    assert len(list(table.wal.read())) == 1
+
+    table.checkpoint()
+    assert list(table.read().rows) == [(0, 70), (2, 40), (3, 50), (4, 10)]
+
+
+def test_commit_is_atomic(data_dir):
+    database = create_database()
+    users = database.get_table("users")
+    addresses = Table(
+        name="addresses",
+        columns=[Column("__id", "int"), Column("street", "str")],
+        file="addresses.csv",
+        next_id=0,
+    )
+    addresses.write(ResultSet("addresses", tuple(addresses.columns), ()))
+    database.add_table(addresses)
+
+    database.begin()
+    users.append([(3, 50)])
+    users.log_changes([(0, None)])
+    addresses.append([(0, "Main St")])
+    database.commit()
+
+    assert db.transaction is None
+    assert list(users.scan()) == [(1, 30), (2, 40), (3, 50)]
+    assert list(addresses.scan()) == [(0, "Main St")]
+
+    # Simulate a crash in the middle of logging the transaction
+    size = users.wal.path.stat().st_size
+    with open(users.wal.path, "r+b") as f:
+        f.truncate(size - 3)
+
+    assert list(users.scan()) == [(0, 20), (1, 30), (2, 40)]
+    assert list(addresses.scan()) == []
+
+
+def test_writes_are_held_as_stored_values(data_dir):
+    database = create_database()
+    table = database.get_table("users")
+
+    database.begin()
+    # An empty cell, as in a row whose column was omitted
+    table.append([(3, "")])
+    table.log_changes([(0, (0, "25"))])
+
+    assert list(table.scan(older_than(10))) == [(0, 25), (1, 30), (2, 40)]
+    assert list(table.scan()) == [(0, 25), (1, 30), (2, 40), (3, 0)]
+
+    database.commit()
+
+    assert table.wal.changes("users") == {0: (0, 25), 3: (3, 0)}
+    assert list(table.scan(older_than(10))) == [(0, 25), (1, 30), (2, 40)]
+
+
+def test_rollback(data_dir):
+    database = create_database()
+    table = database.get_table("users")
+
+    database.begin()
+    table.append([table.create_row(("50",), ("age",))])
+    table.log_changes([(0, None)])
+    assert table.next_id == 4
+
+    database.rollback()
+
+    assert list(table.scan()) == [(0, 20), (1, 30), (2, 40)]
+    assert table.next_id == 3
+    assert db.transaction is None
+
+
+def test_transaction_errors(data_dir):
+    database = create_database()
+    table = database.get_table("users")
+
+    with pytest.raises(ValueError):
+        database.commit()
+
+    database.begin()
+    with pytest.raises(ValueError):
+        database.begin()
+    with pytest.raises(ValueError):
+        table.write(table.read())
+    database.rollback()
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+import db
+from db import Column, Database, Metadata, ResultSet, Table
+from query import parse_where
+
+np = pytest.importorskip("numpy")
+import vectorized
+
+
+@pytest.fixture(params=["csv", "columnar"])
+def table(request, data_dir):
+    table = Table(
+        name="users",
+        columns=[
+            Column("__id", "int"),
+            Column("name", "str"),
+            Column("score", "float"),
+            Column("born", "datetime"),
+        ],
+        file=f"users.{request.param}",
+        next_id=0,
+        format=request.param,
+    )
+    names = ["Ann", "John", "Mary", "Bob", "Ann, Jr."]
+    rows = tuple(
+        (i, names[i % 5], i / 4, datetime(1990 + i % 7, 1 + i % 12, 1))
+        for i in range(40)
+    )
+    table.write(ResultSet("users", tuple(table.columns), rows))
+    return table
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        "name = 'Mary'",
+        "name = 'Nobody'",
+        "name > 'Ann' AND name <= 'John'",
+        "name < 'Bob' OR score < 2",
+        "score >= 5.5",
+        "born < '1993-01-01' AND __id > 10",
+        "born >= '1994-06-01 00:00:00'",
+        "__id < score",
+    ],
+)
+def test_scan_matches_rows(table, where):
+    parsed = parse_where(where)
+
+    assert list(vectorized.scan(table, parsed, None)) == list(table.scan(parsed))
+
+
+def test_scan_applies_logged_changes(table):
+    table.log_changes([(2, None), (3, (3, "Mary", 0.0, datetime(2000, 1, 1)))])
+    where = parse_where("name = 'Mary'")
+
+    rows = list(vectorized.scan(table, where, {"__id", "name"}))
+
+    assert [(row[0], row[1]) for row in rows] == [
+        (row[0], row[1]) for row in table.scan(where)
+    ]
+    assert [row[0] for row in rows] == [3, 7, 12, 17, 22, 27, 32, 37]
+
+
+def test_arrays_of_deleted_files_are_dropped(table):
+    where = parse_where("name = 'Mary'")
+    list(vectorized.scan(table, where, None))
+    old_path = table.path
+    assert db.array_cache.get((old_path, "name"), (table.version(), table.stored_end()))
+
+    table.log_changes([(2, None)])
+    table.checkpoint()
+    Metadata(Database(name="test", tables=[table])).save()
+    db.collect_garbage()
+
+    assert not old_path.exists()
+    assert not any(key[0] == old_path for key in db.array_cache.entries)
@@ -0,0 +1,57 @@
+from wal import WriteAheadLog
+
+
+def test_changes(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log")
+    log.append("users", [(1, (1, "John")), (2, (2, "Mary"))])
+    log.append("addresses", [(1, None)])
+    log.append("users", [(1, None), (3, (3, "Ann"))])
+
+    assert log.changes("users") == {1: None, 2: (2, "Mary"), 3: (3, "Ann")}
+    assert log.changes("addresses") == {1: None}
+    assert log.changes("other") == {}
+
+
+def test_remove(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log")
+    log.append("users", [(1, None)])
+    log.append("addresses", [(1, None)])
+
+    log.remove("users")
+    assert log.changes("users") == {}
+    assert log.changes("addresses") == {1: None}
+
+    log.remove("addresses")
+    assert not log.path.exists()
+
+
+def test_torn_batch_is_ignored(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log")
+    log.append("users", [(1, None)])
+    log.append("users", [(2, None)])
+
+    # Simulate a crash in the middle of writing the last batch
+    size = log.path.stat().st_size
+    with open(log.path, "r+b") as f:
+        f.truncate(size - 3)
+
+    assert log.changes("users") == {1: None}
+
+    log.append("users", [(3, None)])
+    assert log.changes("users") == {1: None, 3: None}
+
+
+def test_lsn_ranges(tmp_path):
+    log = WriteAheadLog(tmp_path / "wal.log")
+    assert log.append("users", [(1, (1, "John"))]) == 1
+    assert log.append("users", [(1, (1, "Mary"))]) == 2
+    assert log.append("users", [(2, None)]) == 3
+
+    assert log.changes("users", upto=1) == {1: (1, "John")}
+    assert log.changes("users", after=1, upto=2) == {1: (1, "Mary")}
+    assert log.count("users", after=1) == 2
+    assert log.last_lsn("users") == 3
+
+    log.remove("users", upto=2)
+    assert log.changes("users") == {2: None}
+    assert log.last_lsn("users") == 3
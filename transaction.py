@@ -0,0 +1,49 @@
+"""
+Transactions started with BEGIN.
+
+The writes of a transaction are held in memory, in a write set per table: the
+rows inserted and the new version of each changed row, None for deleted rows.
+Reads see them over the stored rows until COMMIT logs them, inserted rows
+included, as a single record of the write-ahead log, or ROLLBACK drops them.
+The rows inserted are written to the table files by the next checkpoint.
+
+A transaction belongs to the thread that began it: other threads, like the
+readers of the server, don't see its writes.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Tuple
+
+from wal import Changes
+
+Row = Tuple[Any, ...]
+
+
+@dataclass
+class WriteSet:
+    rows: List[Row] = field(default_factory=list)
+    changes: Changes = field(default_factory=dict)
+
+    def folded(self) -> Changes:
+        """
+        Returns the changes to log: the last version of the rows inserted by
+        the transaction, and the changes to the other rows
+        """
+        inserted = {row[0]: row for row in self.rows}
+        changes = {**inserted, **self.changes}
+        # Rows inserted and then deleted by the transaction leave no trace
+        return {
+            id: row for id, row in changes.items() if row is not None or id not in inserted
+        }
+
+
+@dataclass
+class Transaction:
+    # next_id of each table when the transaction began, restored by ROLLBACK
+    next_ids: Dict[str, int]
+    write_sets: Dict[Path, WriteSet] = field(default_factory=dict)
+    thread: int = field(default_factory=threading.get_ident)
+
+    def write_set(self, path: Path) -> WriteSet:
+        return self.write_sets.setdefault(path, WriteSet())
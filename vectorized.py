@@ -0,0 +1,285 @@
+"""
+Vectorized execution of WHERE clauses over NumPy column arrays.
+
+The columns used by the query are loaded as whole arrays: int64, float64,
+datetime64 and, for strings, int codes into a sorted dictionary of the
+distinct values. Every condition is evaluated over a whole column at once as a
+boolean mask, AND/OR combine masks, and only the rows left in the mask are
+converted back to Python values.
+
+Loaded arrays are kept in a cache of up to ARRAY_CACHE_VALUES values (see
+arraycache.py and config.py), evicting the least recently used columns first.
+
+Requires NumPy, which is an optional dependency.
+"""
+import csv
+from dataclasses import dataclass
+import io
+import itertools
+import operator
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+import columnar
+from db import (
+    Column,
+    Row,
+    Table,
+    array_cache,
+    compile_where,
+    merge_changes,
+    to_datetime,
+)
+from query import Where, unquote_string, where_columns
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+COMPARISONS: Dict[str, Callable[[Any, Any], Any]] = {
+    "=": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+}
+
+DTYPES = {"int": "int64", "float": "float64", "datetime": "datetime64[us]"}
+
+
+def available() -> bool:
+    return np is not None
+
+
+@dataclass
+class ColumnArray:
+    values: Any
+    # Sorted distinct values of str columns, which store codes into it
+    dictionary: Optional[Any] = None
+
+    def decoded(self) -> Any:
+        if self.dictionary is not None:
+            return self.dictionary[self.values]
+        return self.values
+
+    def take(self, positions: Any) -> List[Any]:
+        """
+        Returns the values at the given positions as Python objects
+        """
+        if self.dictionary is not None:
+            return self.dictionary[self.values[positions]].tolist()
+        return self.values[positions].tolist()
+
+
+def scan(table: Table, where: Where, columns: Optional[Set[str]]) -> Iterator[Row]:
+    """
+    Yields the rows of the table that satisfy the WHERE clause, like
+    Table.scan
+    """
+    if np is None:
+        raise ValueError("Vectorized execution requires numpy (pip install numpy)")
+
+    changes = table.changes()
+    pending = table.pending_rows()
+
+    needed = {column.name for column in table.columns} if columns is None else columns
+    needed = needed | where_columns(where)
+    if changes:
+        needed.add("__id")
+    arrays = load_arrays(
+        table, [column for column in table.columns if column.name in needed]
+    )
+
+    mask = compile_mask(where, arrays)
+    if changes:
+        # Rows with logged changes are tested below in their new version
+        changed_ids = np.fromiter(changes.keys(), dtype="int64", count=len(changes))
+        mask &= ~np.isin(arrays["__id"].values, changed_ids)
+
+    positions = np.flatnonzero(mask)
+    rows = zip(
+        *[
+            arrays[column.name].take(positions)
+            if column.name in arrays
+            else itertools.repeat(None, len(positions))
+            for column in table.columns
+        ]
+    )
+
+    if not changes and not pending:
+        return iter(rows)
+
+    # Rows inserted by a transaction are merged like changed rows
+    changed = {**{row[0]: row for row in pending}, **changes}
+    predicate = compile_where(where, table.get_columns())
+    matching = {
+        id: row for id, row in changed.items() if row is not None and predicate(row)
+    }
+    return merge_changes(rows, matching)
+
+
+def load_arrays(table: Table, columns: List[Column]) -> Dict[str, ColumnArray]:
+    """
+    Loads the stored values of the columns, without the logged changes.
+    Arrays are cached until the table file changes
+    """
+    end = table.stored_end()
+    version = (table.version(), end)
+
+    arrays: Dict[str, ColumnArray] = {}
+    missing = []
+    for column in columns:
+        array = array_cache.get((table.path, column.name), version)
+        if array is None:
+            missing.append(column)
+        else:
+            arrays[column.name] = array
+
+    if table.format == "columnar":
+        read = {column.name: read_column(table, column, end) for column in missing}
+    else:
+        read = read_csv_columns(table, missing, end)
+
+    for name, array in read.items():
+        array_cache.put((table.path, name), version, array)
+    arrays.update(read)
+
+    return {column.name: arrays[column.name] for column in columns}
+
+
+def read_csv_columns(
+    table: Table, columns: List[Column], end: int
+) -> Dict[str, ColumnArray]:
+    """
+    Reads the columns of the rows stored before the byte offset `end`
+    """
+    if not columns:
+        return {}
+
+    # Cells are converted by NumPy as whole columns, not parsed one by one
+    indexes = [table.columns.index(column) for column in columns]
+    with open(table.path, "rb") as f:
+        reader = csv.reader(io.StringIO(f.read(end).decode(), newline=""))
+        next(reader, None)  # skip the headers
+        cells = [[row[i] for i in indexes] for row in reader]
+
+    arrays = {}
+    for i, column in enumerate(columns):
+        values = np.array([row[i] for row in cells], dtype=str)
+        arrays[column.name] = convert_cells(values, column)
+    return arrays
+
+
+def convert_cells(values: Any, column: Column) -> ColumnArray:
+    """
+    Converts an array of CSV cells to the column type, like parse_value
+    """
+    if column.type == "str":
+        raw, codes = np.unique(values, return_inverse=True)
+        # Unquoting may map different cells to the same value
+        dictionary, remap = np.unique(
+            np.array(
+                [unquote_string(value) if value else "" for value in raw.tolist()],
+                dtype=str,
+            ),
+            return_inverse=True,
+        )
+        return ColumnArray(remap[codes], dictionary)
+
+    if column.type == "datetime":
+        values = np.char.strip(np.char.strip(values), "'\"")
+        values = np.where(values == "", "1970-01-01", values)
+    else:
+        values = np.where(values == "", "0", values)
+    return ColumnArray(values.astype(DTYPES[column.type]))
+
+
+def read_column(table: Table, column: Column, count: int) -> ColumnArray:
+    """
+    Reads the values of the first `count` rows of the column
+    """
+    file = columnar.column_file(table.path, column)
+    if column.type == "float":
+        return ColumnArray(np.fromfile(file, dtype="<f8", count=count))
+    elif column.type == "datetime":
+        values = np.fromfile(file, dtype="<i8", count=count)
+        return ColumnArray(values.view("datetime64[us]"))
+    elif column.type == "int":
+        return ColumnArray(np.fromfile(file, dtype="<i8", count=count))
+
+    ends = np.fromfile(file, dtype="<i8", count=count).tolist()
+    blob = columnar.blob_file(table.path, column).read_bytes()
+    starts = itertools.chain([0], ends)
+    return encode_strings(
+        [blob[start:end].decode() for start, end in zip(starts, ends)]
+    )
+
+
+def encode_strings(values: List[str]) -> ColumnArray:
+    dictionary, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return ColumnArray(codes, dictionary)
+
+
+def compile_mask(where: Where, arrays: Dict[str, ColumnArray]) -> Any:
+    """
+    Evaluates the WHERE clause over whole columns, returning a boolean mask of
+    the rows that satisfy it
+    """
+    mask = condition_mask(where, arrays)
+
+    # A condition with both is (condition OR or_where) AND and_where
+    if where.or_where:
+        mask = mask | compile_mask(where.or_where, arrays)
+
+    if where.and_where:
+        mask = mask & compile_mask(where.and_where, arrays)
+
+    return mask
+
+
+def condition_mask(where: Where, arrays: Dict[str, ColumnArray]) -> Any:
+    if where.operator not in COMPARISONS:
+        raise ValueError(f"Invalid operator: {where.operator} for comparison")
+    compare = COMPARISONS[where.operator]
+
+    left = arrays[where.left_hand]
+    if where.right_hand in arrays:
+        return compare(left.decoded(), arrays[where.right_hand].decoded())
+
+    value = where.right_hand
+    if left.dictionary is not None:
+        return dictionary_mask(left, where.operator, unquote_string(value))
+
+    if left.values.dtype.kind == "M":
+        value = np.datetime64(to_datetime(unquote_string(value)), "us")
+    elif left.values.dtype.kind == "f":
+        value = float(value)
+    else:
+        value = int(value)
+
+    return compare(left.values, value)
+
+
+def dictionary_mask(column: ColumnArray, comparison: str, value: str) -> Any:
+    """
+    Compares the codes of a str column against the range of codes of the
+    value, which is empty when the value is not in the dictionary
+    """
+    low = np.searchsorted(column.dictionary, value, side="left")
+    high = np.searchsorted(column.dictionary, value, side="right")
+    codes = column.values
+
+    if comparison == "=":
+        return (codes >= low) & (codes < high)
+    elif comparison == "!=":
+        return (codes < low) | (codes >= high)
+    elif comparison == "<":
+        return codes < low
+    elif comparison == "<=":
+        return codes < high
+    elif comparison == ">":
+        return codes >= high
+    else:
+        return codes >= low
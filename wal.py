@@ -0,0 +1,240 @@
+"""
+Write-ahead log of row changes made by UPDATE and DELETE.
+
+Instead of rewriting the table file, UPDATE and DELETE append the new version
+of each changed row, or a tombstone (None) for deleted rows, keyed by the row
+__id. Reads apply the logged changes over the rows of the table file, and a
+checkpoint eventually folds them into the table file and drops them from the
+log.
+
+The log is a sequence of batches, one per statement. Each batch is prefixed
+with its length and CRC32, so a batch torn by a crash is detected and ignored
+along with anything after it: a statement is either fully logged or not at
+all. A transaction logs the batches of every table it wrote, inserted rows
+included, as a single record, so its writes are likewise durable all together
+or not at all. Replaying a batch twice gives the same result, so a crash
+between rewriting a table and dropping its changes from the log is harmless.
+
+Batches are synced to disk as set by the durability mode (see durability.py):
+when appended, or along with the other writes of the statement when it
+commits.
+
+Batches are numbered per table with increasing log sequence numbers (LSNs).
+A snapshot of a table reads only the batches in its range of LSNs, so batches
+logged after the snapshot was taken, or already folded into its table file,
+are not applied to it.
+"""
+import os
+from pathlib import Path
+import pickle
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import durability
+
+FILE_NAME = "wal.log"
+
+BATCH_HEADER = struct.Struct("<II")
+
+# Tables are checkpointed once they have this many changed rows in the log.
+# None disables automatic checkpoints, leaving them to VACUUM
+CHECKPOINT_CHANGES: Optional[int] = 10_000
+
+
+Change = Tuple[int, Optional[Tuple[Any, ...]]]
+Changes = Dict[int, Optional[Tuple[Any, ...]]]
+# Table, LSN and changes
+Batch = Tuple[str, int, List[Change]]
+
+
+class WriteAheadLog:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def append(
+        self, table: str, changes: List[Change], lsn: Optional[int] = None
+    ) -> int:
+        """
+        Logs the changes of a statement, which survive a crash once synced
+        by the durability mode. Returns the LSN of the batch, by default the
+        one after the last batch of the table
+        """
+        if lsn is None:
+            lsn = self.last_lsn(table) + 1
+        self.__write((table, lsn, changes))
+        return lsn
+
+    def append_all(self, batches: List[Batch]) -> None:
+        """
+        Logs the batches of several tables as a single record: after a crash,
+        either all of them or none are in the log
+        """
+        self.__write(batches)
+
+    def __write(self, record: Any) -> None:
+        _, end = self.load()
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with open(self.path, "ab") as f:
+            if f.tell() > end:
+                # Drop a batch torn by a crash, it would hide the new one
+                f.truncate(end)
+                f.seek(end)
+            f.write(BATCH_HEADER.pack(len(data), zlib.crc32(data)))
+            f.write(data)
+
+        durability.written(self.path)
+
+    def changes(
+        self, table: str, after: int = 0, upto: Optional[int] = None
+    ) -> Changes:
+        """
+        Returns the latest logged version of every changed row of the table,
+        None for deleted rows, from the batches with an LSN after `after` and
+        up to `upto` (the last one by default)
+        """
+        key = (table, after, upto)
+        merged = self.__merged()
+        if key not in merged:
+            tables, _ = self.load()
+            changes: Changes = {}
+            for lsn, batch in tables.get(table, []):
+                if lsn > after and (upto is None or lsn <= upto):
+                    changes.update(batch)
+            merged[key] = changes
+
+        return merged[key]
+
+    def count(self, table: str, after: int = 0, upto: Optional[int] = None) -> int:
+        """
+        Returns the number of logged changes of the table, including changes
+        to rows that were changed again later
+        """
+        tables, _ = self.load()
+        return sum(
+            len(batch)
+            for lsn, batch in tables.get(table, [])
+            if lsn > after and (upto is None or lsn <= upto)
+        )
+
+    def last_lsn(self, table: str) -> int:
+        """
+        Returns the LSN of the last batch of the table, 0 without batches
+        """
+        tables, _ = self.load()
+        return max((lsn for lsn, _ in tables.get(table, [])), default=0)
+
+    def size(self, table: Optional[str] = None, after: int = 0) -> int:
+        """
+        Returns the bytes used by the log, or by the batches of the table
+        with an LSN after `after`
+        """
+        if table is None:
+            return self.path.stat().st_size if self.path.exists() else 0
+
+        size = 0
+        start = 0
+        for (name, lsn, _), end in self.__read():
+            if name == table and lsn > after:
+                size += end - start
+            start = end
+        return size
+
+    def remove(self, table: str, upto: Optional[int] = None) -> None:
+        """
+        Drops the batches of the table up to an LSN (all by default), once
+        they were written to its file
+        """
+        tables, _ = self.load()
+        if not any(upto is None or lsn <= upto for lsn, _ in tables.get(table, [])):
+            return
+
+        batches = [
+            batch
+            for batch in self.read()
+            if batch[0] != table or (upto is not None and batch[1] > upto)
+        ]
+        if not batches:
+            os.remove(self.path)
+            return
+
+        with durability.replace(self.path, binary=True) as f:
+            for batch in batches:
+                data = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(BATCH_HEADER.pack(len(data), zlib.crc32(data)))
+                f.write(data)
+
+    def read(self) -> Iterator[Batch]:
+        for batch, _ in self.__read():
+            yield batch
+
+    def __merged(self) -> Dict[Tuple[str, int, Optional[int]], Changes]:
+        self.load()
+        return merged[self.path]
+
+    def __read(self) -> Iterator[Tuple[Batch, int]]:
+        """
+        Yields every complete batch along with the offset where its record
+        ends
+        """
+        if not self.path.exists():
+            return
+
+        # Batches logged before LSNs were numbered in the order they were read
+        lsns: Dict[str, int] = {}
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(BATCH_HEADER.size)
+                if len(header) < BATCH_HEADER.size:
+                    return
+                length, crc = BATCH_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    return
+
+                record = pickle.loads(data)
+                # Records of a transaction hold a list of batches
+                batches = record if isinstance(record, list) else [record]
+                for batch in batches:
+                    if len(batch) == 2:
+                        table, changes = batch
+                        batch = (table, lsns.get(table, 0) + 1, changes)
+                    lsns[batch[0]] = batch[1]
+                    yield batch, f.tell()
+
+    def load(self) -> Tuple[Dict[str, List[Tuple[int, Changes]]], int]:
+        """
+        Returns the (LSN, changes) batches of every table and the offset where
+        the last complete batch ends. Cached until the file changes
+        """
+        version = file_version(self.path)
+        if self.path in loaded and loaded[self.path][0] == version:
+            return loaded[self.path][1]
+
+        tables: Dict[str, List[Tuple[int, Changes]]] = {}
+        end = 0
+        for (table, lsn, changes), end in self.__read():
+            tables.setdefault(table, []).append((lsn, dict(changes)))
+
+        loaded[self.path] = (version, (tables, end))
+        merged[self.path] = {}
+        return tables, end
+
+
+# Batches read from each log, along with the version of the file they came from
+loaded: Dict[
+    Path,
+    Tuple[Optional[Tuple[int, int]], Tuple[Dict[str, List[Tuple[int, Changes]]], int]],
+] = {}
+
+# Changes of each range of LSNs of a table, merged from the loaded batches
+merged: Dict[Path, Dict[Tuple[str, int, Optional[int]], Changes]] = {}
+
+
+def file_version(path: Path) -> Optional[Tuple[int, int]]:
+    if not path.exists():
+        return None
+
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size